@@ -0,0 +1,242 @@
+"""
+Two-tier cache for translations made by ai_helper.
+
+Entries are keyed by (provider, normalized text, src, dst). Lookups go to an
+in-memory LRU first and then to an SQLite file under the data directory, so
+a word translated once is served locally to every user and survives
+restarts. Entries expire after a TTL; both tiers are size-bounded and evict
+the least recently used entries first.
+
+The event loop never touches SQLite: disk lookups (aget / aget_many) run in
+a thread, and stores, expiry deletes and used_at updates are queued to a
+single writer thread that commits them in batches.
+"""
+import os
+import time
+import queue
+import asyncio
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Tuple
+
+from . import storage
+
+AI_CACHE_FILE = os.getenv('AI_CACHE_FILE') or os.path.join(storage.DATA_DIR, 'ai_cache.sqlite3')
+# Seconds an entry stays valid (default 30 days)
+AI_CACHE_TTL = int(os.getenv('AI_CACHE_TTL', str(30 * 24 * 3600)))
+# Entries held in memory / on disk
+AI_CACHE_MEMORY_SIZE = int(os.getenv('AI_CACHE_MEMORY_SIZE', '10000'))
+AI_CACHE_MAX_ROWS = int(os.getenv('AI_CACHE_MAX_ROWS', '200000'))
+# Disk writes between two eviction sweeps
+PRUNE_EVERY = 500
+# Queued disk writes committed in one transaction at most
+WRITE_BATCH = 500
+
+
+def normalize_text(text: str) -> str:
+    """NFC with collapsed whitespace; case is kept since it can change a translation"""
+    return ' '.join(unicodedata.normalize('NFC', text or '').split())
+
+
+def cache_key(provider: str, text: str, src: str, dst: str) -> str:
+    return '\x1f'.join((provider, (src or '').strip().lower(), (dst or '').strip().lower(), normalize_text(text)))
+
+
+class TranslationCache:
+    def __init__(self, path: str = AI_CACHE_FILE, memory_size: int = AI_CACHE_MEMORY_SIZE,
+                 max_rows: int = AI_CACHE_MAX_ROWS, ttl: int = AI_CACHE_TTL):
+        self.path = path
+        self.memory_size = memory_size
+        self.max_rows = max_rows
+        self.ttl = ttl
+        self._mem: 'OrderedDict[str, Tuple[str, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+        # Reads use their own connection; the writer thread opens another
+        self._conn: Optional[sqlite3.Connection] = None
+        self._read_lock = threading.Lock()
+        self._queue: 'queue.Queue[tuple]' = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._writes = 0
+        self.counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0}
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            # WAL + NORMAL: commits do not wait for fsync; a crash loses at most cache entries
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS cache ('
+                         'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                         'expires_at REAL NOT NULL, used_at REAL NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS cache_used_at ON cache(used_at)')
+            return conn
+        except sqlite3.Error:
+            # No disk tier (read-only data dir etc.); memory still works
+            return None
+
+    def _remember(self, key: str, value: str, expires_at: float):
+        self._mem[key] = (value, expires_at)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.memory_size:
+            self._mem.popitem(last=False)
+
+    def _from_memory(self, keys: List[str], now: float) -> Dict[str, str]:
+        found = {}
+        with self._lock:
+            for key in keys:
+                hit = self._mem.get(key)
+                if hit is None:
+                    continue
+                if hit[1] > now:
+                    self._mem.move_to_end(key)
+                    found[key] = hit[0]
+                else:
+                    del self._mem[key]
+            self.counters['memory_hits'] += len(found)
+        return found
+
+    def _read_disk(self, keys: List[str]) -> Dict[str, Tuple[str, float]]:
+        """Rows of the given keys, in one SELECT per 500 keys (runs off the event loop)"""
+        rows = {}
+        with self._read_lock:
+            if self._conn is None:
+                self._conn = self._connect()
+            if self._conn is None:
+                return rows
+            try:
+                for i in range(0, len(keys), 500):
+                    chunk = keys[i:i + 500]
+                    rows.update((k, (v, exp)) for k, v, exp in self._conn.execute(
+                        'SELECT key, value, expires_at FROM cache WHERE key IN (%s)' % ','.join('?' * len(chunk)),
+                        chunk))
+            except sqlite3.Error:
+                return {}
+        return rows
+
+    def _from_disk(self, rows: Dict[str, Tuple[str, float]], keys: List[str], now: float) -> Dict[str, str]:
+        found = {}
+        with self._lock:
+            for key in keys:
+                row = rows.get(key)
+                if row is None:
+                    continue
+                if row[1] > now:
+                    self._remember(key, row[0], row[1])
+                    found[key] = row[0]
+                    self._enqueue(('touch', key, now))
+                else:
+                    self._enqueue(('delete', key))
+            self.counters['disk_hits'] += len(found)
+            self.counters['misses'] += len(keys) - len(found)
+        return found
+
+    async def aget_many(self, lookups: List[Tuple[str, str, str, str]]) -> List[Optional[str]]:
+        """Cached values for (provider, text, src, dst) lookups; disk reads run in a thread"""
+        keys = [cache_key(*lookup) for lookup in lookups]
+        now = time.time()
+        found = self._from_memory(keys, now)
+        missing = list(dict.fromkeys(k for k in keys if k not in found))
+        if missing:
+            rows = await asyncio.to_thread(self._read_disk, missing)
+            found.update(self._from_disk(rows, missing, now))
+        return [found.get(k) for k in keys]
+
+    async def aget(self, provider: str, text: str, src: str, dst: str) -> Optional[str]:
+        return (await self.aget_many([(provider, text, src, dst)]))[0]
+
+    def get(self, provider: str, text: str, src: str, dst: str) -> Optional[str]:
+        """Blocking lookup, for callers outside the event loop"""
+        key = cache_key(provider, text, src, dst)
+        now = time.time()
+        found = self._from_memory([key], now)
+        if key not in found:
+            found = self._from_disk(self._read_disk([key]), [key], now)
+        return found.get(key)
+
+    def set(self, provider: str, text: str, src: str, dst: str, value: str):
+        """Store in memory now; the disk write is queued to the writer thread"""
+        if not value:
+            return
+        key = cache_key(provider, text, src, dst)
+        now = time.time()
+        expires_at = now + self.ttl
+        with self._lock:
+            self._remember(key, value, expires_at)
+            self.counters['stores'] += 1
+            self._enqueue(('set', key, value, expires_at, now))
+
+    def _enqueue(self, item: tuple):
+        # Called with self._lock held
+        if self._writer is None or not self._writer.is_alive():
+            self._writer = threading.Thread(target=self._write_loop, name='ai-cache-writer', daemon=True)
+            self._writer.start()
+        self._queue.put(item)
+
+    def _write_loop(self):
+        db = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < WRITE_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                if db is not None:
+                    self._write(db, batch)
+            except sqlite3.Error:
+                try:
+                    db.execute('ROLLBACK')
+                except sqlite3.Error:
+                    pass
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, db: sqlite3.Connection, batch: List[tuple]):
+        """Apply queued items in order, in one transaction"""
+        stored = 0
+        db.execute('BEGIN')
+        for op, key, *args in batch:
+            if op == 'set':
+                db.execute('INSERT OR REPLACE INTO cache (key, value, expires_at, used_at) VALUES (?, ?, ?, ?)',
+                           (key, *args))
+                stored += 1
+            elif op == 'touch':
+                db.execute('UPDATE cache SET used_at = MAX(used_at, ?) WHERE key = ?', (args[0], key))
+            elif op == 'delete':
+                # Only if still expired: a fresh value may have been queued since
+                db.execute('DELETE FROM cache WHERE key = ? AND expires_at <= ?', (key, time.time()))
+            elif op == 'clear':
+                db.execute('DELETE FROM cache')
+        if self._writes // PRUNE_EVERY != (self._writes + stored) // PRUNE_EVERY:
+            self._prune(db, time.time())
+        self._writes += stored
+        db.execute('COMMIT')
+
+    def _prune(self, db: sqlite3.Connection, now: float):
+        db.execute('DELETE FROM cache WHERE expires_at <= ?', (now,))
+        extra = db.execute('SELECT COUNT(*) FROM cache').fetchone()[0] - self.max_rows
+        if extra > 0:
+            db.execute('DELETE FROM cache WHERE key IN '
+                       '(SELECT key FROM cache ORDER BY used_at LIMIT ?)', (extra,))
+
+    def flush(self):
+        """Wait until queued disk writes are committed"""
+        self._queue.join()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.counters, memory_entries=len(self._mem), pending_writes=self._queue.qsize())
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+            self._enqueue(('clear', None))
+        self.flush()
+
+
+translation_cache = TranslationCache()
@@ -0,0 +1,135 @@
+"""
+Health tracking and circuit breakers for the AI providers used by ai_helper.
+
+Each provider has a breaker that records the outcome and latency of its
+recent calls. It opens when too many of them fail or are slow; while open,
+calls are refused at once so ai_helper goes straight to its fallback. After
+a cool-down a single probe call is let through (half-open): success closes
+the breaker again, failure reopens it.
+"""
+import os
+import time
+import threading
+from collections import deque
+from typing import Optional, Dict, Any
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Recent calls kept per provider, and how old they may be (seconds)
+CIRCUIT_WINDOW = int(os.getenv('CIRCUIT_WINDOW', '20'))
+CIRCUIT_WINDOW_SECONDS = float(os.getenv('CIRCUIT_WINDOW_SECONDS', '300'))
+# Calls needed in the window before the breaker may open
+CIRCUIT_MIN_CALLS = int(os.getenv('CIRCUIT_MIN_CALLS', '5'))
+# Share of failed / slow calls that opens the breaker
+CIRCUIT_ERROR_RATE = float(os.getenv('CIRCUIT_ERROR_RATE', '0.5'))
+CIRCUIT_SLOW_RATE = float(os.getenv('CIRCUIT_SLOW_RATE', '0.8'))
+# Seconds an open breaker refuses calls before probing again
+CIRCUIT_OPEN_SECONDS = float(os.getenv('CIRCUIT_OPEN_SECONDS', '30'))
+
+
+class ProviderUnavailable(Exception):
+    """Raised instead of calling a provider whose breaker is open"""
+    def __init__(self, provider: str):
+        super().__init__(f'{provider} is temporarily unavailable')
+        self.provider = provider
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, slow_call: float, window: int = CIRCUIT_WINDOW,
+                 window_seconds: float = CIRCUIT_WINDOW_SECONDS, min_calls: int = CIRCUIT_MIN_CALLS,
+                 error_rate: float = CIRCUIT_ERROR_RATE, slow_rate: float = CIRCUIT_SLOW_RATE,
+                 open_seconds: float = CIRCUIT_OPEN_SECONDS):
+        self.name = name
+        self.slow_call = slow_call
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        # (finished_at, latency, ok)
+        self._calls: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        self.trips = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        """Whether a call may go out now; a True in half-open state is the probe"""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                self.state = HALF_OPEN
+                self._probing = False
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def release(self):
+        """The allowed call ended without an outcome (e.g. it was cancelled)"""
+        with self._lock:
+            self._probing = False
+
+    def record(self, latency: float, ok: bool):
+        now = time.monotonic()
+        with self._lock:
+            slow = latency >= self.slow_call
+            if self.state == HALF_OPEN:
+                self._probing = False
+                if ok and not slow:
+                    self.state = CLOSED
+                    self._calls.clear()
+                else:
+                    self._open(now)
+                self._calls.append((now, latency, ok))
+                return
+            self._calls.append((now, latency, ok))
+            if self.state != CLOSED:
+                return
+            recent = self._recent(now)
+            if len(recent) < self.min_calls:
+                return
+            failed = sum(1 for _, _, good in recent if not good)
+            slowed = sum(1 for _, lat, _ in recent if lat >= self.slow_call)
+            if failed / len(recent) >= self.error_rate or slowed / len(recent) >= self.slow_rate:
+                self._open(now)
+
+    def _open(self, now: float):
+        self.state = OPEN
+        self._opened_at = now
+        self.trips += 1
+
+    def _recent(self, now: float):
+        return [c for c in self._calls if now - c[0] <= self.window_seconds]
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            recent = self._recent(now)
+            latencies = sorted(lat for _, lat, _ in recent)
+            p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] if latencies else None
+            retry_in: Optional[float] = None
+            if self.state == OPEN:
+                retry_in = round(max(0.0, self._opened_at + self.open_seconds - now), 1)
+            return {
+                'state': self.state,
+                'calls': len(recent),
+                'error_rate': round(sum(1 for _, _, ok in recent if not ok) / len(recent), 3) if recent else 0.0,
+                'slow_rate': round(sum(1 for lat in latencies if lat >= self.slow_call) / len(recent), 3) if recent else 0.0,
+                'p95_ms': round(p95 * 1000) if p95 is not None else None,
+                'retry_in': retry_in,
+                'trips': self.trips,
+                'rejected': self.rejected,
+            }
+
+    def reset(self):
+        with self._lock:
+            self._calls.clear()
+            self.state = CLOSED
+            self._probing = False
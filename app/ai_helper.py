@@ -5,13 +5,73 @@ OpenAI when available, with free fallbacks (googletrans, LanguageTool, Datamuse)
 so the app can be tested without a paid key.
 """
 import os
-from typing import Optional, Dict, Any, List
-import openai
-import requests
+import re
+import copy
+import bisect
+import hashlib
+import json
+import time
+import asyncio
+import weakref
+import threading
+import inspect
+import functools
+from typing import Optional, Dict, Any, List, Tuple, Awaitable
+import httpx
+from openai import AsyncOpenAI, APIStatusError
+
+from .ai_cache import translation_cache
+from .ai_health import CircuitBreaker, ProviderUnavailable
 
 # Get API key from environment
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
-openai.api_key = OPENAI_API_KEY
+OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-3.5-turbo')
+# None: the OpenAI SDK default (or its own OPENAI_BASE_URL handling)
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL') or None
+# Words per OpenAI prompt when translating a whole set
+OPENAI_BATCH_SIZE = int(os.getenv('OPENAI_BATCH_SIZE', '40'))
+# Words a single set translation may send to MyMemory (one request each);
+# the rest are left for the next run
+MYMEMORY_MAX_WORDS = int(os.getenv('MYMEMORY_MAX_WORDS', '50'))
+
+# Provider endpoints; point them at fake_ai_server.py for offline runs
+MYMEMORY_URL = os.getenv('MYMEMORY_URL', 'https://api.mymemory.translated.net/get')
+LANGUAGETOOL_URL = os.getenv('LANGUAGETOOL_URL', 'https://api.languagetool.org/v2/check')
+DATAMUSE_URL = os.getenv('DATAMUSE_URL', 'https://api.datamuse.com/words')
+
+# Seconds allowed per call, by provider
+PROVIDER_TIMEOUTS = {
+    'openai': float(os.getenv('OPENAI_TIMEOUT', '20')),
+    'mymemory': float(os.getenv('MYMEMORY_TIMEOUT', '15')),
+    'languagetool': float(os.getenv('LANGUAGETOOL_TIMEOUT', '15')),
+    'datamuse': float(os.getenv('DATAMUSE_TIMEOUT', '10')),
+}
+# Calls in flight at once, by provider (public free APIs throttle bursts)
+PROVIDER_CONCURRENCY = {
+    'openai': int(os.getenv('OPENAI_CONCURRENCY', '8')),
+    'mymemory': int(os.getenv('MYMEMORY_CONCURRENCY', '4')),
+    'languagetool': int(os.getenv('LANGUAGETOOL_CONCURRENCY', '2')),
+    'datamuse': int(os.getenv('DATAMUSE_CONCURRENCY', '4')),
+}
+# Calls slower than this (seconds) count against a provider's health
+PROVIDER_SLOW_CALLS = {
+    'openai': float(os.getenv('OPENAI_SLOW_CALL', '8')),
+    'mymemory': float(os.getenv('MYMEMORY_SLOW_CALL', '5')),
+    'languagetool': float(os.getenv('LANGUAGETOOL_SLOW_CALL', '5')),
+    'datamuse': float(os.getenv('DATAMUSE_SLOW_CALL', '3')),
+}
+# Seconds a synonym/antonym request may spend in total; what is not back by
+# then is left out and the result is marked partial
+AI_LATENCY_BUDGET = float(os.getenv('AI_LATENCY_BUDGET', '8'))
+# One keep-alive pool shared by every provider (OpenAI included)
+HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30)
+
+_loop_clients: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopClients]' = weakref.WeakKeyDictionary()
+_loop_clients_lock = threading.Lock()
+_breakers: Dict[str, CircuitBreaker] = {p: CircuitBreaker(p, t) for p, t in PROVIDER_SLOW_CALLS.items()}
+# Single-flight: running upstream call per (function, normalized args)
+_inflight: Dict[Tuple, asyncio.Task] = {}
+_flight_stats: Dict[str, Dict[str, int]] = {}
 
 
 def _has_openai() -> bool:
@@ -28,29 +88,248 @@ def is_ai_enabled() -> bool:
     return _has_openai() or _has_free_translation()
 
 
-# -------- Simple Translation Helper (MyMemory) --------
-def _translate_mymemory(text: str, src: str, dst: str) -> Optional[str]:
+# -------- Shared HTTP / OpenAI clients --------
+class _LoopClients:
+    """Connection pool, OpenAI client and provider semaphores of one event loop"""
+    def __init__(self):
+        self.http = httpx.AsyncClient(limits=HTTP_LIMITS)
+        self.semaphores = {p: asyncio.Semaphore(n) for p, n in PROVIDER_CONCURRENCY.items()}
+        self._openai: Optional[AsyncOpenAI] = None
+
+    @property
+    def openai(self) -> AsyncOpenAI:
+        if self._openai is None:
+            # No retries: a failed call falls back to the free providers instead
+            self._openai = AsyncOpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL,
+                                       http_client=self.http, max_retries=0)
+        return self._openai
+
+
+def _clients() -> _LoopClients:
+    """Pooled clients for the running event loop (created on first use).
+
+    Connections cannot move between event loops, so each loop (the app's,
+    a background worker's) gets its own.
+    """
+    loop = asyncio.get_running_loop()
+    with _loop_clients_lock:
+        clients = _loop_clients.get(loop)
+        if clients is None:
+            clients = _loop_clients[loop] = _LoopClients()
+    return clients
+
+
+async def close_clients():
+    """Close the running loop's connection pool (app shutdown)"""
+    with _loop_clients_lock:
+        clients = _loop_clients.pop(asyncio.get_running_loop(), None)
+    if clients is not None:
+        await clients.http.aclose()
+
+
+def _is_failure(exc: BaseException) -> bool:
+    """Whether an error says the provider is unhealthy (not that our request was bad)"""
+    status = None
+    if isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+    elif isinstance(exc, APIStatusError):
+        status = exc.status_code
+    return status is None or status >= 500 or status == 429
+
+
+async def _guarded(provider: str, call):
+    """Await call() in the provider's concurrency slot, under its circuit breaker.
+
+    An open breaker fails at once, before waiting for a slot. A call cut off
+    by a latency budget (cancelled mid-flight) says nothing about the
+    provider, so it only gives its slot back and is not recorded.
+    """
+    breaker = _breakers[provider]
+    if not breaker.allow():
+        raise ProviderUnavailable(provider)
+    started = None
     try:
-        s = (src or 'en')[:2]
-        d = (dst or 'vi')[:2]
-        r = requests.get(
-            'https://api.mymemory.translated.net/get',
-            params={'q': text, 'langpair': f'{s}|{d}'},
-            timeout=15,
-        )
+        async with _clients().semaphores[provider]:
+            started = time.monotonic()
+            result = await call()
+    except asyncio.CancelledError:
+        breaker.release()
+        raise
+    except Exception as e:
+        breaker.record(time.monotonic() - started, not _is_failure(e))
+        raise
+    breaker.record(time.monotonic() - started, True)
+    return result
+
+
+async def _get_json(provider: str, url: str, params: Dict[str, Any]) -> Any:
+    http = _clients().http
+
+    async def call():
+        r = await http.get(url, params=params, timeout=PROVIDER_TIMEOUTS[provider])
+        r.raise_for_status()
+        return r
+    return (await _guarded(provider, call)).json()
+
+
+async def _post_json(provider: str, url: str, data: Dict[str, Any]) -> Any:
+    http = _clients().http
+
+    async def call():
+        r = await http.post(url, data=data, timeout=PROVIDER_TIMEOUTS[provider])
         r.raise_for_status()
-        j = r.json()
-        return j.get('responseData', {}).get('translatedText')
+        return r
+    return (await _guarded(provider, call)).json()
+
+
+async def _chat(system: str, user: str, temperature: float, max_tokens: int) -> str:
+    """One OpenAI chat completion; returns the stripped reply text"""
+    client = _clients().openai
+    response = await _guarded('openai', lambda: client.chat.completions.create(
+        model=OPENAI_MODEL,
+        messages=[
+            {"role": "system", "content": system},
+            {"role": "user", "content": user},
+        ],
+        temperature=temperature,
+        max_tokens=max_tokens,
+        timeout=PROVIDER_TIMEOUTS['openai'],
+    ))
+    return (response.choices[0].message.content or '').strip()
+
+
+def provider_health() -> Dict[str, Dict[str, Any]]:
+    """Breaker state and recent latency per provider"""
+    return {p: b.snapshot() for p, b in _breakers.items()}
+
+
+# -------- Request coalescing (single-flight) --------
+def single_flight(fn):
+    """Share one in-flight call between concurrent identical calls of fn.
+
+    Calls are identical when their arguments (defaults applied) are equal,
+    compared exactly: results echo the input text and carry offsets into
+    it, so text differing only in spacing is a different call. Each waiter
+    gets its own copy of the result; a waiter that is cancelled does not
+    cancel the shared call.
+    """
+    sig = inspect.signature(fn)
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        bound = sig.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = (name,) + tuple(bound.arguments.values())
+        stats = _flight_stats.setdefault(name, {'calls': 0, 'coalesced': 0})
+        stats['calls'] += 1
+        task = _inflight.get(key)
+        if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            _inflight[key] = task
+
+            def _finished(t, key=key):
+                if _inflight.get(key) is t:
+                    del _inflight[key]
+                if not t.cancelled():
+                    t.exception()  # retrieved, even if every waiter went away
+
+            task.add_done_callback(_finished)
+        else:
+            stats['coalesced'] += 1
+        return copy.deepcopy(await asyncio.shield(task))
+
+    return wrapper
+
+
+def single_flight_stats() -> Dict[str, Any]:
+    """Calls and coalesced calls per function, plus calls in flight now"""
+    return {
+        'functions': {n: dict(c) for n, c in _flight_stats.items()},
+        'coalesced': sum(c['coalesced'] for c in _flight_stats.values()),
+        'in_flight': len(_inflight),
+    }
+
+
+# -------- Simple Translation Helper (MyMemory) --------
+def _mymemory_ok(j: Dict[str, Any]) -> bool:
+    # Quota and error notices come back as "translations" with another status
+    return str(j.get('responseStatus', 200)) == '200'
+
+
+@single_flight
+async def _translate_mymemory(text: str, src: str, dst: str) -> Optional[str]:
+    s = (src or 'en')[:2]
+    d = (dst or 'vi')[:2]
+    cached = await translation_cache.aget('mymemory', text, s, d)
+    if cached is not None:
+        return cached
+    try:
+        j = await _get_json('mymemory', MYMEMORY_URL, {'q': text, 'langpair': f'{s}|{d}'})
+        trans = j.get('responseData', {}).get('translatedText')
+        if not _mymemory_ok(j):
+            return None
+        if trans:
+            translation_cache.set('mymemory', text, s, d, trans)
+        return trans
     except Exception:
         return None
 
-def _translate_list(words: List[str], src: str, dst: str, limit: int = 5) -> List[str]:
-    out: List[str] = []
-    for w in words[:limit]:
-        tr = _translate_mymemory(w, src, dst)
-        out.append(tr or w)
-    return out
 
+async def _cached_translations(texts: List[str], from_lang: str, to_lang: str) -> Dict[str, str]:
+    """Earlier results of any provider translate_text would ask, best provider first (one cache read)"""
+    providers = [('openai', from_lang, to_lang)] if _has_openai() else []
+    providers.append(('mymemory', (from_lang or 'en')[:2], (to_lang or 'vi')[:2]))
+    hits = await translation_cache.aget_many([(p, t, src, dst) for t in texts for p, src, dst in providers])
+    found = {}
+    for i, text in enumerate(texts):
+        hit = next((h for h in hits[i * len(providers):(i + 1) * len(providers)] if h is not None), None)
+        if hit is not None:
+            found[text] = hit
+    return found
+
+# -------- Concurrent fan-out under a latency budget --------
+def _deadline() -> float:
+    return asyncio.get_running_loop().time() + AI_LATENCY_BUDGET
+
+
+def _remaining(deadline: Optional[float]) -> Optional[float]:
+    if deadline is None:
+        return None
+    return max(0.0, deadline - asyncio.get_running_loop().time())
+
+
+async def _gather_within(aws: List[Awaitable], deadline: Optional[float] = None) -> Tuple[List[Any], bool]:
+    """Run awaitables concurrently until the deadline.
+
+    Returns their results in order (None for failed or unfinished ones)
+    and whether anything was cut off by the deadline.
+    """
+    tasks = [asyncio.ensure_future(a) for a in aws]
+    if not tasks:
+        return [], False
+    done, pending = await asyncio.wait(tasks, timeout=_remaining(deadline))
+    for t in pending:
+        t.cancel()
+    results = [t.result() if t in done and t.exception() is None else None for t in tasks]
+    return results, bool(pending)
+
+
+async def _translate_list(words: List[str], src: str, dst: str, limit: int = 5,
+                          deadline: Optional[float] = None) -> Tuple[List[str], bool]:
+    """Translate words concurrently; words not translated in time are kept as they are"""
+    words = words[:limit]
+    translated, partial = await _gather_within([_translate_mymemory(w, src, dst) for w in words], deadline)
+    return [tr or w for w, tr in zip(words, translated)], partial
+
+
+async def _pairs(words: List[str], deadline: Optional[float]) -> Tuple[List[Dict[str, str]], bool]:
+    """[{'en', 'vi'}] for a word list, translated to Vietnamese concurrently"""
+    vi, partial = await _translate_list(words, 'en', 'vi', deadline=deadline)
+    return [{'en': e, 'vi': v} for e, v in zip(words, vi)], partial
+
+
+@single_flight
 async def translate_text(text: str, from_lang: str = 'en', to_lang: str = 'vi') -> Dict[str, Any]:
     """
     Translate text from one language to another
@@ -63,24 +342,28 @@ async def translate_text(text: str, from_lang: str = 'en', to_lang: str = 'vi')
     Returns:
         Dict with 'translation' and 'success' keys
     """
+    cached = (await _cached_translations([text], from_lang, to_lang)).get(text)
+    if cached is not None:
+        return {
+            'success': True,
+            'translation': cached,
+            'original': text,
+            'provider': 'cache'
+        }
+
     # Prefer OpenAI if configured
     if _has_openai():
         try:
             # Use OpenAI Chat API for translation
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": f"You are a professional translator. Translate from {from_lang} to {to_lang}. Only provide the translation, no explanations."
-                    },
-                    {"role": "user", "content": text},
-                ],
+            content = await _chat(
+                f"You are a professional translator. Translate from {from_lang} to {to_lang}. Only provide the translation, no explanations.",
+                text,
                 temperature=0.3,
                 max_tokens=200,
             )
 
-            translation = response.choices[0].message.content.strip()
+            translation = content
+            translation_cache.set('openai', text, from_lang, to_lang, translation)
             return {
                 'success': True,
                 'translation': translation,
@@ -98,14 +381,10 @@ async def translate_text(text: str, from_lang: str = 'en', to_lang: str = 'vi')
         # Constrain language codes to 2-letter pairs for MyMemory
         src = (from_lang or 'en')[:2]
         dst = (to_lang or 'vi')[:2]
-        r = requests.get(
-            'https://api.mymemory.translated.net/get',
-            params={'q': text, 'langpair': f'{src}|{dst}'},
-            timeout=15,
-        )
-        r.raise_for_status()
-        j = r.json()
+        j = await _get_json('mymemory', MYMEMORY_URL, {'q': text, 'langpair': f'{src}|{dst}'})
         trans = j.get('responseData', {}).get('translatedText')
+        if trans and _mymemory_ok(j):
+            translation_cache.set('mymemory', text, src, dst, trans)
         if trans:
             return {
                 'success': True,
@@ -122,111 +401,298 @@ async def translate_text(text: str, from_lang: str = 'en', to_lang: str = 'vi')
         'error': last_err or 'No translation provider available (install googletrans or set OPENAI_API_KEY)'
     }
 
+
+# -------- Bulk translation (whole sets) --------
+# Definitions that stand for "not filled in yet"
+PLACEHOLDER_DEFINITIONS = {'-', '--', '?', '??', '...', '…', 'n/a', 'na', 'none', 'null',
+                           'todo', 'tbd', 'x', 'chưa có', 'chưa có nghĩa', '(trống)'}
+
+
+def is_missing_definition(definition: Optional[str]) -> bool:
+    text = ' '.join((definition or '').split()).lower()
+    return not text or text in PLACEHOLDER_DEFINITIONS
+
+
+async def _translate_batch_openai(words: List[str], from_lang: str, to_lang: str) -> Dict[str, str]:
+    """Translate up to OPENAI_BATCH_SIZE words in one prompt; words missing from the reply are left out"""
+    content = await _chat(
+        f"You are a professional translator. Translate each {from_lang} word or phrase of the JSON list to {to_lang}. "
+        "Reply with only a JSON object mapping every input, exactly as given, to its translation.",
+        json.dumps(words, ensure_ascii=False),
+        temperature=0.3,
+        max_tokens=min(4000, 30 * len(words) + 50),
+    )
+    try:
+        data = json.loads(content[content.find('{'):content.rfind('}') + 1])
+    except ValueError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    return {w: data[w].strip() for w in words if isinstance(data.get(w), str) and data[w].strip()}
+
+
+async def translate_many(words: List[str], from_lang: str = 'en', to_lang: str = 'vi') -> Dict[str, Any]:
+    """
+    Translate many words with as few upstream calls as possible
+
+    Cached words are served locally, the rest go to OpenAI in prompts of
+    OPENAI_BATCH_SIZE words; of whatever is still missing, up to
+    MYMEMORY_MAX_WORDS are sent to MyMemory one word per request,
+    MYMEMORY_CONCURRENCY at a time and within the latency budget.
+
+    Returns:
+        Dict with 'translations' ({word: translation}), 'providers'
+        ({provider: words}), 'failed' (words tried but left untranslated)
+        and 'remaining' (words over the MyMemory cap, not tried)
+    """
+    todo = list(dict.fromkeys(w for w in words if w and w.strip()))
+    translations: Dict[str, str] = {}
+    providers: Dict[str, int] = {}
+
+    def found(word: str, translation: str, provider: str):
+        translations[word] = translation
+        providers[provider] = providers.get(provider, 0) + 1
+
+    for w, hit in (await _cached_translations(todo, from_lang, to_lang)).items():
+        found(w, hit, 'cache')
+    todo = [w for w in todo if w not in translations]
+
+    if todo and _has_openai():
+        batches = [todo[i:i + OPENAI_BATCH_SIZE] for i in range(0, len(todo), OPENAI_BATCH_SIZE)]
+        results = await asyncio.gather(*[_translate_batch_openai(b, from_lang, to_lang) for b in batches],
+                                       return_exceptions=True)
+        for res in results:
+            if isinstance(res, dict):
+                for w, tr in res.items():
+                    translation_cache.set('openai', w, from_lang, to_lang, tr)
+                    found(w, tr, 'openai')
+        todo = [w for w in todo if w not in translations]
+
+    remaining = todo[MYMEMORY_MAX_WORDS:]
+    todo = todo[:MYMEMORY_MAX_WORDS]
+    if todo:
+        # Concurrency is capped by the MyMemory semaphore in _get_json
+        results, _ = await _gather_within([_translate_mymemory(w, from_lang, to_lang) for w in todo], _deadline())
+        for w, tr in zip(todo, results):
+            if tr:
+                found(w, tr, 'mymemory')
+        todo = [w for w in todo if w not in translations]
+
+    return {'translations': translations, 'providers': providers, 'failed': todo, 'remaining': remaining}
+
+# -------- Grammar (sentence by sentence, cached) --------
+# LanguageTool characters per request / sentences per OpenAI prompt
+GRAMMAR_BATCH_CHARS = int(os.getenv('GRAMMAR_BATCH_CHARS', '15000'))
+GRAMMAR_BATCH_SENTENCES = int(os.getenv('GRAMMAR_BATCH_SENTENCES', '30'))
+
+# A sentence runs to . ! ? (plus closing quotes/brackets) before whitespace, or to a line end
+_SENTENCE_RE = re.compile(r'\S(?:[^\n]*?(?:[.!?]+["\'”’)\]]*(?=\s|$)|(?=\n)|$))')
+
+
+# A period after these (or after a single letter, as in initials) does not end a sentence
+_ABBREVIATIONS = frozenset({
+    'mr.', 'mrs.', 'ms.', 'dr.', 'prof.', 'sr.', 'jr.', 'st.', 'mt.', 'vs.', 'etc.', 'e.g.', 'i.e.',
+    'cf.', 'al.', 'approx.', 'no.', 'fig.', 'vol.', 'p.', 'pp.', 'ca.', 'inc.', 'ltd.', 'co.', 'corp.',
+    'jan.', 'feb.', 'mar.', 'apr.', 'jun.', 'jul.', 'aug.', 'sep.', 'sept.', 'oct.', 'nov.', 'dec.',
+    'a.m.', 'p.m.', 'u.s.', 'u.k.',
+})
+
+
+def _ends_with_abbreviation(fragment: str) -> bool:
+    last = fragment.rsplit(None, 1)[-1].lstrip('("\'“‘[').lower()
+    return last in _ABBREVIATIONS or (len(last) == 2 and last[0].isalpha() and last[1] == '.')
+
+
+def split_sentences(text: str) -> List[Tuple[int, int]]:
+    """(start, end) of each sentence; the text between them is only whitespace"""
+    spans: List[Tuple[int, int]] = []
+    joined = False
+    for m in _SENTENCE_RE.finditer(text):
+        if joined and '\n' not in text[spans[-1][1]:m.start()]:
+            spans[-1] = (spans[-1][0], m.end())
+        else:
+            spans.append(m.span())
+        joined = _ends_with_abbreviation(text[m.start():m.end()])
+    return spans
+
+
+def _sentence_hash(sentence: str) -> str:
+    return hashlib.sha1(sentence.encode('utf-8')).hexdigest()
+
+
+def _apply_issues(sentence: str, issues: List[Dict[str, Any]]) -> str:
+    """Apply the first replacement of each issue, from the end so offsets stay valid"""
+    corrected = sentence
+    for issue in sorted(issues, key=lambda i: i.get('offset') or 0, reverse=True):
+        if issue.get('replacement') is None or issue.get('offset') is None:
+            continue
+        off, length = issue['offset'], issue.get('length') or 0
+        corrected = corrected[:off] + issue['replacement'] + corrected[off + length:]
+    return corrected
+
+
+async def _grammar_languagetool(sentences: List[str], language: str) -> List[Dict[str, Any]]:
+    """Check sentences with LanguageTool, packing as many per request as fit"""
+    lang_code = 'en-US' if language.lower().startswith('en') else 'vi-VN'
+    batches: List[List[int]] = []
+    size = GRAMMAR_BATCH_CHARS
+    for i, sentence in enumerate(sentences):
+        if size + len(sentence) + 2 > GRAMMAR_BATCH_CHARS:
+            batches.append([])
+            size = 0
+        batches[-1].append(i)
+        size += len(sentence) + 2
+
+    issues: List[List[Dict[str, Any]]] = [[] for _ in sentences]
+
+    async def check(batch: List[int]):
+        starts, pos = [], 0
+        for i in batch:
+            starts.append(pos)
+            pos += len(sentences[i]) + 2
+        data = await _post_json('languagetool', LANGUAGETOOL_URL, {
+            'text': '\n\n'.join(sentences[i] for i in batch),
+            'language': lang_code,
+        })
+        for m in data.get('matches', []):
+            off = m.get('offset', 0)
+            k = bisect.bisect_right(starts, off) - 1
+            if k < 0:
+                continue
+            i = batch[k]
+            local, length = off - starts[k], m.get('length', 0)
+            if local + length > len(sentences[i]):
+                # Match runs into the separator; not ours to apply
+                continue
+            reps = m.get('replacements', [])
+            issues[i].append({
+                'offset': local,
+                'length': length,
+                'message': m.get('message', ''),
+                'rule': m.get('rule', {}).get('id', ''),
+                'replacement': reps[0]['value'] if reps else None,
+            })
+
+    await asyncio.gather(*[check(b) for b in batches])
+    return [{'corrected': _apply_issues(s, iss), 'issues': iss} for s, iss in zip(sentences, issues)]
+
+
+async def _grammar_openai(sentences: List[str], language: str) -> List[Dict[str, Any]]:
+    """Check sentences with OpenAI, GRAMMAR_BATCH_SENTENCES per prompt"""
+    lang_name = "English" if language == "en" else "Vietnamese"
+
+    async def check(batch: List[str]) -> List[Dict[str, Any]]:
+        content = await _chat(
+            f"You are a {lang_name} grammar expert. Check each sentence of the JSON list and correct its grammar errors. "
+            'Reply with only a JSON array holding, for each input in order, {"corrected": "...", "issues": ["short explanation", ...]}.',
+            json.dumps(batch, ensure_ascii=False),
+            temperature=0.3,
+            max_tokens=min(4000, 60 * len(batch) + sum(len(s) for s in batch)),
+        )
+        data = json.loads(content[content.find('['):content.rfind(']') + 1])
+        if not isinstance(data, list) or len(data) != len(batch):
+            raise ValueError('Unexpected grammar reply')
+        out = []
+        for sentence, item in zip(batch, data):
+            item = item if isinstance(item, dict) else {}
+            out.append({
+                'corrected': str(item.get('corrected') or sentence),
+                'issues': [{'offset': None, 'length': None, 'message': str(msg), 'rule': None, 'replacement': None}
+                           for msg in item.get('issues') or []],
+            })
+        return out
+
+    batches = [sentences[i:i + GRAMMAR_BATCH_SENTENCES] for i in range(0, len(sentences), GRAMMAR_BATCH_SENTENCES)]
+    results = await asyncio.gather(*[check(b) for b in batches])
+    return [r for batch in results for r in batch]
+
+
+def _issue_line(issue: Dict[str, Any]) -> str:
+    rule = f" ({issue['rule']})" if issue.get('rule') else ''
+    if issue.get('replacement'):
+        return f"- {issue['message']} → Suggestion: {issue['replacement']}{rule}"
+    return f"- {issue['message']}{rule}"
+
+
+@single_flight
 async def fix_grammar(text: str, language: str = 'en') -> Dict[str, Any]:
     """
     Check and fix grammar errors in text
     
+    The text is checked sentence by sentence. Sentences seen before are
+    answered from the cache; only the others go upstream, batched, and the
+    corrected text and issue offsets are put back together here.
+
     Args:
         text: Text to check
         language: Language code (en, vi)
     
     Returns:
-        Dict with 'corrected', 'errors', and 'success' keys
+        Dict with 'result' (corrected text and issues as one string),
+        'corrected', 'issues' (offsets into the original text where known)
+        and 'success' keys
     """
-    # Prefer OpenAI if available
-    if _has_openai():
-        try:
-            lang_name = "English" if language == "en" else "Vietnamese"
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": f"You are a {lang_name} grammar expert. Check and correct grammar errors. Provide the corrected text and briefly explain errors found."
-                    },
-                    {"role": "user", "content": f"Check this {lang_name} text for grammar errors:\n\n{text}"},
-                ],
-                temperature=0.3,
-                max_tokens=300,
-            )
-            result = response.choices[0].message.content.strip()
-            return {
-                'success': True,
-                'result': result,
-                'original': text,
-                'provider': 'openai'
-            }
-        except Exception as e:
-            last_err = str(e)
-    else:
-        last_err = None
-
-    # Free fallback: LanguageTool public API
-    try:
-        # Map language
-        lang_code = 'en-US' if language.lower().startswith('en') else 'vi-VN'
-        resp = requests.post(
-            'https://api.languagetool.org/v2/check',
-            data={
-                'text': text,
-                'language': lang_code,
-            },
-            timeout=15,
-        )
-        resp.raise_for_status()
-        data = resp.json()
-
-        matches: List[Dict[str, Any]] = data.get('matches', [])
+    spans = split_sentences(text)
+    sentences = [text[a:b] for a, b in spans]
+    checked: Dict[str, Dict[str, Any]] = {}
+    hits = await translation_cache.aget_many([('grammar', _sentence_hash(s), language, 'check') for s in sentences])
+    for sentence, hit in zip(sentences, hits):
+        if hit is not None:
+            checked[sentence] = json.loads(hit)
+    misses = list(dict.fromkeys(s for s in sentences if s not in checked))
 
-        # Build corrected text by applying first replacement of each match
-        corrected = text
-        # Apply from end to start to keep offsets valid
-        def _first_replacement(m):
-            reps = m.get('replacements', [])
-            return reps[0]['value'] if reps else None
-
-        # Sort by offset desc
-        for m in sorted(matches, key=lambda x: x.get('offset', 0), reverse=True):
-            off = m.get('offset', 0)
-            length = m.get('length', 0)
-            rep = _first_replacement(m)
-            if rep is None:
-                continue
+    provider, last_err = 'cache', None
+    if misses:
+        fresh = None
+        # Prefer OpenAI if available
+        if _has_openai():
             try:
-                corrected = corrected[:off] + rep + corrected[off+length:]
-            except Exception:
-                # Ignore malformed offsets
-                pass
-
-        # Build readable issues list
-        issues_lines = []
-        for m in matches:
-            msg = m.get('message', '')
-            rule = m.get('rule', {}).get('id', '')
-            repl = _first_replacement(m)
-            if repl:
-                issues_lines.append(f"- {msg} → Suggestion: {repl} ({rule})")
-            else:
-                issues_lines.append(f"- {msg} ({rule})")
+                fresh, provider = await _grammar_openai(misses, language), 'openai'
+            except Exception as e:
+                last_err = str(e)
+        # Free fallback: LanguageTool public API
+        if fresh is None:
+            try:
+                fresh, provider = await _grammar_languagetool(misses, language), 'languagetool'
+            except Exception as e:
+                last_err = str(e)
+        if fresh is None:
+            return {
+                'success': False,
+                'error': last_err or 'No grammar provider available (OpenAI or LanguageTool)'
+            }
+        for sentence, res in zip(misses, fresh):
+            checked[sentence] = res
+            translation_cache.set('grammar', _sentence_hash(sentence), language, 'check',
+                                  json.dumps(res, ensure_ascii=False))
 
-        combined = "Corrected:\n" + corrected
-        if issues_lines:
-            combined += "\n\nIssues:\n" + "\n".join(issues_lines)
+    parts, issues, pos = [], [], 0
+    for (start, end), sentence in zip(spans, sentences):
+        res = checked[sentence]
+        parts.append(text[pos:start])
+        parts.append(res['corrected'])
+        pos = end
+        for issue in res['issues']:
+            issues.append(dict(issue, offset=start + issue['offset'] if issue.get('offset') is not None else None))
+    parts.append(text[pos:])
+    corrected = ''.join(parts)
 
-        return {
-            'success': True,
-            'result': combined,
-            'original': text,
-            'provider': 'languagetool'
-        }
-    except Exception as e:
-        last_err = str(e)
+    combined = "Corrected:\n" + corrected
+    if issues:
+        combined += "\n\nIssues:\n" + "\n".join(_issue_line(i) for i in issues)
 
     return {
-        'success': False,
-        'error': last_err or 'No grammar provider available (OpenAI or LanguageTool)'
+        'success': True,
+        'result': combined,
+        'original': text,
+        'corrected': corrected,
+        'issues': issues,
+        'sentences': len(sentences),
+        'checked': len(misses),
+        'provider': provider
     }
 
+@single_flight
 async def generate_example(word: str, pos: str = None, definition: str = None) -> Dict[str, Any]:
     """
     Generate example sentence for a vocabulary word
@@ -246,19 +712,13 @@ async def generate_example(word: str, pos: str = None, definition: str = None) -
                 context += f"\nPart of speech: {pos}"
             if definition:
                 context += f"\nDefinition: {definition}"
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an English teacher. Generate a clear, natural example sentence using the given word. Keep it simple and practical."
-                    },
-                    {"role": "user", "content": context},
-                ],
+            content = await _chat(
+                "You are an English teacher. Generate a clear, natural example sentence using the given word. Keep it simple and practical.",
+                context,
                 temperature=0.7,
                 max_tokens=100,
             )
-            example = response.choices[0].message.content.strip().strip('"').strip("'")
+            example = content.strip('"').strip("'")
             return {
                 'success': True,
                 'example': example,
@@ -283,6 +743,7 @@ async def generate_example(word: str, pos: str = None, definition: str = None) -
         'provider': 'template'
     }
 
+@single_flight
 async def suggest_synonyms(word: str, pos: str = None, language: str = 'en', translate_to: Optional[str] = 'vi') -> Dict[str, Any]:
     """
     Suggest synonyms for a word
@@ -292,26 +753,22 @@ async def suggest_synonyms(word: str, pos: str = None, language: str = 'en', tra
         pos: Part of speech (optional)
     
     Returns:
-        Dict with 'synonyms' list and 'success' keys
+        Dict with 'synonyms' list, 'partial' and 'success' keys
     """
+    deadline = _deadline()
     if _has_openai():
         try:
             context = f"Word: {word}"
             if pos:
                 context += f"\nPart of speech: {pos}"
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an English vocabulary expert. Provide 5 common synonyms for the given word. List them separated by commas, no explanations."
-                    },
-                    {"role": "user", "content": context},
-                ],
+            # OpenAI may use at most half of the budget; the rest is for the fallback
+            content = await asyncio.wait_for(_chat(
+                "You are an English vocabulary expert. Provide 5 common synonyms for the given word. List them separated by commas, no explanations.",
+                context,
                 temperature=0.5,
                 max_tokens=100,
-            )
-            synonyms_text = response.choices[0].message.content.strip()
+            ), _remaining(deadline) / 2)
+            synonyms_text = content
             synonyms = [s.strip() for s in synonyms_text.split(',')]
             syn = synonyms[:5]
             result: Dict[str, Any] = {
@@ -323,31 +780,34 @@ async def suggest_synonyms(word: str, pos: str = None, language: str = 'en', tra
             if language.startswith('vi') and translate_to:
                 # Word is Vietnamese -> translate to EN to align with OpenAI
                 # But since we already asked in EN, just return EN list and a VI translation list
-                vi_syn = _translate_list(syn, 'en', 'vi')
-                result['synonyms'] = [{'en': e, 'vi': v} for e, v in zip(syn, vi_syn)]
+                result['synonyms'], result['partial'] = await _pairs(syn, deadline)
             elif language.startswith('en') and (translate_to and translate_to.startswith('vi')):
-                vi_syn = _translate_list(syn, 'en', 'vi')
-                result['synonyms'] = [{'en': e, 'vi': v} for e, v in zip(syn, vi_syn)]
+                result['synonyms'], result['partial'] = await _pairs(syn, deadline)
             else:
-                result['synonyms'] = [{'en': e} for e in syn]
+                result['synonyms'], result['partial'] = [{'en': e} for e in syn], False
             return result
         except Exception:
             pass
 
     # Free fallback: Datamuse API (public)
     try:
-        params = {"ml": word}
-        # Try direct synonyms list as well
-        r = requests.get("https://api.datamuse.com/words", params=params, timeout=10)
-        r.raise_for_status()
-        items = r.json()
-        # If language is vi, translate headword to en first to improve results
-        en_head = word
         if language.startswith('vi'):
-            en_head = _translate_mymemory(word, 'vi', 'en') or word
-            r2 = requests.get("https://api.datamuse.com/words", params={"ml": en_head}, timeout=10)
-            if r2.ok:
-                items = r2.json()
+            # Direct lookup and headword translation (vi -> en) side by side;
+            # the English headword usually gives the better list
+            (items, en_head), _ = await _gather_within([
+                _get_json('datamuse', DATAMUSE_URL, {"ml": word}),
+                _translate_mymemory(word, 'vi', 'en'),
+            ], deadline)
+            if en_head:
+                try:
+                    items = await asyncio.wait_for(_get_json('datamuse', DATAMUSE_URL, {"ml": en_head}), _remaining(deadline))
+                except Exception:
+                    # Keep the direct lookup's list (timeout, HTTP error, open breaker)
+                    pass
+            if items is None:
+                raise ValueError('Datamuse lookup failed')
+        else:
+            items = await asyncio.wait_for(_get_json('datamuse', DATAMUSE_URL, {"ml": word}), _remaining(deadline))
 
         synonyms = [it.get('word') for it in items if it.get('word')]
         syn = synonyms[:5]
@@ -358,14 +818,12 @@ async def suggest_synonyms(word: str, pos: str = None, language: str = 'en', tra
             'language': language,
         }
         if language.startswith('en') and translate_to and translate_to.startswith('vi'):
-            vi_syn = _translate_list(syn, 'en', 'vi')
-            result['synonyms'] = [{'en': e, 'vi': v} for e, v in zip(syn, vi_syn)]
+            result['synonyms'], result['partial'] = await _pairs(syn, deadline)
         elif language.startswith('vi'):
             # We looked up via EN; translate back to VI
-            vi_syn = _translate_list(syn, 'en', 'vi')
-            result['synonyms'] = [{'en': e, 'vi': v} for e, v in zip(syn, vi_syn)]
+            result['synonyms'], result['partial'] = await _pairs(syn, deadline)
         else:
-            result['synonyms'] = [{'en': e} for e in syn]
+            result['synonyms'], result['partial'] = [{'en': e} for e in syn], False
         return result
     except Exception:
         pass
@@ -376,29 +834,25 @@ async def suggest_synonyms(word: str, pos: str = None, language: str = 'en', tra
     }
 
 
+@single_flight
 async def suggest_antonyms(word: str, pos: str = None, language: str = 'en', translate_to: Optional[str] = 'vi') -> Dict[str, Any]:
     """
     Suggest antonyms for a word with optional bilingual output.
     """
+    deadline = _deadline()
     # Prefer OpenAI
     if _has_openai():
         try:
             context = f"Word: {word}"
             if pos:
                 context += f"\nPart of speech: {pos}"
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an English vocabulary expert. Provide 5 common antonyms for the given word. List them separated by commas, no explanations."
-                    },
-                    {"role": "user", "content": context},
-                ],
+            content = await asyncio.wait_for(_chat(
+                "You are an English vocabulary expert. Provide 5 common antonyms for the given word. List them separated by commas, no explanations.",
+                context,
                 temperature=0.5,
                 max_tokens=100,
-            )
-            antonyms_text = response.choices[0].message.content.strip()
+            ), _remaining(deadline) / 2)
+            antonyms_text = content
             ants = [s.strip() for s in antonyms_text.split(',')][:5]
             result: Dict[str, Any] = {
                 'success': True,
@@ -407,13 +861,11 @@ async def suggest_antonyms(word: str, pos: str = None, language: str = 'en', tra
                 'language': language,
             }
             if language.startswith('en') and translate_to and translate_to.startswith('vi'):
-                vi_ants = _translate_list(ants, 'en', 'vi')
-                result['antonyms'] = [{'en': e, 'vi': v} for e, v in zip(ants, vi_ants)]
+                result['antonyms'], result['partial'] = await _pairs(ants, deadline)
             elif language.startswith('vi'):
-                vi_ants = _translate_list(ants, 'en', 'vi')
-                result['antonyms'] = [{'en': e, 'vi': v} for e, v in zip(ants, vi_ants)]
+                result['antonyms'], result['partial'] = await _pairs(ants, deadline)
             else:
-                result['antonyms'] = [{'en': e} for e in ants]
+                result['antonyms'], result['partial'] = [{'en': e} for e in ants], False
             return result
         except Exception:
             pass
@@ -423,10 +875,12 @@ async def suggest_antonyms(word: str, pos: str = None, language: str = 'en', tra
         # For better results in VI, translate headword to EN
         en_head = word
         if language.startswith('vi'):
-            en_head = _translate_mymemory(word, 'vi', 'en') or word
-        r = requests.get("https://api.datamuse.com/words", params={"rel_ant": en_head}, timeout=10)
-        r.raise_for_status()
-        items = r.json()
+            # Half of what is left at most, so the antonym lookup still has time
+            try:
+                en_head = await asyncio.wait_for(_translate_mymemory(word, 'vi', 'en'), _remaining(deadline) / 2) or word
+            except Exception:
+                en_head = word
+        items = await asyncio.wait_for(_get_json('datamuse', DATAMUSE_URL, {"rel_ant": en_head}), _remaining(deadline))
         ants = [it.get('word') for it in items if it.get('word')][:5]
         result: Dict[str, Any] = {
             'success': True,
@@ -435,13 +889,13 @@ async def suggest_antonyms(word: str, pos: str = None, language: str = 'en', tra
             'language': language,
         }
         if language.startswith('en') and translate_to and translate_to.startswith('vi'):
-            vi_ants = _translate_list(ants, 'en', 'vi')
-            result['antonyms'] = [{'en': e, 'vi': v} for e, v in zip(ants, vi_ants)]
+            result['antonyms'], result['partial'] = await _pairs(ants, deadline)
         elif language.startswith('vi'):
-            vi_ants = _translate_list(ants, 'en', 'vi')
-            result['antonyms'] = [{'en': e, 'vi': v} for e, v in zip(ants, vi_ants)]
+            result['antonyms'], result['partial'] = await _pairs(ants, deadline)
         else:
-            result['antonyms'] = [{'en': e} for e in ants]
+            result['antonyms'], result['partial'] = [{'en': e} for e in ants], False
         return result
+    except asyncio.TimeoutError:
+        return {'success': False, 'error': 'Antonym lookup timed out'}
     except Exception as e:
         return {'success': False, 'error': str(e)}
@@ -0,0 +1,181 @@
+"""
+Streaming analytics over the append-only review log (data/reviews.jsonl).
+
+The log is read line by line and fed into small aggregators, so memory grows
+with the size of the answer (days, sets, terms of one user) and never with
+the size of the log itself.
+"""
+import os
+import json
+from datetime import datetime, date, timedelta
+from typing import Dict, Any, Iterator, List, Optional
+
+from . import storage
+
+# SM-2 treats ratings below 3 as "forgotten" (the card is reset)
+RECALL_RATING = 3
+
+# Upper bounds (in days since the previous review) of the retention buckets
+RETENTION_BUCKETS = (1, 2, 4, 7, 14, 30, 60, 120, 365)
+
+
+def iter_reviews(user_id: Optional[str] = None, path: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Yield review events in log order, optionally only those of one user"""
+    path = path or storage.REVIEW_LOG_FILE
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                ev = json.loads(line)
+            except ValueError:
+                # A torn line from an interrupted append; skip it
+                continue
+            if user_id is not None and ev.get('u') != user_id:
+                continue
+            yield ev
+
+
+def _day(ts: int) -> str:
+    return datetime.utcfromtimestamp(ts).date().isoformat()
+
+
+class DailyCounts:
+    """Number of reviews per (UTC) day"""
+    def __init__(self):
+        self.counts: Dict[str, int] = {}
+
+    def add(self, ev: Dict[str, Any]):
+        d = _day(ev.get('ts', 0))
+        self.counts[d] = self.counts.get(d, 0) + 1
+
+    def result(self) -> Dict[str, int]:
+        return dict(sorted(self.counts.items()))
+
+
+class Streak:
+    """Consecutive (UTC) days with at least one review, ending today or yesterday"""
+    def __init__(self, today: Optional[date] = None):
+        # Events are bucketed by UTC day (_day), so "today" must be the UTC date too
+        self.today = today or datetime.utcnow().date()
+        self.days = set()
+
+    def add(self, ev: Dict[str, Any]):
+        self.days.add(_day(ev.get('ts', 0)))
+
+    def result(self) -> int:
+        current = self.today
+        if current.isoformat() not in self.days:
+            # Not studied yet today: yesterday's streak is still alive
+            current -= timedelta(days=1)
+        streak = 0
+        while current.isoformat() in self.days:
+            streak += 1
+            current -= timedelta(days=1)
+        return streak
+
+
+class Retention:
+    """Share of reviews recalled, bucketed by days since the previous review of the same term"""
+    def __init__(self, buckets=RETENTION_BUCKETS):
+        self.buckets = list(buckets)
+        self.last_seen: Dict[str, int] = {}
+        self.reviews = [0] * len(self.buckets)
+        self.recalled = [0] * len(self.buckets)
+
+    def add(self, ev: Dict[str, Any]):
+        term_id = ev.get('t')
+        ts = ev.get('ts', 0)
+        prev = self.last_seen.get(term_id)
+        self.last_seen[term_id] = ts
+        if prev is None:
+            return
+        elapsed = (ts - prev) / 86400.0
+        for i, upper in enumerate(self.buckets):
+            if elapsed <= upper or i == len(self.buckets) - 1:
+                self.reviews[i] += 1
+                if ev.get('r', 0) >= RECALL_RATING:
+                    self.recalled[i] += 1
+                break
+
+    def result(self) -> List[Dict[str, Any]]:
+        curve = []
+        for upper, n, ok in zip(self.buckets, self.reviews, self.recalled):
+            curve.append({
+                'max_days': upper,
+                'reviews': n,
+                'recalled': ok,
+                'retention': round(ok / n * 100, 1) if n else None,
+            })
+        return curve
+
+
+class SetAccuracy:
+    """Reviews, recalled answers and mean response time per set"""
+    def __init__(self):
+        self.sets: Dict[str, Dict[str, int]] = {}
+
+    def add(self, ev: Dict[str, Any]):
+        sid = ev.get('s')
+        if not sid:
+            return
+        row = self.sets.setdefault(sid, {'reviews': 0, 'correct': 0, 'ms_total': 0, 'ms_count': 0})
+        row['reviews'] += 1
+        if ev.get('r', 0) >= RECALL_RATING:
+            row['correct'] += 1
+        if isinstance(ev.get('ms'), (int, float)):
+            row['ms_total'] += ev['ms']
+            row['ms_count'] += 1
+
+    def result(self) -> Dict[str, Dict[str, Any]]:
+        out = {}
+        for sid, row in self.sets.items():
+            out[sid] = {
+                'reviews': row['reviews'],
+                'correct': row['correct'],
+                'accuracy': round(row['correct'] / row['reviews'] * 100, 1),
+                'avg_response_ms': round(row['ms_total'] / row['ms_count']) if row['ms_count'] else None,
+            }
+        return out
+
+
+def aggregate(user_id: Optional[str], *aggregators):
+    """Feed every matching log event through all aggregators in a single pass"""
+    for ev in iter_reviews(user_id):
+        for agg in aggregators:
+            agg.add(ev)
+    return aggregators
+
+
+def daily_review_counts(user_id: str) -> Dict[str, int]:
+    daily, = aggregate(user_id, DailyCounts())
+    return daily.result()
+
+
+def review_streak(user_id: str) -> int:
+    streak, = aggregate(user_id, Streak())
+    return streak.result()
+
+
+def retention_curve(user_id: str) -> List[Dict[str, Any]]:
+    retention, = aggregate(user_id, Retention())
+    return retention.result()
+
+
+def set_accuracy(user_id: str) -> Dict[str, Dict[str, Any]]:
+    acc, = aggregate(user_id, SetAccuracy())
+    return acc.result()
+
+
+def review_history(user_id: str) -> Dict[str, Any]:
+    """All analytics for one user, computed in one pass over the log"""
+    daily, streak, retention, acc = aggregate(user_id, DailyCounts(), Streak(), Retention(), SetAccuracy())
+    return {
+        'daily': daily.result(),
+        'streak': streak.result(),
+        'retention': retention.result(),
+        'sets': acc.result(),
+    }
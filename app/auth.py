@@ -3,7 +3,7 @@ import json
 import hashlib
 from typing import Optional, Dict, Any
 
-DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
+DATA_DIR = os.getenv('VOCAB_DATA_DIR') or os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
 USERS_FILE = os.path.join(DATA_DIR, 'users.json')
 
 os.makedirs(DATA_DIR, exist_ok=True)
@@ -1,14 +1,14 @@
-import csv, io
-from typing import List, Dict, Tuple
+import csv, io, os, re, html, json, codecs, shutil, sqlite3, zipfile, tempfile
+from typing import List, Dict, Tuple, Iterator, BinaryIO, Optional
 try:
     import openpyxl  # type: ignore
 except Exception:
     openpyxl = None
 
 HEADER_HINTS = {
-    'word': ['từ', 'từ vựng', 'term', 'word', 'english', 'vocabulary', 'từ tiếng anh', 'vocab'],
+    'word': ['từ', 'từ vựng', 'term', 'word', 'english', 'vocabulary', 'từ tiếng anh', 'vocab', 'front'],
     'pos': ['loại từ', 'từ loại', 'pos', 'part of speech', 'word type', 'type'],
-    'meaning': ['nghĩa', 'định nghĩa', 'definition', 'meaning', 'translation', 'dịch', 'tiếng việt', 'vietnamese'],
+    'meaning': ['nghĩa', 'định nghĩa', 'definition', 'meaning', 'translation', 'dịch', 'tiếng việt', 'vietnamese', 'back'],
     'pronunciation': ['phiên âm', 'phát âm', 'pronunciation', 'phonetic', 'ipa', 'transcription'],
     'example': ['ví dụ', 'ví du', 'example', 'sample', 'sentence', 'usage', 'câu ví dụ']
 }
@@ -35,10 +35,15 @@ def has_vietnamese(text: str) -> bool:
     return False
 
 
+# Character classes used by score_content, compiled once
+_VN_RE = re.compile('[ăâêôơưđĂÂÊÔƠƯĐáàảãạéèẻẽẹíìỉĩịóòỏõọúùủũụýỳỷỹỵ]')
+_IPA_RE = re.compile('[əɪʊɔɑæʌɜθðʃʒŋ]')
+_SENTENCE_RE = re.compile(r'[.!?]|ex:|ví dụ', re.IGNORECASE)
+
+
 def _has_vietnamese_chars(text: str) -> bool:
     """More accurate Vietnamese detection"""
-    vn_chars = 'ăâêôơưđĂÂÊÔƠƯĐáàảãạéèẻẽẹíìỉĩịóòỏõọúùủũụýỳỷỹỵ'
-    return any(ch in vn_chars for ch in text)
+    return _VN_RE.search(text) is not None
 
 
 def is_pos_value(s: str) -> bool:
@@ -48,38 +53,232 @@ def is_pos_value(s: str) -> bool:
     return s in POS_VALUES
 
 
-def sniff_csv_bytes(b: bytes) -> List[Dict[str, str]]:
-    for enc in ('utf-8-sig', 'utf-8', 'cp1258', 'cp1252', 'latin-1'):
+CSV_ENCODINGS = ('utf-8-sig', 'utf-8', 'cp1258', 'cp1252', 'latin-1')
+# Bytes read from the start of an upload to pick its encoding
+ENCODING_SAMPLE_BYTES = 64 * 1024
+
+
+def detect_encoding(sample: bytes) -> Optional[str]:
+    """Pick the first candidate encoding that decodes the sample.
+
+    None when the sample is plain ASCII: every candidate reads it the same,
+    so the choice is left to the first line that is not. The sample may end
+    in the middle of a multi-byte character, so it is decoded incrementally
+    without flushing.
+    """
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if sample.isascii():
+        return None
+    for enc in CSV_ENCODINGS[1:]:
         try:
-            text = b.decode(enc)
-            f = io.StringIO(text)
-            reader = csv.DictReader(f)
-            rows = list(reader)
-            if rows and reader.fieldnames:
-                return rows
-        except Exception:
+            codecs.getincrementaldecoder(enc)().decode(sample, final=False)
+            return enc
+        except UnicodeDecodeError:
             continue
     raise ValueError('CSV encoding không hỗ trợ')
 
 
-def read_xlsx_bytes(b: bytes) -> List[Dict[str, str]]:
+def _cr_lines(f: BinaryIO) -> Iterator[bytes]:
+    """Lines of a file whose line breaks are a bare CR (old Mac exports)"""
+    rest = b''
+    for chunk in iter(lambda: f.read(1024 * 1024), b''):
+        lines = (rest + chunk).split(b'\r')
+        rest = lines.pop()
+        for line in lines:
+            yield line + b'\r'
+    if rest:
+        yield rest
+
+
+def _decoded_lines(f: BinaryIO, enc: Optional[str], bare_cr: bool = False) -> Iterator[str]:
+    """Lines of f decoded strictly, starting with `enc` (None: not decided yet).
+
+    A line the current encoding cannot decode moves on to the next candidate
+    that can, for it and the rest of the file, so bytes past the encoding
+    sample are never replaced. Line breaks are ASCII in every candidate.
+    """
+    if enc == 'utf-8-sig':
+        f.read(len(codecs.BOM_UTF8))
+        enc = 'utf-8'
+    candidates = list(CSV_ENCODINGS[CSV_ENCODINGS.index(enc):] if enc else CSV_ENCODINGS[1:])
+    for raw in (_cr_lines(f) if bare_cr else f):
+        while True:
+            try:
+                yield raw.decode(candidates[0])
+                break
+            except UnicodeDecodeError:
+                candidates.pop(0)
+                if not candidates:
+                    raise ValueError('CSV encoding không hỗ trợ')
+
+
+def iter_csv(f: BinaryIO) -> Iterator[Dict[str, str]]:
+    """Yield CSV rows one by one from a seekable binary file"""
+    sample = f.read(ENCODING_SAMPLE_BYTES)
+    f.seek(0)
+    bare_cr = b'\r' in sample and b'\n' not in sample
+    reader = csv.DictReader(_decoded_lines(f, detect_encoding(sample), bare_cr))
+    if not reader.fieldnames:
+        raise ValueError('CSV encoding không hỗ trợ')
+    for row in reader:
+        yield row
+
+
+def sniff_csv_bytes(b: bytes) -> List[Dict[str, str]]:
+    return list(iter_csv(io.BytesIO(b)))
+
+
+def _open_workbook(f: BinaryIO):
     if openpyxl is None:
         raise ValueError('Thiếu openpyxl để đọc XLSX')
-    bio = io.BytesIO(b)
-    wb = openpyxl.load_workbook(bio, data_only=True)
-    ws = wb.active
-    rows = list(ws.iter_rows(values_only=True))
-    if not rows:
-        return []
-    headers = [str(h).strip() if h is not None else '' for h in rows[0]]
-    data = []
-    for r in rows[1:]:
-        rec = {}
-        for i, h in enumerate(headers):
-            val = r[i] if i < len(r) else None
-            rec[h or f'c{i+1}'] = '' if val is None else str(val)
-        data.append(rec)
-    return data
+    # read_only streams the sheet XML instead of building every cell object
+    try:
+        return openpyxl.load_workbook(f, read_only=True, data_only=True)
+    except zipfile.BadZipFile:
+        raise ValueError('File Excel không hợp lệ')
+
+
+def _pick_sheet(wb, sheet: Optional[str] = None):
+    """Sheet by name or 1-based index; the active sheet when not given"""
+    if sheet is None or str(sheet).strip() == '':
+        return wb.active
+    sheet = str(sheet).strip()
+    if sheet in wb.sheetnames:
+        return wb[sheet]
+    if sheet.isdigit() and 1 <= int(sheet) <= len(wb.sheetnames):
+        return wb[wb.sheetnames[int(sheet) - 1]]
+    raise ValueError(f'Không tìm thấy sheet "{sheet}"')
+
+
+def list_sheets(f: BinaryIO) -> Tuple[List[str], str]:
+    """Sheet names of a workbook and the name of its active sheet"""
+    wb = _open_workbook(f)
+    try:
+        return list(wb.sheetnames), wb.active.title
+    finally:
+        wb.close()
+        f.seek(0)
+
+
+def iter_xlsx(f: BinaryIO, sheet: Optional[str] = None) -> Iterator[Dict[str, str]]:
+    """Yield rows of one worksheet lazily as dicts keyed by the header row"""
+    wb = _open_workbook(f)
+    try:
+        ws = _pick_sheet(wb, sheet)
+        # Files written by some tools declare a wrong sheet size
+        ws.reset_dimensions()
+        rows = ws.iter_rows(values_only=True)
+        first = next(rows, None)
+        if first is None:
+            return
+        headers = [str(h).strip() if h is not None else '' for h in first]
+        for r in rows:
+            rec = {}
+            for i, h in enumerate(headers):
+                val = r[i] if i < len(r) else None
+                rec[h or f'c{i+1}'] = '' if val is None else str(val)
+            yield rec
+    finally:
+        wb.close()
+
+
+def read_xlsx_bytes(b: bytes, sheet: Optional[str] = None) -> List[Dict[str, str]]:
+    return list(iter_xlsx(io.BytesIO(b), sheet))
+
+
+def iter_jsonl(f: BinaryIO) -> Iterator[Dict[str, str]]:
+    """Yield one row per JSON object line; values become strings like CSV cells"""
+    text = io.TextIOWrapper(f, encoding='utf-8-sig', errors='replace')
+    try:
+        for n, line in enumerate(text, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                obj = json.loads(line)
+            except ValueError:
+                raise ValueError(f'Dòng {n} không phải JSON hợp lệ')
+            if not isinstance(obj, dict):
+                raise ValueError(f'Dòng {n} không phải đối tượng JSON')
+            yield {str(k): '' if v is None else (v if isinstance(v, str) else json.dumps(v, ensure_ascii=False))
+                   for k, v in obj.items()}
+    finally:
+        if not f.closed:
+            text.detach()
+
+
+# Anki packages: a zip with the SQLite collection. Newer exports may only
+# carry a zstd-compressed collection.anki21b next to a placeholder anki2.
+APKG_COLLECTIONS = ('collection.anki21', 'collection.anki2')
+_HTML_BREAK_RE = re.compile(r'<\s*(br|/div|/p|/li)\s*/?>', re.IGNORECASE)
+_HTML_TAG_RE = re.compile(r'<[^>]+>')
+_ANKI_MEDIA_RE = re.compile(r'\[sound:[^\]]*\]')
+
+
+def strip_html(value: str) -> str:
+    """Plain text of an Anki field: tags and [sound:] refs removed, entities decoded"""
+    value = _HTML_BREAK_RE.sub('\n', value or '')
+    value = _ANKI_MEDIA_RE.sub('', _HTML_TAG_RE.sub('', value))
+    lines = (' '.join(html.unescape(line).split()) for line in value.split('\n'))
+    return '\n'.join(line for line in lines if line)
+
+
+def _anki_field_names(conn) -> Dict[int, List[str]]:
+    """Field names per note type id, from col.models (schema 11) or the fields table (schema 18)"""
+    names: Dict[int, List[str]] = {}
+    row = conn.execute('SELECT models FROM col').fetchone()
+    models = json.loads(row[0]) if row and row[0] else {}
+    for mid, model in models.items():
+        flds = sorted(model.get('flds', []), key=lambda fl: fl.get('ord', 0))
+        names[int(mid)] = [fl.get('name') or f'Field {i + 1}' for i, fl in enumerate(flds)]
+    if not names:
+        try:
+            for ntid, _, name in conn.execute('SELECT ntid, ord, name FROM fields ORDER BY ntid, ord'):
+                names.setdefault(ntid, []).append(name)
+        except sqlite3.Error:
+            pass
+    return names
+
+
+def iter_apkg(f: BinaryIO) -> Iterator[Dict[str, str]]:
+    """Yield one row per Anki note, keyed by the field names of the first note's type.
+
+    The collection is copied out of the zip to a temp file (SQLite needs a
+    real file) and notes are read with a cursor, one at a time. Notes of
+    other types are mapped onto those headers by field position.
+    """
+    try:
+        zf = zipfile.ZipFile(f)
+    except zipfile.BadZipFile:
+        raise ValueError('File Anki không hợp lệ')
+    names = set(zf.namelist())
+    member = next((m for m in APKG_COLLECTIONS if m in names), None)
+    if member is None or ('collection.anki21b' in names and member == 'collection.anki2'):
+        raise ValueError('Gói Anki định dạng mới chưa được hỗ trợ, hãy xuất lại với tuỳ chọn '
+                         '"Support older Anki versions"')
+    fd, path = tempfile.mkstemp(prefix='vocab_anki_', suffix='.sqlite3')
+    conn = None
+    try:
+        with os.fdopen(fd, 'wb') as out, zf.open(member) as src:
+            shutil.copyfileobj(src, out, 1024 * 1024)
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        try:
+            fields = _anki_field_names(conn)
+            cursor = conn.execute('SELECT mid, flds FROM notes ORDER BY id')
+        except sqlite3.DatabaseError:
+            raise ValueError('File Anki không hợp lệ')
+        headers = None
+        for mid, flds in cursor:
+            values = [strip_html(v) for v in (flds or '').split('\x1f')]
+            if headers is None:
+                headers = fields.get(mid) or [f'Field {i + 1}' for i in range(len(values))]
+            yield {h: values[i] if i < len(values) else '' for i, h in enumerate(headers)}
+    finally:
+        if conn is not None:
+            conn.close()
+        zf.close()
+        os.remove(path)
 
 
 def score_headers(headers: List[str]) -> Dict[str, Dict[str, float]]:
@@ -93,9 +292,20 @@ def score_headers(headers: List[str]) -> Dict[str, Dict[str, float]]:
     return scores
 
 
+# Cells scored per sample: 50 rows up to 12 columns, fewer rows for wider
+# sheets (never below 20) so detection cost stays flat as columns grow
+CONTENT_SAMPLE_CELLS = 600
+CONTENT_SAMPLE_ROWS = (20, 50)
+
+
+def content_sample_size(ncols: int) -> int:
+    lo, hi = CONTENT_SAMPLE_ROWS
+    return max(lo, min(hi, CONTENT_SAMPLE_CELLS // max(1, ncols)))
+
+
 def score_content(rows: List[Dict[str, str]], headers: List[str]) -> Dict[str, Dict[str, float]]:
     scores = {h: {'word': 0.0, 'pos': 0.0, 'meaning': 0.0, 'pronunciation': 0.0, 'example': 0.0} for h in headers}
-    sample = rows[: min(50, len(rows))]
+    sample = rows[: content_sample_size(len(headers))]
     for h in headers:
         word_hits = pos_hits = meaning_hits = pronunciation_hits = example_hits = 0
         total = 0
@@ -104,20 +314,23 @@ def score_content(rows: List[Dict[str, str]], headers: List[str]) -> Dict[str, D
             if not s:
                 continue
             total += 1
+            # All signals from one pass over the cell
+            n_words = len(s.split())
+            vietnamese = _VN_RE.search(s) is not None
             # pos detection - very strict
             if is_pos_value(s):
                 pos_hits += 1
             # pronunciation: contains IPA chars or starts with / or [ brackets
-            if any(c in s for c in ['ə', 'ɪ', 'ʊ', 'ɔ', 'ɑ', 'æ', 'ʌ', 'ɜ', 'θ', 'ð', 'ʃ', 'ʒ', 'ŋ']) or s.startswith(('/', '[')):
+            if s.startswith(('/', '[')) or _IPA_RE.search(s):
                 pronunciation_hits += 1
             # example: longer sentences (>5 words) or contains sentence patterns
-            if len(s.split()) >= 5 or any(pattern in s.lower() for pattern in ['.', '!', '?', 'e.g', 'ex:', 'ví dụ']):
+            if n_words >= 5 or _SENTENCE_RE.search(s):
                 example_hits += 1
             # meaning: longer text OR Vietnamese OR starts with uppercase Vietnamese letter
-            if _has_vietnamese_chars(s) or len(s.split()) >= 4 or len(s) > 30:
+            if vietnamese or n_words >= 4 or len(s) > 30:
                 meaning_hits += 1
             # word: short (1-3 words), mostly lowercase English, no Vietnamese
-            if len(s.split()) <= 3 and not _has_vietnamese_chars(s) and len(s) < 25:
+            if n_words <= 3 and not vietnamese and len(s) < 25:
                 word_hits += 1
         if total:
             # Boost POS score heavily if high match rate
@@ -132,12 +345,6 @@ def score_content(rows: List[Dict[str, str]], headers: List[str]) -> Dict[str, D
     return scores
 
 
-def _has_vietnamese_chars(text: str) -> bool:
-    """More accurate Vietnamese detection"""
-    vn_chars = 'ăâêôơưđĂÂÊÔƠƯĐáàảãạéèẻẽẹíìỉĩịóòỏõọúùủũụýỳỷỹỵ'
-    return any(ch in vn_chars for ch in text)
-
-
 def choose_mapping(rows: List[Dict[str, str]]) -> Tuple[dict, List[str]]:
     if not rows:
         return {}, []
@@ -177,14 +384,18 @@ def choose_mapping(rows: List[Dict[str, str]]) -> Tuple[dict, List[str]]:
     return assigned, headers
 
 
-async def read_any(file) -> List[Dict[str, str]]:
-    b = await file.read()
-    name = file.filename.lower()
-    if name.endswith('.csv'):
-        return sniff_csv_bytes(b)
+def iter_any(filename: str, f: BinaryIO, sheet: Optional[str] = None) -> Iterator[Dict[str, str]]:
+    """Yield rows of an uploaded .csv/.xlsx/.jsonl/.apkg file without reading it whole"""
+    name = (filename or '').lower()
     if name.endswith('.xlsx'):
-        return read_xlsx_bytes(b)
-    try:
-        return sniff_csv_bytes(b)
-    except Exception:
-        raise ValueError('Định dạng file không hỗ trợ (.csv/.xlsx)')
+        return iter_xlsx(f, sheet)
+    if name.endswith(('.jsonl', '.ndjson')):
+        return iter_jsonl(f)
+    if name.endswith(('.apkg', '.colpkg')):
+        return iter_apkg(f)
+    # .csv and anything else: try CSV
+    return iter_csv(f)
+
+
+async def read_any(file, sheet: Optional[str] = None) -> List[Dict[str, str]]:
+    return list(iter_any(file.filename, file.file, sheet))
@@ -0,0 +1,206 @@
+"""
+Background enrichment: example sentences for terms that have none.
+
+Terms are queued by id (a term already queued is not queued twice) and a
+single worker thread works through the queue with its own event loop,
+calling ai_helper.generate_example at most ENRICH_RATE times per second.
+Results are written back in batches with storage.update_terms, only into
+examples that are still empty. Template sentences (no AI provider answered)
+are not written.
+"""
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from typing import Dict, Any, Iterable, List, Optional
+
+from . import ai_helper
+from .storage import list_terms, update_terms
+
+# generate_example calls per second, and how many run at once
+ENRICH_RATE = float(os.getenv('ENRICH_RATE', '2'))
+ENRICH_CONCURRENCY = int(os.getenv('ENRICH_CONCURRENCY', '4'))
+# Examples collected before a write, and the longest a result waits for one
+ENRICH_BATCH = int(os.getenv('ENRICH_BATCH', '20'))
+ENRICH_FLUSH_SECONDS = float(os.getenv('ENRICH_FLUSH_SECONDS', '10'))
+ENRICH_QUEUE_MAX = int(os.getenv('ENRICH_QUEUE_MAX', '10000'))
+# Counters of a set with nothing queued or running are dropped after this many seconds
+ENRICH_STATUS_TTL = 3600
+
+_lock = threading.Lock()
+_wake = threading.Event()
+_queue: deque = deque()
+# term_id -> job, for terms queued or being worked on
+_pending: Dict[str, Dict[str, Any]] = {}
+# set_id -> counters; finished sets are evicted by _sweep_status
+_status: Dict[str, Dict[str, Any]] = {}
+_worker: Optional[threading.Thread] = None
+_stopping = False
+
+
+def is_enabled() -> bool:
+    # Without OpenAI every example would be a template, which is never written
+    return ai_helper._has_openai()
+
+
+def _new_status() -> Dict[str, Any]:
+    return {'queued': 0, 'running': 0, 'done': 0, 'skipped': 0, 'failed': 0, 'updated_at': None}
+
+
+def _set_status(set_id: str) -> Dict[str, Any]:
+    st = _status.get(set_id)
+    if st is None:
+        _sweep_status(time.time())
+        st = _status[set_id] = _new_status()
+    return st
+
+
+def _sweep_status(now: float):
+    # Called with _lock held, whenever a new set gets counters
+    for sid in [sid for sid, st in _status.items()
+                if not st['queued'] and not st['running'] and now - (st['updated_at'] or 0) >= ENRICH_STATUS_TTL]:
+        del _status[sid]
+
+
+def enqueue_terms(set_id: str, terms: Iterable[Dict[str, Any]]) -> int:
+    """Queue the terms that have no example; returns how many were added"""
+    if not is_enabled():
+        return 0
+    added = 0
+    with _lock:
+        for t in terms:
+            tid = t.get('id')
+            if not tid or not t.get('term') or t.get('example') or tid in _pending:
+                continue
+            if len(_queue) >= ENRICH_QUEUE_MAX:
+                break
+            _pending[tid] = {'id': tid, 'set_id': set_id, 'term': t.get('term'),
+                             'pos': t.get('pos'), 'definition': t.get('definition')}
+            _queue.append(tid)
+            added += 1
+        if added:
+            st = _set_status(set_id)
+            st['queued'] += added
+            st['updated_at'] = time.time()
+            _ensure_worker()
+    if added:
+        _wake.set()
+    return added
+
+
+def enqueue_set(set_id: str) -> int:
+    if not is_enabled():
+        return 0
+    return enqueue_terms(set_id, list_terms(set_id))
+
+
+def set_status(set_id: str) -> Dict[str, Any]:
+    with _lock:
+        st = dict(_status.get(set_id) or _new_status())
+    st['enabled'] = is_enabled()
+    return st
+
+
+def _ensure_worker():
+    global _worker
+    if _worker is None or not _worker.is_alive():
+        _worker = threading.Thread(target=lambda: asyncio.run(_run()), name='enrichment', daemon=True)
+        _worker.start()
+
+
+def _take(n: int) -> List[Dict[str, Any]]:
+    with _lock:
+        jobs = []
+        while _queue and len(jobs) < n:
+            job = _pending.get(_queue.popleft())
+            if job is None:
+                continue
+            st = _set_status(job['set_id'])
+            st['queued'] -= 1
+            st['running'] += 1
+            jobs.append(job)
+        return jobs
+
+
+def _finish(jobs: List[Dict[str, Any]], outcome: Dict[str, str]):
+    """outcome: term_id -> 'done' / 'skipped' / 'failed'"""
+    with _lock:
+        now = time.time()
+        for job in jobs:
+            _pending.pop(job['id'], None)
+            st = _set_status(job['set_id'])
+            st['running'] -= 1
+            st[outcome.get(job['id'], 'failed')] += 1
+            st['updated_at'] = now
+
+
+def _flush(results: Dict[str, str], jobs: List[Dict[str, Any]]):
+    written = set()
+    if results:
+        try:
+            written = {t['id'] for t in update_terms({tid: {'example': ex} for tid, ex in results.items()},
+                                                      fill_only=True)}
+        except Exception:
+            written = set()
+    _finish(jobs, {job['id']: 'done' if job['id'] in written else
+                   ('skipped' if job['id'] in results else 'failed') for job in jobs})
+
+
+async def _example(job: Dict[str, Any]) -> Optional[str]:
+    res = await ai_helper.generate_example(job['term'], job.get('pos'), job.get('definition'))
+    if not res.get('success') or res.get('provider') == 'template':
+        return None
+    return (res.get('example') or '').strip() or None
+
+
+async def _run():
+    results: Dict[str, str] = {}
+    waiting: List[Dict[str, Any]] = []
+    last_flush = time.monotonic()
+    try:
+        while not _stopping:
+            health = ai_helper.provider_health().get('openai', {})
+            if health.get('state') == 'open':
+                # Provider is down: keep the queue for later rather than burn it on templates
+                await asyncio.sleep(health.get('retry_in') or 1)
+                continue
+            jobs = _take(ENRICH_CONCURRENCY)
+            if jobs:
+                started = time.monotonic()
+                examples = await asyncio.gather(*[_example(j) for j in jobs], return_exceptions=True)
+                no_example = []
+                for job, ex in zip(jobs, examples):
+                    if isinstance(ex, str):
+                        results[job['id']] = ex
+                        waiting.append(job)
+                    else:
+                        no_example.append(job)
+                _finish(no_example, {j['id']: 'failed' if isinstance(ex, BaseException) else 'skipped'
+                                     for j, ex in zip(jobs, examples) if not isinstance(ex, str)})
+                # Pace the calls to ENRICH_RATE per second
+                await asyncio.sleep(max(0.0, len(jobs) / ENRICH_RATE - (time.monotonic() - started)))
+            if waiting and (len(results) >= ENRICH_BATCH or not jobs
+                            or time.monotonic() - last_flush >= ENRICH_FLUSH_SECONDS):
+                await asyncio.to_thread(_flush, results, waiting)
+                results, waiting = {}, []
+                last_flush = time.monotonic()
+            if not jobs:
+                _wake.clear()
+                with _lock:
+                    idle = not _queue
+                if idle:
+                    await asyncio.to_thread(_wake.wait, ENRICH_FLUSH_SECONDS)
+    finally:
+        if waiting:
+            _flush(results, waiting)
+        await ai_helper.close_clients()
+
+
+def shutdown(timeout: float = 5.0):
+    """Stop the worker, writing back examples it already has"""
+    global _stopping
+    _stopping = True
+    _wake.set()
+    if _worker is not None:
+        _worker.join(timeout)
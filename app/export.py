@@ -0,0 +1,211 @@
+"""
+Streaming exports of vocabulary sets.
+
+CSV is produced by a generator that encodes rows in small chunks. XLSX is
+written with openpyxl's write_only workbook to a temp file, which is then
+streamed back in chunks and removed, so neither format holds the whole
+document in memory.
+
+iter_zip_export packs many sets into one ZIP written to a sink that hands
+back compressed bytes as they are produced.
+"""
+import io
+import os
+import re
+import csv
+import json
+import zipfile
+import tempfile
+import unicodedata
+from datetime import datetime
+from urllib.parse import quote
+from typing import Dict, Any, Iterable, Iterator, List
+
+# (header, term field); the headers are recognised again by detect on import
+EXPORT_COLUMNS = [
+    ('Word', 'term'),
+    ('Part of Speech', 'pos'),
+    ('Pronunciation', 'pronunciation'),
+    ('Meaning', 'definition'),
+    ('Example', 'example'),
+]
+# Rows encoded per yielded CSV chunk
+CSV_CHUNK_ROWS = 500
+# Bytes per chunk when streaming a spooled file
+FILE_CHUNK_SIZE = 64 * 1024
+
+XLSX_MEDIA_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def term_row(t: Dict[str, Any]) -> List[str]:
+    return [t.get(field) or '' for _, field in EXPORT_COLUMNS]
+
+
+def iter_csv_export(terms: Iterable[Dict[str, Any]], chunk_rows: int = CSV_CHUNK_ROWS) -> Iterator[bytes]:
+    """Yield a UTF-8 CSV of the terms, a few hundred rows at a time"""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow([header for header, _ in EXPORT_COLUMNS])
+    n = 0
+    for t in terms:
+        writer.writerow(term_row(t))
+        n += 1
+        if n % chunk_rows == 0:
+            yield buf.getvalue().encode('utf-8')
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode('utf-8')
+
+
+def iter_jsonl_export(terms: Iterable[Dict[str, Any]], chunk_rows: int = CSV_CHUNK_ROWS) -> Iterator[bytes]:
+    """Yield one JSON object per term and line"""
+    lines = []
+    for t in terms:
+        lines.append(json.dumps({field: t.get(field) for _, field in EXPORT_COLUMNS}, ensure_ascii=False))
+        if len(lines) >= chunk_rows:
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+            lines = []
+    if lines:
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def write_xlsx_export(terms: Iterable[Dict[str, Any]], path: str):
+    """Write the terms to an .xlsx file row by row (openpyxl write_only)"""
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Vocabulary')
+    ws.append([header for header, _ in EXPORT_COLUMNS])
+    for t in terms:
+        ws.append(term_row(t))
+    wb.save(path)
+
+
+def spool_xlsx_export(terms: Iterable[Dict[str, Any]]) -> str:
+    """Temp .xlsx path with the terms; stream it with iter_file_chunks"""
+    fd, path = tempfile.mkstemp(prefix='vocab_export_', suffix='.xlsx')
+    os.close(fd)
+    try:
+        write_xlsx_export(terms, path)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+def iter_file_chunks(path: str, chunk_size: int = FILE_CHUNK_SIZE, remove: bool = True) -> Iterator[bytes]:
+    """Yield a file in chunks, deleting it afterwards (also if the client disconnects)"""
+    try:
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        if remove:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def export_filename(name: str, ext: str) -> str:
+    return f"{(name or 'vocab').replace(' ', '_')}.{ext}"
+
+
+def attachment_headers(filename: str) -> Dict[str, str]:
+    """Content-Disposition with an ASCII fallback for non-ASCII (e.g. Vietnamese) names"""
+    ascii_name = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii')
+    ascii_name = ascii_name.replace('"', '').replace('\\', '') or 'export'
+    return {'Content-Disposition': f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(filename)}"}
+
+
+# ---- ZIP of many sets ----
+ZIP_FORMATS = ('csv', 'xlsx', 'jsonl')
+ZIP_MEDIA_TYPE = 'application/zip'
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only, unseekable file for zipfile; drain() hands back what was written"""
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._pos = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _entry_name(vset: Dict[str, Any], ext: str, used: set) -> str:
+    base = re.sub(r'[\\/:*?"<>|\x00-\x1f]+', '_', (vset.get('name') or 'vocab').strip()).replace(' ', '_') or 'vocab'
+    name = f'{base}.{ext}'
+    if name in used:
+        base = f"{base}_{(vset.get('id') or '')[:8]}"
+        name, n = f'{base}.{ext}', 1
+        while name in used:
+            n += 1
+            name = f'{base}_{n}.{ext}'
+    used.add(name)
+    return name
+
+
+def _set_chunks(terms: List[Dict[str, Any]], fmt: str) -> Iterator[bytes]:
+    if fmt == 'csv':
+        return iter_csv_export(terms)
+    if fmt == 'jsonl':
+        return iter_jsonl_export(terms)
+    return iter_file_chunks(spool_xlsx_export(terms))
+
+
+def iter_zip_export(sets: List[Dict[str, Any]], terms_by_set: Dict[str, List[Dict[str, Any]]],
+                    fmt: str, username: str) -> Iterator[bytes]:
+    """Yield a ZIP with one file per set and a manifest.json, as it is compressed"""
+    sink = _ChunkSink()
+    manifest = {
+        'exported_at': datetime.utcnow().isoformat(),
+        'user': username,
+        'format': fmt,
+        'columns': [header for header, _ in EXPORT_COLUMNS],
+        'sets': [],
+    }
+    used = set()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for vset in sets:
+            terms = terms_by_set.get(vset['id'], [])
+            name = _entry_name(vset, fmt, used)
+            with zf.open(name, 'w', force_zip64=True) as entry:
+                for chunk in _set_chunks(terms, fmt):
+                    entry.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            manifest['sets'].append({
+                'id': vset['id'],
+                'name': vset.get('name'),
+                'description': vset.get('description'),
+                'language_from': vset.get('language_from'),
+                'language_to': vset.get('language_to'),
+                'visibility': vset.get('visibility'),
+                'created_at': vset.get('created_at'),
+                'file': name,
+                'terms': len(terms),
+            })
+            data = sink.drain()
+            if data:
+                yield data
+        zf.writestr('manifest.json', json.dumps(manifest, ensure_ascii=False, indent=2))
+    yield sink.drain()
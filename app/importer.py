@@ -0,0 +1,528 @@
+"""
+Import pipeline: rows streamed from detect.iter_any are mapped to terms and
+written to storage in chunks, so an upload is never held in memory whole.
+
+Large files go through background import jobs: the upload is spooled to a
+temp file and a worker thread parses, maps, deduplicates and inserts it while
+the browser polls /api/import/{job_id}.
+
+/preview and /import hand the spooled file to a process pool instead, so
+CPU-bound parsing and column detection never run on the event loop. Pool
+workers only read: /import gets the mapped terms back and stores them in
+the server process (save_parsed), which keeps every JSON file with a single
+writer. Up to IMPORT_SYNC_MAX_TERMS terms come back that way; a bigger file
+is streamed into storage from a server thread instead, as import jobs do.
+"""
+import os
+import time
+import uuid
+import hashlib
+import shutil
+import asyncio
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice, chain
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple, Callable
+
+from .detect import choose_mapping, score_headers, iter_any, list_sheets
+from .storage import add_terms, merge_terms, create_set, delete_set, get_import_mapping, save_import_mapping
+from .storage import normalize_text
+from .enrichment import enqueue_set
+
+# Rows used for column detection (choose_mapping scores at most 50)
+DETECT_SAMPLE_ROWS = 50
+# Mapped terms /import may bring back from the parse pool in one piece
+IMPORT_SYNC_MAX_TERMS = int(os.getenv('IMPORT_SYNC_MAX_TERMS', '20000'))
+# Rows buffered before each bulk insert. Every insert rewrites terms.json, so
+# chunks are large: they bound memory without turning big imports quadratic.
+IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', '50000'))
+
+
+def take_sample(rows: Iterator[Dict[str, str]], n: int = DETECT_SAMPLE_ROWS) -> List[Dict[str, str]]:
+    """Pull the first n rows off the stream; callers chain them back in front"""
+    return list(islice(rows, n))
+
+
+_norm = normalize_text
+
+
+def header_signature(headers: Iterable[str]) -> str:
+    """Cache key of a header row, ignoring column order, case and spacing"""
+    return hashlib.sha1('\x1f'.join(sorted(_norm(h) for h in headers)).encode('utf-8')).hexdigest()
+
+
+def _store_form(mapping: dict) -> Dict[str, str]:
+    return {cat: _norm(col) for cat, col in mapping.items() if col}
+
+
+def _header_form(stored: Dict[str, str], headers: List[str]) -> Optional[dict]:
+    by_norm = {_norm(h): h for h in headers}
+    if not all(col in by_norm for col in stored.values()):
+        return None
+    return {cat: by_norm[col] for cat, col in stored.items()}
+
+
+def detect_mapping(sample: List[Dict[str, str]], user_id: Optional[str] = None,
+                   save: bool = True) -> Tuple[dict, List[str], str]:
+    """Column mapping for a sample and its source: 'user', 'global' or 'detected'.
+
+    Known header layouts are a lookup: the user's own corrections first,
+    then layouts detected before. A fresh detection is cached globally only
+    when every chosen column was recognised by its header, since content-
+    driven picks do not carry over to other files with the same headers.
+    With save=False nothing is written (parse pool workers).
+    """
+    if not sample:
+        return {}, [], 'detected'
+    headers = list(sample[0].keys())
+    signature = header_signature(headers)
+    stored, source = get_import_mapping(signature, user_id)
+    if stored:
+        mapping = _header_form(stored, headers)
+        if mapping:
+            return mapping, headers, source
+    mapping, headers = choose_mapping(sample)
+    if save and _cacheable(mapping, headers):
+        save_import_mapping(signature, _store_form(mapping))
+    return mapping, headers, 'detected'
+
+
+def _cacheable(mapping: dict, headers: List[str]) -> bool:
+    hints = score_headers(headers)
+    return bool(mapping.get('word') and mapping.get('meaning')
+                and all(hints[col][cat] > 0 for cat, col in mapping.items()))
+
+
+def remember_mapping(headers: List[str], auto_map: dict, mapping: dict, user_id: str):
+    """Keep a user's manual column choices as their preferred mapping for this layout"""
+    if user_id and mapping.get('word') and mapping.get('meaning') and _store_form(mapping) != _store_form(auto_map):
+        save_import_mapping(header_signature(headers), _store_form(mapping), user_id)
+
+
+def resolve_mapping(auto_map: dict, overrides: Dict[str, Optional[str]]) -> dict:
+    """Form choices win over detected columns; empty choices fall back to detection"""
+    return {cat: overrides.get(cat) or auto_map.get(cat) for cat in ('word', 'meaning', 'pos', 'pronunciation', 'example')}
+
+
+def map_row(r: Dict[str, str], mapping: dict) -> Optional[Dict[str, Any]]:
+    """Turn one raw row into term fields, or None if the word or meaning is empty"""
+    term_val = (r.get(mapping['word']) or '').strip()
+    meaning_val = (r.get(mapping['meaning']) or '').strip()
+    if not term_val or not meaning_val:
+        return None
+    pos, pronunciation, example = mapping.get('pos'), mapping.get('pronunciation'), mapping.get('example')
+    return {
+        'term': term_val,
+        'definition': meaning_val,
+        'pos': (r.get(pos) or '').strip() if pos else None,
+        'pronunciation': (r.get(pronunciation) or '').strip() if pronunciation else None,
+        'example': (r.get(example) or '').strip() if example else None,
+    }
+
+
+def dedupe_key(term: str, definition: str) -> Tuple[str, str]:
+    """Normalized (term, definition) pair used to spot duplicate rows"""
+    return _norm(term), _norm(definition)
+
+
+def _counted(rows: Iterable[Dict[str, str]], counts: Dict[str, int], cancel=None,
+             report: Optional[Callable[..., None]] = None) -> Iterator[Dict[str, str]]:
+    """Count rows into counts['rows_parsed']; ImportCancelled once `cancel.is_set()`"""
+    for r in rows:
+        if cancel is not None and cancel.is_set():
+            raise ImportCancelled()
+        counts['rows_parsed'] += 1
+        if report and counts['rows_parsed'] % 1000 == 0:
+            report(rows_parsed=counts['rows_parsed'])
+        yield r
+
+
+def map_rows(rows: Iterable[Dict[str, str]], mapping: dict, counts: Dict[str, int],
+             dedupe: bool = False) -> Iterator[Dict[str, Any]]:
+    """Terms of the rows; empty rows (and with dedupe, repeats) are counted in counts"""
+    seen = set()
+    for r in rows:
+        term = map_row(r, mapping)
+        if term is None:
+            counts['skipped'] += 1
+            continue
+        if dedupe:
+            key = dedupe_key(term['term'], term['definition'])
+            if key in seen:
+                counts['skipped'] += 1
+                counts['duplicates'] += 1
+                continue
+            seen.add(key)
+        yield term
+
+
+def store_terms(set_id: str, terms: Iterable[Dict[str, Any]], counts: Dict[str, int],
+                chunk_size: int = IMPORT_CHUNK_SIZE, on_duplicate: Optional[str] = None,
+                on_progress: Optional[Callable[[Dict[str, int]], None]] = None):
+    """Insert mapped terms chunk by chunk, adding to counts (see import_rows)"""
+    batch = []
+
+    def flush():
+        if on_duplicate:
+            result = merge_terms(set_id, batch, on_duplicate)
+            counts['inserted'] += len(result['added'])
+            counts['skipped'] += result['duplicates']
+            counts['duplicates'] += result['duplicates']
+            counts['merged'] += result['merged']
+        else:
+            counts['inserted'] += len(add_terms(set_id, batch))
+        batch.clear()
+        if on_progress:
+            on_progress(counts)
+
+    for term in terms:
+        batch.append(term)
+        if len(batch) >= chunk_size:
+            flush()
+    if batch:
+        flush()
+    elif on_progress:
+        on_progress(counts)
+
+
+def import_rows(set_id: str, rows: Iterable[Dict[str, str]], mapping: dict,
+                chunk_size: int = IMPORT_CHUNK_SIZE, dedupe: bool = False,
+                on_progress: Optional[Callable[[Dict[str, int]], None]] = None,
+                on_duplicate: Optional[str] = None) -> Tuple[int, int]:
+    """Map and insert rows chunk by chunk; returns (inserted, skipped).
+
+    With dedupe, rows repeating an earlier (term, definition) pair of the
+    same upload are skipped. on_duplicate='skip' or 'merge' goes further and
+    checks every row against the set's term index (storage.merge_terms),
+    which also covers terms imported before. on_progress gets the running
+    counters after every chunk.
+    """
+    counts = {'inserted': 0, 'skipped': 0, 'duplicates': 0, 'merged': 0}
+    if on_duplicate not in ('skip', 'merge'):
+        on_duplicate = None
+    store_terms(set_id, map_rows(rows, mapping, counts, dedupe and not on_duplicate), counts,
+                chunk_size, on_duplicate, on_progress)
+    return counts['inserted'], counts['skipped']
+
+
+class ImportCancelled(Exception):
+    pass
+
+
+class ImportTooLarge(Exception):
+    """parse_path found more terms than it may hold in memory"""
+
+
+class _Deadline:
+    """Cancel flag that trips once a time budget is spent"""
+    def __init__(self, seconds: float):
+        self.at = time.monotonic() + seconds
+
+    def is_set(self) -> bool:
+        return time.monotonic() > self.at
+
+
+def spool_upload(f, filename: str) -> str:
+    """Copy an upload to a named temp file other threads/processes can open"""
+    suffix = os.path.splitext(filename or '')[1]
+    fd, path = tempfile.mkstemp(prefix='vocab_import_', suffix=suffix)
+    with os.fdopen(fd, 'wb') as out:
+        shutil.copyfileobj(f, out, 1024 * 1024)
+    return path
+
+
+def preview_file(path: str, filename: str, sheet: Optional[str] = None,
+                 user_id: Optional[str] = None, cancel=None) -> Dict[str, Any]:
+    """Sheets, detected mapping and the first rows of a spooled upload (writes nothing)"""
+    with open(path, 'rb') as f:
+        sheets, active = list_sheets(f) if (filename or '').lower().endswith('.xlsx') else ([], None)
+        sample = take_sample(_counted(iter_any(filename, f, sheet), {'rows_parsed': 0}, cancel))
+    mapping, headers, source = detect_mapping(sample, user_id, save=False)
+    return {'mapping': mapping, 'mapping_source': source, 'headers': headers, 'sample': sample[:5],
+            'sheets': sheets, 'sheet': sheet or active}
+
+
+def import_path(path: str, filename: str, user_id: str, set_id: Optional[str] = None,
+                set_name: Optional[str] = None, language_from: str = 'en', language_to: str = 'vi',
+                overrides: Optional[Dict[str, Optional[str]]] = None, sheet: Optional[str] = None,
+                dedupe: bool = False, on_duplicate: Optional[str] = None, cancel=None,
+                report: Optional[Callable[..., None]] = None) -> Dict[str, Any]:
+    """Parse, map and insert a spooled upload (see import_rows for the dedup options).
+
+    Raises ValueError when no word/meaning column is found and
+    ImportCancelled when `cancel.is_set()` turns true. `report(**fields)`
+    receives progress. A set created here is removed again if the import
+    aborts before inserting anything.
+    """
+    report = report or (lambda **fields: None)
+    result = {'set_id': set_id, 'rows_parsed': 0, 'inserted': 0, 'skipped': 0, 'duplicates': 0, 'merged': 0}
+    created_set = None
+    try:
+        with open(path, 'rb') as f:
+            rows = _counted(iter_any(filename, f, sheet), result, cancel, report)
+            sample = take_sample(rows)
+            auto_map, headers, _ = detect_mapping(sample, user_id)
+            mapping = resolve_mapping(auto_map, overrides or {})
+            if not mapping['word'] or not mapping['meaning']:
+                raise ValueError('Không xác định được cột từ/ nghĩa')
+            remember_mapping(headers, auto_map, mapping, user_id)
+
+            if not set_id:
+                created_set = create_set(set_name or 'Bộ từ', f'Import from {filename}',
+                                         language_from, language_to, user_id, 'private', user_id)
+                result['set_id'] = created_set['id']
+                report(set_id=result['set_id'])
+
+            def progress(counts):
+                result.update(counts)
+                report(rows_parsed=result['rows_parsed'], **counts)
+
+            import_rows(result['set_id'], chain(sample, rows), mapping, dedupe=dedupe,
+                        on_progress=progress, on_duplicate=on_duplicate)
+        return result
+    except Exception:
+        # Do not leave an empty set behind for an import that never inserted anything
+        if created_set and result['inserted'] == 0:
+            delete_set(created_set['id'])
+            report(set_id=None)
+        raise
+
+
+def parse_path(path: str, filename: str, user_id: str, overrides: Optional[Dict[str, Optional[str]]] = None,
+               sheet: Optional[str] = None, dedupe: bool = False, on_duplicate: Optional[str] = None,
+               cancel=None, max_terms: Optional[int] = None) -> Dict[str, Any]:
+    """Parse and map a spooled upload without writing anything; save_parsed stores the result.
+
+    Raises ValueError when no word/meaning column is found, ImportCancelled
+    when `cancel.is_set()` turns true and ImportTooLarge past max_terms.
+    """
+    counts = {'rows_parsed': 0, 'skipped': 0, 'duplicates': 0}
+    with open(path, 'rb') as f:
+        rows = _counted(iter_any(filename, f, sheet), counts, cancel)
+        sample = take_sample(rows)
+        auto_map, headers, source = detect_mapping(sample, user_id, save=False)
+        mapping = resolve_mapping(auto_map, overrides or {})
+        if not mapping['word'] or not mapping['meaning']:
+            raise ValueError('Không xác định được cột từ/ nghĩa')
+        terms = []
+        for term in map_rows(chain(sample, rows), mapping, counts, dedupe and on_duplicate not in ('skip', 'merge')):
+            if max_terms is not None and len(terms) >= max_terms:
+                raise ImportTooLarge()
+            terms.append(term)
+    return {'terms': terms, 'headers': headers, 'auto_map': auto_map, 'mapping': mapping,
+            'learn': source == 'detected' and _cacheable(auto_map, headers), **counts}
+
+
+def save_parsed(parsed: Dict[str, Any], filename: str, user_id: str, set_id: Optional[str] = None,
+                set_name: Optional[str] = None, language_from: str = 'en', language_to: str = 'vi',
+                on_duplicate: Optional[str] = None) -> Dict[str, Any]:
+    """Store what parse_path returned: mappings learned, set created if needed, terms inserted.
+
+    A set created here is removed again if nothing could be inserted.
+    """
+    if parsed['learn']:
+        save_import_mapping(header_signature(parsed['headers']), _store_form(parsed['auto_map']))
+    remember_mapping(parsed['headers'], parsed['auto_map'], parsed['mapping'], user_id)
+    result = {'set_id': set_id, 'rows_parsed': parsed['rows_parsed'], 'inserted': 0,
+              'skipped': parsed['skipped'], 'duplicates': parsed['duplicates'], 'merged': 0}
+    created_set = None
+    try:
+        if not set_id:
+            created_set = create_set(set_name or 'Bộ từ', f'Import from {filename}',
+                                     language_from, language_to, user_id, 'private', user_id)
+            result['set_id'] = created_set['id']
+        store_terms(result['set_id'], parsed['terms'], result,
+                    on_duplicate=on_duplicate if on_duplicate in ('skip', 'merge') else None)
+        return result
+    except Exception:
+        if created_set and result['inserted'] == 0:
+            delete_set(created_set['id'])
+        raise
+
+
+# ---- Parse process pool (for /preview and /import) ----
+PARSE_POOL_SIZE = int(os.getenv('PARSE_POOL_SIZE', '2'))
+# Seconds a /preview may take, and the parsing of a synchronous /import
+PARSE_TIMEOUT = float(os.getenv('PARSE_TIMEOUT', '60'))
+IMPORT_TIMEOUT = float(os.getenv('IMPORT_TIMEOUT', '600'))
+# Extra seconds a worker gets to notice its own deadline before it is killed
+PARSE_GRACE = 5.0
+
+_parse_pool: Optional[ProcessPoolExecutor] = None
+_parse_pool_lock = threading.Lock()
+
+
+def _get_parse_pool() -> ProcessPoolExecutor:
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            # spawn: forking a server process full of threads is unsafe
+            _parse_pool = ProcessPoolExecutor(max_workers=PARSE_POOL_SIZE,
+                                              mp_context=multiprocessing.get_context('spawn'))
+        return _parse_pool
+
+
+def _retire_parse_pool(pool: ProcessPoolExecutor):
+    """Replace the pool and kill its workers (pool functions never write, so this is safe)"""
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is pool:
+            _parse_pool = None
+    # ProcessPoolExecutor has no public way to stop a busy worker
+    processes = list((pool._processes or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for p in processes:
+        p.terminate()
+
+
+async def run_in_parse_pool(fn: Callable, *args, timeout: float = PARSE_TIMEOUT):
+    """Run fn(*args) in the parse pool; asyncio.TimeoutError past the timeout.
+
+    The pool functions stop themselves at their own deadline; a worker still
+    busy at `timeout` is stuck, so the pool is retired to free its slot.
+    Calls that shared the retired pool are run once more in the new one.
+    """
+    loop = asyncio.get_running_loop()
+    for attempt in range(2):
+        pool = _get_parse_pool()
+        try:
+            return await asyncio.wait_for(loop.run_in_executor(pool, fn, *args), timeout)
+        except asyncio.TimeoutError:
+            _retire_parse_pool(pool)
+            raise
+        except BrokenProcessPool:
+            _retire_parse_pool(pool)
+            if attempt:
+                raise
+
+
+def preview_in_pool(path: str, filename: str, sheet: Optional[str], user_id: Optional[str], timeout: float):
+    """/preview body; stops between rows once the timeout is spent"""
+    try:
+        return preview_file(path, filename, sheet, user_id, cancel=_Deadline(timeout))
+    except ImportCancelled:
+        raise TimeoutError('Quá thời gian xử lý file')
+
+
+def parse_in_pool(path: str, filename: str, user_id: str, options: Dict[str, Any], timeout: float):
+    """Parsing half of /import (see parse_path); stops between rows once the timeout is spent"""
+    try:
+        return parse_path(path, filename, user_id, cancel=_Deadline(timeout), max_terms=IMPORT_SYNC_MAX_TERMS,
+                          **options)
+    except ImportCancelled:
+        raise TimeoutError('Quá thời gian xử lý file')
+
+
+# ---- Background import jobs ----
+IMPORT_WORKERS = int(os.getenv('IMPORT_WORKERS', '2'))
+# Finished jobs stay pollable for this many seconds
+IMPORT_JOB_TTL = 3600
+
+_executor = ThreadPoolExecutor(max_workers=IMPORT_WORKERS, thread_name_prefix='import')
+_jobs: Dict[str, Dict[str, Any]] = {}
+_jobs_lock = threading.Lock()
+
+FINISHED = ('done', 'failed', 'cancelled')
+
+
+def _update_job(job_id: str, **fields):
+    with _jobs_lock:
+        _jobs[job_id].update(fields)
+
+
+def _purge_jobs():
+    cutoff = time.time() - IMPORT_JOB_TTL
+    with _jobs_lock:
+        for jid in [j for j, job in _jobs.items() if job['status'] in FINISHED and job['finished_at'] < cutoff]:
+            del _jobs[jid]
+
+
+def start_import_job(user_id: str, path: str, filename: str, set_id: Optional[str] = None,
+                     set_name: Optional[str] = None, language_from: str = 'en', language_to: str = 'vi',
+                     overrides: Optional[Dict[str, Optional[str]]] = None, sheet: Optional[str] = None,
+                     dedupe: bool = True, on_duplicate: Optional[str] = None) -> Dict[str, Any]:
+    """Queue an import of the spooled upload at `path`; the worker deletes the file"""
+    _purge_jobs()
+    job_id = uuid.uuid4().hex
+    job = {
+        'id': job_id,
+        'user_id': user_id,
+        'filename': filename,
+        'status': 'queued',
+        'set_id': set_id,
+        'rows_parsed': 0,
+        'inserted': 0,
+        'skipped': 0,
+        'duplicates': 0,
+        'merged': 0,
+        'error': None,
+        'created_at': time.time(),
+        'finished_at': None,
+        '_cancel': threading.Event(),
+    }
+    with _jobs_lock:
+        _jobs[job_id] = job
+    options = {
+        'set_id': set_id, 'set_name': set_name,
+        'language_from': language_from, 'language_to': language_to,
+        'overrides': overrides or {}, 'sheet': sheet, 'dedupe': dedupe, 'on_duplicate': on_duplicate,
+    }
+    _executor.submit(_run_job, job_id, path, filename, options)
+    return get_job(job_id)
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        return {k: v for k, v in job.items() if not k.startswith('_')}
+
+
+def cancel_job(job_id: str) -> bool:
+    """Ask a job to stop; chunks that were already inserted are kept"""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None or job['status'] in FINISHED:
+            return False
+        job['_cancel'].set()
+        if job['status'] == 'queued':
+            job['status'] = 'cancelled'
+            job['finished_at'] = time.time()
+        return True
+
+
+def _run_job(job_id: str, path: str, filename: str, options: Dict[str, Any]):
+    with _jobs_lock:
+        job = _jobs[job_id]
+        if job['status'] == 'cancelled':
+            remove_spooled(path)
+            return
+        job['status'] = 'running'
+        cancel = job['_cancel']
+        user_id = job['user_id']
+
+    def report(**fields):
+        _update_job(job_id, **fields)
+
+    try:
+        result = import_path(path, filename, user_id, cancel=cancel, report=report, **options)
+        _update_job(job_id, status='done', finished_at=time.time(), **result)
+        if result['inserted']:
+            enqueue_set(result['set_id'])
+    except ImportCancelled:
+        _update_job(job_id, status='cancelled', finished_at=time.time())
+    except Exception as e:
+        _update_job(job_id, status='failed', error=str(e), finished_at=time.time())
+    finally:
+        remove_spooled(path)
+
+
+def remove_spooled(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
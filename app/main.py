@@ -5,8 +5,8 @@ from fastapi.staticfiles import StaticFiles
 from starlette.middleware.sessions import SessionMiddleware
 from typing import Optional
 import os
-import io
-import csv
+import math
+import asyncio
 from datetime import datetime, timedelta
 from itsdangerous import URLSafeTimedSerializer
 from dotenv import load_dotenv
@@ -14,11 +14,15 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
-from .detect import read_any, choose_mapping
+from .importer import spool_upload, remove_spooled, preview_in_pool, parse_in_pool, save_parsed
+from .importer import import_path, ImportTooLarge
+from .importer import run_in_parse_pool, PARSE_TIMEOUT, IMPORT_TIMEOUT, PARSE_GRACE
+from .importer import start_import_job, get_job, cancel_job
 from .storage import (
-    create_set, add_term, list_sets, get_set, list_terms, delete_term,
+    create_set, add_term, add_terms, list_sets, get_set, list_terms, list_terms_by_set, delete_term,
     get_progress, save_progress, list_progress, update_set, delete_set,
-    update_term, get_term, get_user_stats, list_public_sets, clone_set,
+    update_term, update_terms, get_term, get_user_stats, list_public_sets, clone_set, log_review,
+    get_review_forecast,
     add_like, remove_like, get_likes_count, is_liked_by_user,
     add_comment, get_comments, get_comments_count, add_share, get_shares_count,
     get_feed_posts, create_post, list_all_feed_items, get_user_posts,
@@ -34,6 +38,12 @@ from .auth import create_user, verify_user, get_user
 from .auth import update_user_profile, change_user_password
 from .auth import follow_user, unfollow_user, is_following, get_followers, get_following
 from . import ai_helper
+from . import enrichment
+from .ai_cache import translation_cache
+from .ratelimit import ai_limiter
+from .analytics import review_history
+from .export import iter_csv_export, iter_jsonl_export, spool_xlsx_export, iter_file_chunks, export_filename, attachment_headers, XLSX_MEDIA_TYPE
+from .export import iter_zip_export, ZIP_FORMATS, ZIP_MEDIA_TYPE
 from .oauth import oauth
 
 app = FastAPI(title='Vocab App (VN)')
@@ -75,6 +85,36 @@ async def log_requests(request: Request, call_next):
     response = await call_next(request)
     return response
 
+
+@app.middleware("http")
+async def limit_ai_requests(request: Request, call_next):
+    """Token bucket per user and AI endpoint; status reads (GET) are not limited"""
+    path = request.url.path
+    if request.method != 'POST' or not path.startswith('/api/ai/'):
+        return await call_next(request)
+    session = request.cookies.get('session')
+    username = verify_session_token(session) if session else None
+    # Anonymous calls get 401 from the route, but are still counted per client address
+    who = username or f"ip:{request.client.host if request.client else '-'}"
+    endpoint = path[len('/api/ai/'):].split('/', 1)[0]
+    decision = ai_limiter.check(who, endpoint)
+    if not decision.allowed:
+        retry_after = max(1, math.ceil(min(decision.retry_after, 3600)))
+        return JSONResponse(
+            {'success': False, 'error': f'Quá nhiều yêu cầu, thử lại sau {retry_after} giây'},
+            status_code=429,
+            headers={'Retry-After': str(retry_after)},
+        )
+    response = await call_next(request)
+    response.headers['X-RateLimit-Remaining'] = str(decision.remaining)
+    return response
+
+
+@app.on_event('shutdown')
+async def close_ai_clients():
+    await asyncio.to_thread(enrichment.shutdown)
+    await ai_helper.close_clients()
+
 def create_session_token(username: str) -> str:
     return serializer.dumps(username, salt='session')
 
@@ -172,18 +212,24 @@ def home(request: Request, session: Optional[str] = Cookie(None)):
 
 
 @app.post('/preview')
-async def preview(file: UploadFile = File(...), set_name: str = Form(...), language_from: str = Form('en'), language_to: str = Form('vi')):
-    rows = await read_any(file)
-    mapping, headers = choose_mapping(rows)
-    sample = rows[:5]
-    return {
-        'mapping': mapping,
-        'headers': headers,
-        'sample': sample,
+async def preview(file: UploadFile = File(...), set_name: str = Form(...), language_from: str = Form('en'), language_to: str = Form('vi'), sheet: Optional[str] = Form(None), session: Optional[str] = Cookie(None)):
+    # Parsing and detection run in the parse pool; only the first rows are read
+    path = await asyncio.to_thread(spool_upload, file.file, file.filename)
+    try:
+        result = await run_in_parse_pool(preview_in_pool, path, file.filename, sheet, get_current_user(session),
+                                         PARSE_TIMEOUT, timeout=PARSE_TIMEOUT + PARSE_GRACE)
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+    except (asyncio.TimeoutError, TimeoutError):
+        return JSONResponse({'error': 'Quá thời gian xử lý file'}, status_code=504)
+    finally:
+        remove_spooled(path)
+    result.update({
         'set_name': set_name,
         'language_from': language_from,
         'language_to': language_to,
-    }
+    })
+    return result
 
 
 @app.post('/import')
@@ -200,41 +246,104 @@ async def import_data(
     example_col: Optional[str] = Form(None),
     meaning_col: Optional[str] = Form(None),
     visibility: str = Form('private'),
+    sheet: Optional[str] = Form(None),
+    on_duplicate: str = Form('keep'),
 ):
     username = get_current_user(session)
     if not username:
         return { 'error': 'Vui lòng đăng nhập' }
-    rows = await read_any(file)
-    auto_map, _ = choose_mapping(rows)
-    word = word_col or auto_map.get('word')
-    meaning = meaning_col or auto_map.get('meaning')
-    pos = pos_col or auto_map.get('pos')
-    pronunciation = pronunciation_col or auto_map.get('pronunciation')
-    example = example_col or auto_map.get('example')
-    if not word or not meaning:
-        return { 'error': 'Không xác định được cột từ/ nghĩa' }
-
-    sid = set_id
-    if not sid:
-        # create set locally with user_id
-        new_set = create_set(set_name or 'Bộ từ', f'Import from {file.filename}', language_from, language_to, username, 'private', username)
-        sid = new_set['id']
-
-    inserted = 0
-    skipped = 0
-    for r in rows:
-        term_val = (r.get(word) or '').strip()
-        meaning_val = (r.get(meaning) or '').strip()
-        pos_val = (r.get(pos) or '').strip() if pos else None
-        pronunciation_val = (r.get(pronunciation) or '').strip() if pronunciation else None
-        example_val = (r.get(example) or '').strip() if example else None
-        if not term_val or not meaning_val:
-            skipped += 1
-            continue
-        add_term(sid, term_val, meaning_val, pos_val, pronunciation_val, example_val)
-        inserted += 1
-
-    return { 'set_id': sid, 'inserted': inserted, 'skipped': skipped }
+    options = {
+        'overrides': {'word': word_col, 'meaning': meaning_col, 'pos': pos_col,
+                      'pronunciation': pronunciation_col, 'example': example_col},
+        'sheet': sheet, 'on_duplicate': on_duplicate,
+    }
+    path = await asyncio.to_thread(spool_upload, file.file, file.filename)
+    try:
+        try:
+            # Only parsing runs in the pool, so a timeout here means nothing was stored
+            parsed = await run_in_parse_pool(parse_in_pool, path, file.filename, username, options,
+                                             IMPORT_TIMEOUT, timeout=IMPORT_TIMEOUT + PARSE_GRACE)
+        except ImportTooLarge:
+            parsed = None
+        # Writes happen in the server process and are never cut off by the timeout
+        if parsed is None:
+            # Too many terms to bring back at once: stream them in chunks, as import jobs do
+            result = await asyncio.to_thread(import_path, path, file.filename, username, set_id, set_name,
+                                             language_from, language_to, **options)
+        else:
+            result = await asyncio.to_thread(save_parsed, parsed, file.filename, username, set_id, set_name,
+                                             language_from, language_to, on_duplicate)
+    except ValueError as e:
+        return { 'error': str(e) }
+    except (asyncio.TimeoutError, TimeoutError):
+        return JSONResponse({'error': 'Quá thời gian xử lý file'}, status_code=504)
+    finally:
+        remove_spooled(path)
+    if result['inserted']:
+        enrichment.enqueue_set(result['set_id'])
+    return { 'set_id': result['set_id'], 'inserted': result['inserted'], 'skipped': result['skipped'],
+             'duplicates': result['duplicates'], 'merged': result['merged'] }
+
+
+@app.post('/api/import')
+async def api_import_start(
+    session: Optional[str] = Cookie(None),
+    file: UploadFile = File(...),
+    set_id: Optional[str] = Form(None),
+    set_name: Optional[str] = Form(None),
+    language_from: str = Form('en'),
+    language_to: str = Form('vi'),
+    word_col: Optional[str] = Form(None),
+    pos_col: Optional[str] = Form(None),
+    pronunciation_col: Optional[str] = Form(None),
+    example_col: Optional[str] = Form(None),
+    meaning_col: Optional[str] = Form(None),
+    sheet: Optional[str] = Form(None),
+    dedupe: bool = Form(True),
+    on_duplicate: str = Form('skip'),
+):
+    """Start a background import; poll /api/import/{job_id} for progress"""
+    username = get_current_user(session)
+    if not username:
+        return JSONResponse({'error': 'Vui lòng đăng nhập'}, status_code=401)
+    if set_id:
+        vset = get_set(set_id)
+        if not vset or vset.get('user_id') != username:
+            return JSONResponse({'error': 'Unauthorized'}, status_code=403)
+
+    # Spool the upload to a temp file the worker can read after this request ends
+    path = await asyncio.to_thread(spool_upload, file.file, file.filename)
+
+    job = start_import_job(
+        username, path, file.filename, set_id=set_id, set_name=set_name,
+        language_from=language_from, language_to=language_to,
+        overrides={'word': word_col, 'meaning': meaning_col, 'pos': pos_col,
+                   'pronunciation': pronunciation_col, 'example': example_col},
+        sheet=sheet, dedupe=dedupe, on_duplicate=on_duplicate,
+    )
+    return job
+
+
+@app.get('/api/import/{job_id}')
+def api_import_status(job_id: str, session: Optional[str] = Cookie(None)):
+    username = get_current_user(session)
+    if not username:
+        return JSONResponse({'error': 'Not authenticated'}, status_code=401)
+    job = get_job(job_id)
+    if not job or job['user_id'] != username:
+        return JSONResponse({'error': 'Job not found'}, status_code=404)
+    return job
+
+
+@app.delete('/api/import/{job_id}')
+def api_import_cancel(job_id: str, session: Optional[str] = Cookie(None)):
+    username = get_current_user(session)
+    if not username:
+        return JSONResponse({'error': 'Not authenticated'}, status_code=401)
+    job = get_job(job_id)
+    if not job or job['user_id'] != username:
+        return JSONResponse({'error': 'Job not found'}, status_code=404)
+    return {'cancelled': cancel_job(job_id), 'job': get_job(job_id)}
 
 
 @app.get('/sets/create', response_class=HTMLResponse)
@@ -264,10 +373,6 @@ async def create_set_submit(request: Request, session: Optional[str] = Cookie(No
     if not set_name:
         return { 'error': 'Tên bộ từ không được để trống' }
     
-    # Create the set
-    new_set = create_set(set_name, description, language_from, language_to, username, visibility, username)
-    set_id = new_set['id']
-    
     # Extract terms from form data
     # Form sends: terms[1][term], terms[1][definition], terms[1][pos], etc.
     terms_dict = {}
@@ -282,20 +387,26 @@ async def create_set_submit(request: Request, session: Optional[str] = Cookie(No
                     terms_dict[term_id] = {}
                 terms_dict[term_id][field_name] = value.strip() if isinstance(value, str) else ''
     
-    # Add terms to the set
-    inserted = 0
+    rows = []
     for term_id, term_data in terms_dict.items():
         term_val = term_data.get('term', '').strip()
         definition_val = term_data.get('definition', '').strip()
-        pos_val = term_data.get('pos', '').strip() or None
-        pronunciation_val = term_data.get('pronunciation', '').strip() or None
-        example_val = term_data.get('example', '').strip() or None
-        
         if term_val and definition_val:
-            add_term(set_id, term_val, definition_val, pos_val, pronunciation_val, example_val)
-            inserted += 1
+            rows.append({'term': term_val, 'definition': definition_val,
+                         'pos': term_data.get('pos', '').strip() or None,
+                         'pronunciation': term_data.get('pronunciation', '').strip() or None,
+                         'example': term_data.get('example', '').strip() or None})
+
+    def store():
+        # Create the set, then add its terms in one write of terms.json
+        new_set = create_set(set_name, description, language_from, language_to, username, visibility, username)
+        return new_set['id'], (add_terms(new_set['id'], rows) if rows else [])
+
+    # Storage writers wait on file locks: keep them off the event loop
+    set_id, added = await asyncio.to_thread(store)
+    enrichment.enqueue_terms(set_id, added)
     
-    return { 'set_id': set_id, 'inserted': inserted, 'message': 'Tạo bộ từ thành công!' }
+    return { 'set_id': set_id, 'inserted': len(added), 'message': 'Tạo bộ từ thành công!' }
 
 
 @app.get('/sets', response_class=HTMLResponse)
@@ -308,6 +419,29 @@ def sets_page(request: Request, session: Optional[str] = Cookie(None)):
     return templates.TemplateResponse('sets_list.html', { 'request': request, 'sets': sets, 'username': username, 'user': user_obj })
 
 
+@app.get('/sets/export-all')
+def export_all_sets(session: Optional[str] = Cookie(None), format: str = 'csv'):
+    """Every set of the user as one ZIP (one file per set + manifest.json), streamed"""
+    username = get_current_user(session)
+    if not username:
+        return RedirectResponse(url='/login', status_code=303)
+    if format not in ZIP_FORMATS:
+        return HTMLResponse('Invalid format', status_code=400)
+    if format == 'xlsx':
+        try:
+            import openpyxl  # noqa: F401
+        except ImportError:
+            return HTMLResponse('XLSX export requires openpyxl library', status_code=500)
+
+    sets = list_sets(user_id=username)
+    terms_by_set = list_terms_by_set(s['id'] for s in sets)
+    return StreamingResponse(
+        iter_zip_export(sets, terms_by_set, format, username),
+        media_type=ZIP_MEDIA_TYPE,
+        headers=attachment_headers(export_filename(f'{username}_vocab_{format}', 'zip'))
+    )
+
+
 @app.get('/sets/{set_id}', response_class=HTMLResponse)
 def set_detail_page(set_id: str, request: Request, session: Optional[str] = Cookie(None)):
     username = get_current_user(session)
@@ -326,7 +460,7 @@ def set_detail_page(set_id: str, request: Request, session: Optional[str] = Cook
 
 @app.get('/sets/{set_id}/export')
 def export_set(set_id: str, session: Optional[str] = Cookie(None), format: str = 'csv'):
-    """Export vocabulary set to CSV or XLSX"""
+    """Export vocabulary set to CSV, XLSX or JSON Lines"""
     username = get_current_user(session)
     if not username:
         return RedirectResponse(url='/login', status_code=303)
@@ -336,65 +470,32 @@ def export_set(set_id: str, session: Optional[str] = Cookie(None), format: str =
         return HTMLResponse('Unauthorized', status_code=403)
     
     terms = list_terms(set_id)
-    
+
     if format == 'csv':
-        # Create CSV
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(['Word', 'Part of Speech', 'Meaning', 'Example'])
-        for t in terms:
-            writer.writerow([
-                t.get('term', ''),
-                t.get('pos', ''),
-                t.get('definition', ''),
-                t.get('example', '')
-            ])
-        
-        output.seek(0)
-        filename = f"{vset['name'].replace(' ', '_')}.csv"
-        
         return StreamingResponse(
-            iter([output.getvalue()]),
-            media_type='text/csv',
-            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+            iter_csv_export(terms),
+            media_type='text/csv; charset=utf-8',
+            headers=attachment_headers(export_filename(vset['name'], 'csv'))
         )
-    
+
     elif format == 'xlsx':
-        # Create XLSX using openpyxl
         try:
-            from openpyxl import Workbook
-            
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "Vocabulary"
-            
-            # Headers
-            ws.append(['Word', 'Part of Speech', 'Meaning', 'Example'])
-            
-            # Data
-            for t in terms:
-                ws.append([
-                    t.get('term', ''),
-                    t.get('pos', ''),
-                    t.get('definition', ''),
-                    t.get('example', '')
-                ])
-            
-            # Save to BytesIO
-            output = io.BytesIO()
-            wb.save(output)
-            output.seek(0)
-            
-            filename = f"{vset['name'].replace(' ', '_')}.xlsx"
-            
-            return StreamingResponse(
-                output,
-                media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                headers={'Content-Disposition': f'attachment; filename="{filename}"'}
-            )
+            path = spool_xlsx_export(terms)
         except ImportError:
             return HTMLResponse('XLSX export requires openpyxl library', status_code=500)
-    
+        return StreamingResponse(
+            iter_file_chunks(path),
+            media_type=XLSX_MEDIA_TYPE,
+            headers=attachment_headers(export_filename(vset['name'], 'xlsx'))
+        )
+
+    elif format == 'jsonl':
+        return StreamingResponse(
+            iter_jsonl_export(terms),
+            media_type='application/x-ndjson',
+            headers=attachment_headers(export_filename(vset['name'], 'jsonl'))
+        )
+
     return HTMLResponse('Invalid format', status_code=400)
 
 
@@ -524,7 +625,8 @@ def add_term_route(
     if not vset or vset.get('user_id') != username:
         return HTMLResponse('Unauthorized', status_code=403)
     
-    add_term(set_id, term, definition, pos, example)
+    row = add_term(set_id, term, definition, pos, example=example)
+    enrichment.enqueue_terms(set_id, [row])
     return RedirectResponse(url=f'/sets/{set_id}', status_code=303)
 
 
@@ -632,10 +734,45 @@ def answer_term(req: dict, session: Optional[str] = Cookie(None)):
         interval = 1
     easiness, repetitions, interval = sm2_update(easiness, repetitions, interval, rating)
     next_review = (datetime.utcnow() + timedelta(days=interval)).date().isoformat()
-    save_progress(term_id, easiness, repetitions, interval, next_review, user_id)
+    # The term's own set, never the client's: progress is indexed and counted by it
+    term = get_term(term_id)
+    set_id = term.get('set_id') if term else (p.get('set_id') if p else None)
+    save_progress(term_id, easiness, repetitions, interval, next_review, user_id, set_id)
+    response_ms = req.get('response_ms')
+    if not isinstance(response_ms, (int, float)) or response_ms < 0:
+        response_ms = None
+    log_review(user_id, term_id, rating, set_id, int(response_ms) if response_ms is not None else None)
     return {'status': 'ok', 'next_review': next_review, 'interval': interval}
 
 
+@app.get('/api/stats')
+def api_stats(session: Optional[str] = Cookie(None)):
+    """Dashboard numbers for the current user (read from the stats aggregate)"""
+    username = get_current_user(session)
+    if not username:
+        return JSONResponse({'error': 'Not authenticated'}, status_code=401)
+    return get_user_stats(username)
+
+
+@app.get('/api/forecast')
+def api_forecast(days: int = 30, session: Optional[str] = Cookie(None)):
+    """Upcoming review load per day, per set and in total"""
+    username = get_current_user(session)
+    if not username:
+        return JSONResponse({'error': 'Not authenticated'}, status_code=401)
+    days = max(1, min(days, 365))
+    return get_review_forecast(username, days)
+
+
+@app.get('/api/stats/history')
+def api_stats_history(session: Optional[str] = Cookie(None)):
+    """Daily review counts, streak, retention curve and per-set accuracy from the review log"""
+    username = get_current_user(session)
+    if not username:
+        return JSONResponse({'error': 'Not authenticated'}, status_code=401)
+    return review_history(username)
+
+
 @app.post('/api/choice')
 def get_choice_question(req: dict, session: Optional[str] = Cookie(None)):
     """Generate multiple choice question with distractors"""
@@ -782,6 +919,64 @@ async def api_antonyms(request: Request, session: Optional[str] = Cookie(None)):
     result = await ai_helper.suggest_antonyms(word, pos, language=language, translate_to=translate_to)
     return JSONResponse(result)
 
+@app.post('/api/ai/translate-set/{set_id}')
+async def api_translate_set(set_id: str, session: Optional[str] = Cookie(None)):
+    """Fill in empty or placeholder definitions of a set with batched translations"""
+    username = verify_session_token(session) if session else None
+    if not username:
+        return JSONResponse({'success': False, 'error': 'Not authenticated'}, status_code=401)
+
+    vset = await asyncio.to_thread(get_set, set_id)
+    if not vset:
+        return JSONResponse({'success': False, 'error': 'Set not found'}, status_code=404)
+    if vset.get('user_id') != username:
+        return JSONResponse({'success': False, 'error': 'Unauthorized'}, status_code=403)
+
+    terms = await asyncio.to_thread(list_terms, set_id)
+    missing = [t for t in terms if t.get('term') and ai_helper.is_missing_definition(t.get('definition'))]
+    if not missing:
+        return JSONResponse({'success': True, 'missing': 0, 'updated': 0, 'failed': [], 'remaining': 0,
+                             'providers': {}})
+
+    result = await ai_helper.translate_many([t['term'] for t in missing],
+                                            vset.get('language_from') or 'en', vset.get('language_to') or 'vi')
+    translations = result['translations']
+    updated = await asyncio.to_thread(update_terms, {t['id']: {'definition': translations[t['term']]}
+                                                    for t in missing if t['term'] in translations})
+    return JSONResponse({
+        'success': True,
+        'missing': len(missing),
+        'updated': len(updated),
+        'failed': result['failed'],
+        'remaining': len(result['remaining']),
+        'providers': result['providers'],
+    })
+
+@app.get('/api/ai/enrich/{set_id}')
+def api_enrich_status(set_id: str, session: Optional[str] = Cookie(None)):
+    """Progress of background example generation for a set"""
+    username = verify_session_token(session) if session else None
+    if not username:
+        return JSONResponse({'success': False, 'error': 'Not authenticated'}, status_code=401)
+    vset = get_set(set_id)
+    if not vset or vset.get('user_id') != username:
+        return JSONResponse({'success': False, 'error': 'Unauthorized'}, status_code=403)
+    return JSONResponse({'success': True, 'set_id': set_id, **enrichment.set_status(set_id)})
+
+
+@app.post('/api/ai/enrich/{set_id}')
+def api_enrich_set(set_id: str, session: Optional[str] = Cookie(None)):
+    """Queue example generation for every term of a set that has no example"""
+    username = verify_session_token(session) if session else None
+    if not username:
+        return JSONResponse({'success': False, 'error': 'Not authenticated'}, status_code=401)
+    vset = get_set(set_id)
+    if not vset or vset.get('user_id') != username:
+        return JSONResponse({'success': False, 'error': 'Unauthorized'}, status_code=403)
+    added = enrichment.enqueue_set(set_id)
+    return JSONResponse({'success': True, 'set_id': set_id, 'added': added, **enrichment.set_status(set_id)})
+
+
 @app.get('/api/ai/status')
 async def api_ai_status(session: Optional[str] = Cookie(None)):
     """Check if AI features are enabled"""
@@ -793,7 +988,10 @@ async def api_ai_status(session: Optional[str] = Cookie(None)):
     return JSONResponse({
         'success': True,
         'enabled': is_enabled,
-        'message': 'AI features are available' if is_enabled else 'Set OPENAI_API_KEY to enable AI features'
+        'message': 'AI features are available' if is_enabled else 'Set OPENAI_API_KEY to enable AI features',
+        'cache': translation_cache.stats(),
+        'coalescing': ai_helper.single_flight_stats(),
+        'providers': ai_helper.provider_health(),
     })
 
 
@@ -1097,7 +1295,7 @@ async def api_create_post(request: Request, session: Optional[str] = Cookie(None
         if not vset or vset.get('user_id') != username:
             return JSONResponse({'error': 'Bộ từ không hợp lệ'}, status_code=400)
     
-    post = create_post(username, username, content, attached_set_id, image_url)
+    post = await asyncio.to_thread(create_post, username, username, content, attached_set_id, image_url)
     
     return JSONResponse({
         'success': True,
@@ -1123,11 +1321,12 @@ async def api_like_set(set_id: str, request: Request, session: Optional[str] = C
     data = await request.json()
     unlike = data.get('unlike', False)
     
+    # Storage writers wait on file locks: keep them off the event loop
     if unlike:
-        remove_like(set_id, username)
+        await asyncio.to_thread(remove_like, set_id, username)
         liked = False
     else:
-        add_like(set_id, username)
+        await asyncio.to_thread(add_like, set_id, username)
         liked = True
     
     likes_count = get_likes_count(set_id)
@@ -1175,14 +1374,14 @@ async def api_comment_set(set_id: str, request: Request, session: Optional[str]
         return JSONResponse({'error': 'Comment cannot be empty'}, status_code=400)
 
     # Lưu comment dùng chung trường set_id (giữ schema cũ) – có thể là id của set hoặc post
-    comment = add_comment(set_id, username, username, content)
+    comment = await asyncio.to_thread(add_comment, set_id, username, username, content)
     comments_count = get_comments_count(set_id)
 
     return JSONResponse({'success': True, 'comment': comment, 'comments_count': comments_count})
 
 
 @app.get('/api/sets/{set_id}/comments')
-async def api_get_comments(set_id: str, session: Optional[str] = Cookie(None)):
+def api_get_comments(set_id: str, session: Optional[str] = Cookie(None)):
     """Lấy danh sách bình luận cho set public hoặc bài viết text.
 
     Không giới hạn số lượng (front-end có thể scroll). Có thể mở rộng sau bằng query params
@@ -1230,20 +1429,22 @@ async def api_clone_set(set_id: str, request: Request, session: Optional[str] =
     if not username:
         return JSONResponse({'error': 'Not authenticated'}, status_code=401)
     
-    # Get caption if provided
+    # Get caption / duplicate handling if provided
     try:
         data = await request.json()
         caption = data.get('caption')
+        on_duplicate = data.get('on_duplicate') or 'keep'
     except:
         caption = None
+        on_duplicate = 'keep'
     
     vset = get_set(set_id)
     if not vset:
         return JSONResponse({'error': 'Set not found'}, status_code=404)
     
     try:
-        new_set_id = clone_set(set_id, username, username)
-        add_share(set_id, username)  # Track as a share
+        new_set_id = await asyncio.to_thread(clone_set, set_id, username, username, on_duplicate)
+        await asyncio.to_thread(add_share, set_id, username)  # Track as a share
         
         # If caption provided, could create a post about the shared set
         # (Future enhancement: create a post with the caption)
@@ -1258,7 +1459,7 @@ async def api_clone_set(set_id: str, request: Request, session: Optional[str] =
 
 # ---- Bookmark APIs ----
 @app.post('/api/sets/{set_id}/bookmark')
-async def api_bookmark_set(set_id: str, session: Optional[str] = Cookie(None)):
+def api_bookmark_set(set_id: str, session: Optional[str] = Cookie(None)):
     """Lưu/bỏ lưu bộ từ hoặc post"""
     username = get_current_user(session)
     if not username:
@@ -1286,7 +1487,7 @@ async def api_bookmark_set(set_id: str, session: Optional[str] = Cookie(None)):
 
 
 @app.get('/api/bookmarks')
-async def api_get_bookmarks(session: Optional[str] = Cookie(None)):
+def api_get_bookmarks(session: Optional[str] = Cookie(None)):
     """Lấy danh sách bộ từ đã lưu"""
     username = get_current_user(session)
     if not username:
@@ -1298,7 +1499,7 @@ async def api_get_bookmarks(session: Optional[str] = Cookie(None)):
 
 # ---- Comment Like/Reply APIs ----
 @app.post('/api/comments/{comment_id}/like')
-async def api_like_comment(comment_id: str, session: Optional[str] = Cookie(None)):
+def api_like_comment(comment_id: str, session: Optional[str] = Cookie(None)):
     """Thích/bỏ thích bình luận"""
     username = get_current_user(session)
     if not username:
@@ -1335,7 +1536,7 @@ async def api_reply_comment(comment_id: str, request: Request, session: Optional
     if not content:
         return JSONResponse({'error': 'Reply cannot be empty'}, status_code=400)
     
-    reply = add_comment_reply(comment_id, username, username, content)
+    reply = await asyncio.to_thread(add_comment_reply, comment_id, username, username, content)
     replies_count = get_comment_replies_count(comment_id)
     
     # Add user info
@@ -1358,7 +1559,7 @@ async def api_reply_comment(comment_id: str, request: Request, session: Optional
 # ========== Post Management APIs ==========
 
 @app.delete('/api/posts/{post_id}')
-async def api_delete_post(post_id: str, session: Optional[str] = Cookie(None)):
+def api_delete_post(post_id: str, session: Optional[str] = Cookie(None)):
     """Xóa bài viết"""
     username = get_current_user(session)
     if not username:
@@ -1385,7 +1586,7 @@ async def api_update_post(post_id: str, request: Request, session: Optional[str]
     if not content:
         return JSONResponse({'error': 'Content cannot be empty'}, status_code=400)
     
-    success = update_post(post_id, username, content, image_url)
+    success = await asyncio.to_thread(update_post, post_id, username, content, image_url)
     if success:
         post = get_post(post_id)
         return JSONResponse({'success': True, 'message': 'Đã cập nhật bài viết', 'post': post})
@@ -1396,7 +1597,7 @@ async def api_update_post(post_id: str, request: Request, session: Optional[str]
 # ========== Comment Management APIs ==========
 
 @app.delete('/api/comments/{comment_id}')
-async def api_delete_comment(comment_id: str, session: Optional[str] = Cookie(None)):
+def api_delete_comment(comment_id: str, session: Optional[str] = Cookie(None)):
     """Xóa bình luận"""
     username = get_current_user(session)
     if not username:
@@ -1422,7 +1623,7 @@ async def api_update_comment(comment_id: str, request: Request, session: Optiona
     if not content:
         return JSONResponse({'error': 'Content cannot be empty'}, status_code=400)
     
-    success = update_comment(comment_id, username, content)
+    success = await asyncio.to_thread(update_comment, comment_id, username, content)
     if success:
         return JSONResponse({'success': True, 'message': 'Đã cập nhật bình luận'})
     else:
@@ -1432,7 +1633,7 @@ async def api_update_comment(comment_id: str, request: Request, session: Optiona
 # ========== Reply Management APIs ==========
 
 @app.delete('/api/replies/{reply_id}')
-async def api_delete_reply(reply_id: str, session: Optional[str] = Cookie(None)):
+def api_delete_reply(reply_id: str, session: Optional[str] = Cookie(None)):
     """Xóa trả lời"""
     username = get_current_user(session)
     if not username:
@@ -1458,7 +1659,7 @@ async def api_update_reply(reply_id: str, request: Request, session: Optional[st
     if not content:
         return JSONResponse({'error': 'Content cannot be empty'}, status_code=400)
     
-    success = update_reply(reply_id, username, content)
+    success = await asyncio.to_thread(update_reply, reply_id, username, content)
     if success:
         return JSONResponse({'success': True, 'message': 'Đã cập nhật trả lời'})
     else:
@@ -1468,7 +1669,7 @@ async def api_update_reply(reply_id: str, request: Request, session: Optional[st
 # ========== Reply Like APIs ==========
 
 @app.post('/api/replies/{reply_id}/like')
-async def api_like_reply(reply_id: str, session: Optional[str] = Cookie(None)):
+def api_like_reply(reply_id: str, session: Optional[str] = Cookie(None)):
     """Thích/bỏ thích trả lời"""
     username = get_current_user(session)
     if not username:
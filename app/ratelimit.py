@@ -0,0 +1,105 @@
+"""
+Token-bucket rate limiting for the AI endpoints.
+
+Every (user, endpoint) pair has a bucket holding up to `burst` tokens that
+refills at `per_minute` tokens a minute; a request takes one token or is
+refused with the seconds until one is available.
+
+Buckets live in a BucketStore. MemoryBucketStore keeps them in this process;
+when the app runs several workers, a shared backend (Redis etc.) can be put
+in its place by implementing `take` and assigning it to `ai_limiter.store`.
+"""
+import os
+import abc
+import time
+import threading
+from typing import Dict, Tuple, NamedTuple, Optional
+
+# Default limits, and per-endpoint ones as "grammar=5:6,synonyms=10:20"
+# (endpoint=burst:per_minute)
+AI_RATE_BURST = int(os.getenv('AI_RATE_BURST', '10'))
+AI_RATE_PER_MINUTE = float(os.getenv('AI_RATE_PER_MINUTE', '20'))
+AI_RATE_LIMITS = os.getenv('AI_RATE_LIMITS', 'translate-set=2:2,enrich=2:4')
+
+
+class Limit(NamedTuple):
+    burst: int
+    per_minute: float
+
+
+class Decision(NamedTuple):
+    allowed: bool
+    remaining: int
+    retry_after: float
+
+
+class BucketStore(abc.ABC):
+    """Where bucket levels are kept; `take` must be atomic per key"""
+    @abc.abstractmethod
+    def take(self, key: str, limit: Limit, now: Optional[float] = None) -> Decision:
+        ...
+
+
+class MemoryBucketStore(BucketStore):
+    # Buckets checked for eviction every this many calls
+    SWEEP_EVERY = 1000
+
+    def __init__(self):
+        # key -> (tokens, updated_at, seconds until full)
+        self._buckets: Dict[str, Tuple[float, float, float]] = {}
+        self._lock = threading.Lock()
+        self._calls = 0
+
+    def take(self, key: str, limit: Limit, now: Optional[float] = None) -> Decision:
+        now = time.monotonic() if now is None else now
+        rate = limit.per_minute / 60.0
+        with self._lock:
+            tokens, updated, _ = self._buckets.get(key, (float(limit.burst), now, 0.0))
+            tokens = min(float(limit.burst), tokens + (now - updated) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                decision = Decision(True, int(tokens), 0.0)
+            else:
+                decision = Decision(False, 0, (1 - tokens) / rate if rate > 0 else float('inf'))
+            self._buckets[key] = (tokens, now, (limit.burst - tokens) / rate if rate > 0 else float('inf'))
+            self._calls += 1
+            if self._calls % self.SWEEP_EVERY == 0:
+                self._sweep(now)
+            return decision
+
+    def _sweep(self, now: float):
+        # A bucket that has refilled completely is the same as no bucket
+        for key in [k for k, (_, updated, full_in) in self._buckets.items() if now - updated >= full_in]:
+            del self._buckets[key]
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+def parse_limits(spec: str) -> Dict[str, Limit]:
+    limits = {}
+    for part in (spec or '').split(','):
+        name, _, value = part.partition('=')
+        burst, _, per_minute = value.partition(':')
+        try:
+            limits[name.strip()] = Limit(int(burst), float(per_minute))
+        except ValueError:
+            continue
+    return limits
+
+
+class TokenBucketLimiter:
+    def __init__(self, store: BucketStore, default: Limit, limits: Optional[Dict[str, Limit]] = None):
+        self.store = store
+        self.default = default
+        self.limits = limits or {}
+
+    def limit_for(self, endpoint: str) -> Limit:
+        return self.limits.get(endpoint, self.default)
+
+    def check(self, user: str, endpoint: str) -> Decision:
+        return self.store.take(f'{user}\x1f{endpoint}', self.limit_for(endpoint))
+
+
+ai_limiter = TokenBucketLimiter(MemoryBucketStore(), Limit(AI_RATE_BURST, AI_RATE_PER_MINUTE),
+                                parse_limits(AI_RATE_LIMITS))
@@ -1,12 +1,14 @@
-import json, uuid, os
-from typing import List, Dict, Any
+import json, uuid, os, re, hashlib, unicodedata, tempfile, threading, functools
+from typing import List, Dict, Any, Callable, Iterable, Optional, Tuple
 from .schemas import VocabSet, VocabTerm
 
-DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
+DATA_DIR = os.getenv('VOCAB_DATA_DIR') or os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
 SETS_FILE = os.path.join(DATA_DIR, 'sets.json')
 TERMS_FILE = os.path.join(DATA_DIR, 'terms.json')
+STATS_DIR = os.path.join(DATA_DIR, 'stats')
 
 os.makedirs(DATA_DIR, exist_ok=True)
+os.makedirs(STATS_DIR, exist_ok=True)
 
 def _load(path: str) -> List[Dict[str, Any]]:
     if not os.path.exists(path):
@@ -17,8 +19,80 @@ def _load(path: str) -> List[Dict[str, Any]]:
         return []
 
 def _save(path: str, data: List[Dict[str, Any]]):
-    with open(path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    """Write to a temp file next to `path` and swap it in, so no reader ever sees a half-written file"""
+    fd, tmp = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp',
+                               dir=os.path.dirname(path) or '.')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+def _load_dict(path: str) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {}
+    try:
+        data = json.loads(open(path, 'r', encoding='utf-8').read())
+    except Exception:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+# Writers of a shared JSON file run one at a time: request handlers, import
+# jobs and the enrichment worker all read-modify-write them. Each file has its
+# own lock (terms.json's lock also covers the term index), so a long import
+# holding terms.json does not hold up a like or a comment. A function taking
+# several locks takes them in sorted path order, and a locked function only
+# calls functions locking later paths. Readers need no lock since _save swaps
+# files atomically.
+_file_locks: Dict[str, threading.RLock] = {}
+_file_locks_guard = threading.Lock()
+
+def _file_lock(path: str) -> threading.RLock:
+    with _file_locks_guard:
+        lock = _file_locks.get(path)
+        if lock is None:
+            lock = _file_locks[path] = threading.RLock()
+        return lock
+
+def _locked(*paths: str):
+    """Run the decorated writer holding the locks of `paths` (module-level file names)"""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            locks = [_file_lock(globals()[name]) for name in sorted(paths, key=lambda n: globals()[n])]
+            for lock in locks:
+                lock.acquire()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                for lock in reversed(locks):
+                    lock.release()
+        return wrapper
+    return decorate
+
+# One lock per user around read-modify-write of their progress partition and stats aggregate
+_user_locks: Dict[str, threading.RLock] = {}
+_user_locks_guard = threading.Lock()
+
+def _user_lock(user_id: str) -> threading.RLock:
+    with _user_locks_guard:
+        lock = _user_locks.get(user_id or '')
+        if lock is None:
+            lock = _user_locks[user_id or ''] = threading.RLock()
+        return lock
+
+def _user_file(directory: str, user_id: str) -> str:
+    """Per-user file path; ids that are not filename-safe are hashed"""
+    if re.fullmatch(r'[A-Za-z0-9_-][A-Za-z0-9_.-]{0,99}', user_id or ''):
+        name = user_id
+    else:
+        name = hashlib.sha1((user_id or '').encode('utf-8')).hexdigest()
+    return os.path.join(directory, name + '.json')
 
 def list_sets(user_id: str = None) -> List[Dict[str, Any]]:
     sets = _load(SETS_FILE)
@@ -26,7 +100,8 @@ def list_sets(user_id: str = None) -> List[Dict[str, Any]]:
         return [s for s in sets if s.get('user_id') == user_id]
     return sets
 
-def create_set(name: str, description: str, lang_from: str, lang_to: str, user_id: str = None, visibility: str = 'private', owner_username: str = None) -> Dict[str, Any]:
+@_locked('SETS_FILE')
+def create_set(name: str, description: str, lang_from: str, lang_to: str, user_id: str = None, visibility: str = 'private', owner_username: str = None, cloned_from: str = None) -> Dict[str, Any]:
     from datetime import datetime
     sets = _load(SETS_FILE)
     sid = str(uuid.uuid4())
@@ -41,19 +116,127 @@ def create_set(name: str, description: str, lang_from: str, lang_to: str, user_i
         'owner_username': owner_username,
         'created_at': datetime.utcnow().isoformat()
     }
+    if cloned_from:
+        row['cloned_from'] = cloned_from
     sets.append(row)
     _save(SETS_FILE, sets)
+    _bump_stats(user_id, total_sets=1)
     return row
 
 def list_terms(set_id: str) -> List[Dict[str, Any]]:
     return [t for t in _load(TERMS_FILE) if t.get('set_id') == set_id]
 
-def add_term(set_id: str, term: str, definition: str, pos: str = None, pronunciation: str = None, example: str = None):
+def list_terms_by_set(set_ids: Iterable[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """Terms of several sets from a single read of terms.json"""
+    grouped = {sid: [] for sid in set_ids}
+    for t in _load(TERMS_FILE):
+        rows = grouped.get(t.get('set_id'))
+        if rows is not None:
+            rows.append(t)
+    return grouped
+
+# ---- Term hash index (duplicate detection) ----
+# One file per set: {'set_id', 'keys': {term_key: term_id}}; rebuilt from
+# terms.json when missing
+TERM_INDEX_DIR = os.path.join(DATA_DIR, 'term_index')
+os.makedirs(TERM_INDEX_DIR, exist_ok=True)
+
+# Fields a merge may fill in on an existing term when they are empty there
+MERGE_FIELDS = ('pos', 'pronunciation', 'example')
+
+def normalize_text(v: str) -> str:
+    """NFC, casefold and collapsed whitespace"""
+    return ' '.join(unicodedata.normalize('NFC', v or '').casefold().split())
+
+def term_key(term: str, definition: str) -> str:
+    """Hash of a normalized (term, definition) pair"""
+    return hashlib.sha1(f'{normalize_text(term)}\x1f{normalize_text(definition)}'.encode('utf-8')).hexdigest()
+
+def _load_term_index(set_id: str, terms: List[Dict[str, Any]] = None) -> Dict[str, str]:
+    data = _load_dict(_user_file(TERM_INDEX_DIR, set_id))
+    if 'keys' in data:
+        return data['keys']
+    keys = {}
+    for t in (terms if terms is not None else _load(TERMS_FILE)):
+        if t.get('set_id') == set_id:
+            keys.setdefault(term_key(t.get('term'), t.get('definition')), t.get('id'))
+    return keys
+
+def _save_term_index(set_id: str, keys: Dict[str, str]):
+    _save(_user_file(TERM_INDEX_DIR, set_id), {'set_id': set_id, 'keys': keys})
+
+def _unindex_term(keys: Dict[str, str], t: Dict[str, Any], terms: List[Dict[str, Any]]):
+    """Drop a removed/renamed term from its set's index, pointing the key at a remaining duplicate if any"""
+    key = term_key(t.get('term'), t.get('definition'))
+    if keys.get(key) != t.get('id'):
+        return
+    del keys[key]
+    for other in terms:
+        if other.get('set_id') == t.get('set_id') and other.get('id') != t.get('id') \
+                and term_key(other.get('term'), other.get('definition')) == key:
+            keys[key] = other.get('id')
+            break
+
+@_locked('TERMS_FILE')
+def _insert_terms(set_id: str, rows: Iterable[Dict[str, Any]], on_duplicate: str = None) -> Dict[str, Any]:
     terms = _load(TERMS_FILE)
-    row = {'id': str(uuid.uuid4()), 'set_id': set_id, 'term': term, 'definition': definition, 'pos': pos, 'pronunciation': pronunciation, 'example': example}
-    terms.append(row)
-    _save(TERMS_FILE, terms)
-    return row
+    keys = _load_term_index(set_id, terms)
+    by_id = None
+    added, duplicates, merged = [], 0, 0
+    for r in rows:
+        key = term_key(r.get('term'), r.get('definition'))
+        existing = keys.get(key)
+        if existing and on_duplicate in ('skip', 'merge'):
+            duplicates += 1
+            if on_duplicate == 'merge':
+                if by_id is None:
+                    by_id = {t.get('id'): t for t in terms if t.get('set_id') == set_id}
+                t = by_id.get(existing)
+                fill = {f: r.get(f) for f in MERGE_FIELDS if t is not None and r.get(f) and not t.get(f)}
+                if fill:
+                    t.update(fill)
+                    merged += 1
+            continue
+        row = {
+            'id': str(uuid.uuid4()),
+            'set_id': set_id,
+            'term': r.get('term'),
+            'definition': r.get('definition'),
+            'pos': r.get('pos'),
+            'pronunciation': r.get('pronunciation'),
+            'example': r.get('example'),
+        }
+        terms.append(row)
+        added.append(row)
+        keys.setdefault(key, row['id'])
+        if by_id is not None:
+            by_id[row['id']] = row
+    if added or merged:
+        _save(TERMS_FILE, terms)
+    _save_term_index(set_id, keys)
+    if added:
+        _bump_stats(_set_owner(set_id), total_words=len(added))
+    return {'added': added, 'duplicates': duplicates, 'merged': merged}
+
+def add_term(set_id: str, term: str, definition: str, pos: str = None, pronunciation: str = None, example: str = None):
+    return add_terms(set_id, [{'term': term, 'definition': definition, 'pos': pos,
+                               'pronunciation': pronunciation, 'example': example}])[0]
+
+def add_terms(set_id: str, rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Bulk insert: one load and one save of terms.json for many rows.
+
+    Each row may carry term, definition, pos, pronunciation and example.
+    """
+    return _insert_terms(set_id, rows)['added']
+
+def merge_terms(set_id: str, rows: Iterable[Dict[str, Any]], on_duplicate: str = 'skip') -> Dict[str, Any]:
+    """Bulk insert that skips rows whose (term, definition) the set already has.
+
+    With on_duplicate='merge' the existing term also gets the row's pos,
+    pronunciation and example where its own are empty. Returns
+    {'added': [rows], 'duplicates': n, 'merged': n}.
+    """
+    return _insert_terms(set_id, rows, on_duplicate)
 
 def get_set(set_id: str) -> Dict[str, Any]:
     sets = _load(SETS_FILE)
@@ -62,6 +245,11 @@ def get_set(set_id: str) -> Dict[str, Any]:
             return s
     return None
 
+def _set_owner(set_id: str) -> str:
+    s = get_set(set_id)
+    return s.get('user_id') if s else None
+
+@_locked('SETS_FILE')
 def update_set(set_id: str, name: str = None, description: str = None, lang_from: str = None, lang_to: str = None, visibility: str = None) -> Dict[str, Any]:
     """Update an existing vocabulary set"""
     sets = _load(SETS_FILE)
@@ -82,39 +270,67 @@ def update_set(set_id: str, name: str = None, description: str = None, lang_from
             return s
     return None
 
+@_locked('SETS_FILE', 'TERMS_FILE')
 def delete_set(set_id: str):
     """Delete a vocabulary set and all its terms"""
     # Delete the set
     sets = _load(SETS_FILE)
-    sets = [s for s in sets if s.get('id') != set_id]
-    _save(SETS_FILE, sets)
+    owner = next((s.get('user_id') for s in sets if s.get('id') == set_id), None)
+    remaining = [s for s in sets if s.get('id') != set_id]
+    _save(SETS_FILE, remaining)
     
     # Delete all terms in this set
     terms = _load(TERMS_FILE)
+    term_ids_to_delete = set(t['id'] for t in terms if t.get('set_id') == set_id)
     terms = [t for t in terms if t.get('set_id') != set_id]
     _save(TERMS_FILE, terms)
+    try:
+        os.remove(_user_file(TERM_INDEX_DIR, set_id))
+    except OSError:
+        pass
     
     # Delete all progress for terms in this set
-    progs = _load(PROGRESS_FILE)
-    term_ids_to_delete = [t['id'] for t in _load(TERMS_FILE) if t.get('set_id') == set_id]
-    progs = [p for p in progs if p.get('term_id') not in term_ids_to_delete]
-    _save(PROGRESS_FILE, progs)
+    removed = [dict(p, set_id=set_id) for p in _delete_progress(term_ids_to_delete)]
+
+    if len(remaining) < len(sets):
+        _forget_stats(removed, owner, total_sets=-1, total_words=-len(term_ids_to_delete))
+    else:
+        _forget_stats(removed)
 
+@_locked('TERMS_FILE')
 def delete_term(term_id: str):
     terms = _load(TERMS_FILE)
+    deleted = next((t for t in terms if t.get('id') == term_id), None)
     terms = [t for t in terms if t.get('id') != term_id]
     _save(TERMS_FILE, terms)
+    if deleted:
+        keys = _load_term_index(deleted.get('set_id'), terms)
+        _unindex_term(keys, deleted, terms)
+        _save_term_index(deleted.get('set_id'), keys)
     
     # Also delete progress for this term
-    progs = _load(PROGRESS_FILE)
-    progs = [p for p in progs if p.get('term_id') != term_id]
-    _save(PROGRESS_FILE, progs)
+    removed = _delete_progress(set([term_id]))
+    if deleted:
+        removed = [dict(p, set_id=deleted.get('set_id')) for p in removed]
 
+    if deleted:
+        _forget_stats(removed, _set_owner(deleted.get('set_id')), total_words=-1)
+    else:
+        _forget_stats(removed)
+
+@_locked('TERMS_FILE')
 def update_term(term_id: str, term: str = None, definition: str = None, pos: str = None, example: str = None):
     """Update an existing term"""
     terms = _load(TERMS_FILE)
     for i, t in enumerate(terms):
         if t.get('id') == term_id:
+            old_key = term_key(t.get('term'), t.get('definition'))
+            if old_key != term_key(term if term is not None else t.get('term'),
+                                   definition if definition is not None else t.get('definition')):
+                keys = _load_term_index(t.get('set_id'), terms)
+                _unindex_term(keys, t, terms)
+            else:
+                keys = None
             if term is not None:
                 t['term'] = term
             if definition is not None:
@@ -125,9 +341,49 @@ def update_term(term_id: str, term: str = None, definition: str = None, pos: str
                 t['example'] = example
             terms[i] = t
             _save(TERMS_FILE, terms)
+            if keys is not None:
+                keys.setdefault(term_key(t.get('term'), t.get('definition')), t['id'])
+                _save_term_index(t.get('set_id'), keys)
             return t
     return None
 
+# Fields update_terms may change
+TERM_FIELDS = ('term', 'definition', 'pos', 'pronunciation', 'example')
+
+@_locked('TERMS_FILE')
+def update_terms(updates: Dict[str, Dict[str, Any]], fill_only: bool = False) -> List[Dict[str, Any]]:
+    """Bulk update_term: {term_id: {field: value}} in one load and save of terms.json.
+
+    None values and unknown fields are ignored; with fill_only a field is
+    only set where the term's own is empty. Returns the updated terms.
+    """
+    terms = _load(TERMS_FILE)
+    indexes: Dict[str, Dict[str, str]] = {}
+    set_terms: Dict[str, List[Dict[str, Any]]] = {}
+    updated = []
+    for t in terms:
+        fields = {f: v for f, v in (updates.get(t.get('id')) or {}).items()
+                  if f in TERM_FIELDS and v is not None and not (fill_only and t.get(f))}
+        if not fields:
+            continue
+        new_key = term_key(fields.get('term', t.get('term')), fields.get('definition', t.get('definition')))
+        if new_key != term_key(t.get('term'), t.get('definition')):
+            sid = t.get('set_id')
+            if sid not in indexes:
+                set_terms[sid] = [o for o in terms if o.get('set_id') == sid]
+                indexes[sid] = _load_term_index(sid, set_terms[sid])
+            _unindex_term(indexes[sid], t, set_terms[sid])
+            t.update(fields)
+            indexes[sid].setdefault(new_key, t['id'])
+        else:
+            t.update(fields)
+        updated.append(t)
+    if updated:
+        _save(TERMS_FILE, terms)
+    for sid, keys in indexes.items():
+        _save_term_index(sid, keys)
+    return updated
+
 def get_term(term_id: str) -> Dict[str, Any]:
     """Get a single term by ID"""
     terms = _load(TERMS_FILE)
@@ -136,8 +392,43 @@ def get_term(term_id: str) -> Dict[str, Any]:
             return t
     return None
 
+# ---- Import column mappings ----
+# {'global': {signature: entry}, 'users': {user_id: {signature: entry}}},
+# entry = {'mapping': {category: normalized header}, 'updated_at': ...}
+MAPPINGS_FILE = os.path.join(DATA_DIR, 'import_mappings.json')
+# Entries kept per scope; the least recently saved are dropped first
+MAPPINGS_MAX = 500
+
+def get_import_mapping(signature: str, user_id: str = None) -> Tuple[Optional[Dict[str, str]], Optional[str]]:
+    """Saved mapping for a header signature and where it came from ('user' or 'global')"""
+    data = _load_dict(MAPPINGS_FILE)
+    if user_id:
+        entry = data.get('users', {}).get(user_id, {}).get(signature)
+        if entry:
+            return entry['mapping'], 'user'
+    entry = data.get('global', {}).get(signature)
+    if entry:
+        return entry['mapping'], 'global'
+    return None, None
+
+@_locked('MAPPINGS_FILE')
+def save_import_mapping(signature: str, mapping: Dict[str, str], user_id: str = None):
+    """Remember a mapping globally, or as one user's preference when user_id is given"""
+    from datetime import datetime
+    data = _load_dict(MAPPINGS_FILE)
+    scope = data.setdefault('users', {}).setdefault(user_id, {}) if user_id else data.setdefault('global', {})
+    scope.pop(signature, None)
+    scope[signature] = {'mapping': mapping, 'updated_at': datetime.utcnow().isoformat()}
+    while len(scope) > MAPPINGS_MAX:
+        del scope[next(iter(scope))]
+    _save(MAPPINGS_FILE, data)
+
 # ---- Progress (spaced repetition) ----
+# Legacy single-file progress store; see migrate_progress.py
 PROGRESS_FILE = os.path.join(DATA_DIR, 'progress.json')
+# One file per user: {'user_id', 'rows': {term_id: row}, 'sets': {set_id: [term_id, ...]}}
+PROGRESS_DIR = os.path.join(DATA_DIR, 'progress')
+REVIEW_LOG_FILE = os.path.join(DATA_DIR, 'reviews.jsonl')
 LIKES_FILE = os.path.join(DATA_DIR, 'likes.json')
 COMMENTS_FILE = os.path.join(DATA_DIR, 'comments.json')
 SHARES_FILE = os.path.join(DATA_DIR, 'shares.json')
@@ -147,99 +438,318 @@ COMMENT_LIKES_FILE = os.path.join(DATA_DIR, 'comment_likes.json')
 COMMENT_REPLIES_FILE = os.path.join(DATA_DIR, 'comment_replies.json')
 REPLY_LIKES_FILE = os.path.join(DATA_DIR, 'reply_likes.json')
 
+os.makedirs(PROGRESS_DIR, exist_ok=True)
+
+def _index_progress(data: Dict[str, Any], row: Dict[str, Any]):
+    term_id = row['term_id']
+    data['rows'][term_id] = row
+    ids = data['sets'].setdefault(row.get('set_id') or '', [])
+    if term_id not in ids:
+        ids.append(term_id)
+
+def _load_user_progress(user_id: str) -> Dict[str, Any]:
+    """Load one user's progress partition.
+
+    Users whose rows still live in the legacy progress.json (not migrated
+    yet) get them copied over on first access.
+    """
+    data = _load_dict(_user_file(PROGRESS_DIR, user_id))
+    if data:
+        return data
+    data = {'user_id': user_id, 'rows': {}, 'sets': {}}
+    if os.path.exists(PROGRESS_FILE):
+        legacy = [p for p in _load(PROGRESS_FILE) if p.get('user_id') == user_id]
+        if legacy:
+            term_sets = {t.get('id'): t.get('set_id') for t in _load(TERMS_FILE)}
+            for p in legacy:
+                if not p.get('set_id'):
+                    p['set_id'] = term_sets.get(p.get('term_id'))
+                _index_progress(data, p)
+    return data
+
+def _save_user_progress(user_id: str, data: Dict[str, Any]):
+    _save(_user_file(PROGRESS_DIR, user_id), data)
+
+def _delete_progress(term_ids) -> List[Dict[str, Any]]:
+    """Remove progress rows of the given terms for every user, returning them"""
+    removed = []
+    for name in os.listdir(PROGRESS_DIR):
+        if not name.endswith('.json'):
+            continue
+        path = os.path.join(PROGRESS_DIR, name)
+        if not any(tid in _load_dict(path).get('rows', {}) for tid in term_ids):
+            continue
+        with _user_lock(_load_dict(path).get('user_id')):
+            data = _load_dict(path)
+            hits = [data['rows'].pop(tid) for tid in term_ids if tid in data.get('rows', {})]
+            if not hits:
+                continue
+            for sid in list(data['sets']):
+                data['sets'][sid] = [tid for tid in data['sets'][sid] if tid not in term_ids]
+                if not data['sets'][sid]:
+                    del data['sets'][sid]
+            _save(path, data)
+        removed.extend(hits)
+    if os.path.exists(PROGRESS_FILE):
+        progs = _load(PROGRESS_FILE)
+        kept = [p for p in progs if p.get('term_id') not in term_ids]
+        if len(kept) < len(progs):
+            _save(PROGRESS_FILE, kept)
+            seen = set((p.get('user_id'), p.get('term_id')) for p in removed)
+            removed.extend(p for p in progs if p.get('term_id') in term_ids and (p.get('user_id'), p.get('term_id')) not in seen)
+    return removed
+
 def get_progress(term_id: str, user_id: str = 'default') -> Dict[str, Any]:
-    progs = _load(PROGRESS_FILE)
-    for p in progs:
-        if p.get('term_id') == term_id and p.get('user_id') == user_id:
-            return p
-    return None
+    return _load_user_progress(user_id)['rows'].get(term_id)
 
-def save_progress(term_id: str, easiness: float, repetitions: int, interval: int, next_review: str, user_id: str = 'default'):
+def save_progress(term_id: str, easiness: float, repetitions: int, interval: int, next_review: str, user_id: str = 'default', set_id: str = None):
     from datetime import datetime
-    progs = _load(PROGRESS_FILE)
-    existing = None
-    for i, p in enumerate(progs):
-        if p.get('term_id') == term_id and p.get('user_id') == user_id:
-            existing = i
-            break
-    row = {
-        'term_id': term_id,
-        'user_id': user_id,
-        'easiness': easiness,
-        'repetitions': repetitions,
-        'interval_days': interval,
-        'next_review': next_review,
-        'last_review': datetime.utcnow().isoformat()
-    }
-    if existing is not None:
-        progs[existing] = row
-    else:
-        progs.append(row)
-    _save(PROGRESS_FILE, progs)
+    with _user_lock(user_id):
+        data = _load_user_progress(user_id)
+        old = data['rows'].get(term_id)
+        if not set_id:
+            set_id = old.get('set_id') if old else None
+        if not set_id:
+            term = get_term(term_id)
+            set_id = term.get('set_id') if term else None
+        row = {
+            'term_id': term_id,
+            'user_id': user_id,
+            'set_id': set_id,
+            'easiness': easiness,
+            'repetitions': repetitions,
+            'interval_days': interval,
+            'next_review': next_review,
+            'last_review': datetime.utcnow().isoformat()
+        }
+        if old is not None and (old.get('set_id') or '') != (set_id or ''):
+            ids = data['sets'].get(old.get('set_id') or '', [])
+            if term_id in ids:
+                ids.remove(term_id)
+        _index_progress(data, row)
+        _save_user_progress(user_id, data)
+
+        def apply(stats):
+            if old is not None:
+                # The old row leaves the set it was counted under
+                _stats_add_progress(stats, old, -1)
+            _stats_add_progress(stats, row)
+        _update_user_stats(user_id, apply)
+
+def log_review(user_id: str, term_id: str, rating: int, set_id: str = None, response_ms: int = None):
+    """Append one review event to the review log (never rewritten).
+
+    One compact JSON object per line: u=user, t=term, s=set, r=rating,
+    ts=unix seconds (UTC), ms=response time in milliseconds.
+    """
+    import time
+    event = {'u': user_id, 't': term_id, 's': set_id, 'r': rating, 'ts': int(time.time())}
+    if response_ms is not None:
+        event['ms'] = response_ms
+    line = json.dumps(event, ensure_ascii=False, separators=(',', ':'))
+    with open(REVIEW_LOG_FILE, 'a', encoding='utf-8') as f:
+        f.write(line + '\n')
 
 def list_progress(set_id: str, user_id: str = 'default') -> List[Dict[str, Any]]:
-    terms = list_terms(set_id)
-    term_ids = [t['id'] for t in terms]
-    progs = _load(PROGRESS_FILE)
-    return [p for p in progs if p.get('term_id') in term_ids and p.get('user_id') == user_id]
+    data = _load_user_progress(user_id)
+    rows = data['rows']
+    return [rows[tid] for tid in data['sets'].get(set_id, []) if tid in rows]
+
+# ---- User statistics aggregate ----
+# One small file per user under data/stats, kept in step with every write that
+# changes a number on the dashboard so get_user_stats never rescans the data files.
+
+STATS_VERSION = 2
+
+def _empty_stats() -> Dict[str, Any]:
+    return {
+        'version': STATS_VERSION,
+        'total_sets': 0,
+        'total_words': 0,
+        'reviewed': 0,          # progress rows owned by the user
+        'learned': 0,           # progress rows with repetitions > 0
+        'easiness_sum': 0.0,
+        'due': {},              # next_review date -> number of progress rows
+        'due_by_set': {},       # set id -> {next_review date -> number of rows}
+        'review_days': [],      # sorted ISO dates with at least one review
+    }
+
+def _hist_add(hist: Dict[str, int], key: str, n: int):
+    count = hist.get(key, 0) + n
+    if count > 0:
+        hist[key] = count
+    else:
+        hist.pop(key, None)
+
+def _stats_add_progress(stats: Dict[str, Any], p: Dict[str, Any], sign: int = 1):
+    """Add (sign=1) or remove (sign=-1) one progress row from an aggregate"""
+    stats['reviewed'] += sign
+    if p.get('repetitions', 0) > 0:
+        stats['learned'] += sign
+    stats['easiness_sum'] = round(stats['easiness_sum'] + sign * p.get('easiness', 2.5), 6)
+    nr = p.get('next_review') or ''
+    _hist_add(stats['due'], nr, sign)
+    sid = p.get('set_id') or ''
+    set_hist = stats['due_by_set'].setdefault(sid, {})
+    _hist_add(set_hist, nr, sign)
+    if not set_hist:
+        del stats['due_by_set'][sid]
+    if sign > 0 and p.get('last_review'):
+        day = p['last_review'][:10]
+        days = stats['review_days']
+        if day not in days:
+            days.append(day)
+            days.sort()
+
+def _rebuild_user_stats(user_id: str) -> Dict[str, Any]:
+    """Compute the aggregate from scratch (first use, or after a lost file)"""
+    stats = _empty_stats()
+    set_ids = set(s['id'] for s in list_sets(user_id))
+    stats['total_sets'] = len(set_ids)
+    term_sets = {t.get('id'): t.get('set_id') for t in _load(TERMS_FILE)}
+    stats['total_words'] = sum(1 for sid in term_sets.values() if sid in set_ids)
+    for p in _load_user_progress(user_id)['rows'].values():
+        if not p.get('set_id'):
+            p['set_id'] = term_sets.get(p.get('term_id'))
+        _stats_add_progress(stats, p)
+    # The review log keeps every review day, not just the latest one per term
+    from .analytics import daily_review_counts
+    days = set(stats['review_days']) | set(daily_review_counts(user_id))
+    stats['review_days'] = sorted(days)
+    return stats
+
+def _load_user_stats(user_id: str) -> Dict[str, Any]:
+    stats = _load_dict(_user_file(STATS_DIR, user_id))
+    if stats.get('version') != STATS_VERSION:
+        return {}
+    return stats
+
+def _update_user_stats(user_id: str, apply: Callable[[Dict[str, Any]], None]):
+    """Apply an in-place delta to a user's aggregate.
+
+    Must be called after the underlying data file was saved: when no aggregate
+    exists yet it is rebuilt from the data, which already includes the change.
+    """
+    if not user_id:
+        return
+    path = _user_file(STATS_DIR, user_id)
+    with _user_lock(user_id):
+        stats = _load_user_stats(user_id)
+        if stats:
+            apply(stats)
+        else:
+            stats = _rebuild_user_stats(user_id)
+        _save(path, stats)
+
+def _bump_stats(user_id: str, total_sets: int = 0, total_words: int = 0):
+    def apply(stats):
+        stats['total_sets'] = max(0, stats['total_sets'] + total_sets)
+        stats['total_words'] = max(0, stats['total_words'] + total_words)
+    _update_user_stats(user_id, apply)
+
+def _forget_stats(removed: List[Dict[str, Any]], owner: str = None, total_sets: int = 0, total_words: int = 0):
+    """Drop deleted progress rows (and the owner's deleted sets/words) from the aggregates.
+
+    One update per user: a rebuild triggered by the first of several
+    separate updates would already include the later ones.
+    """
+    by_user: Dict[str, List[Dict[str, Any]]] = {}
+    for p in removed:
+        by_user.setdefault(p.get('user_id'), []).append(p)
+    if owner:
+        by_user.setdefault(owner, [])
+    for uid, rows in by_user.items():
+        def apply(stats, uid=uid, rows=rows):
+            if uid == owner:
+                stats['total_sets'] = max(0, stats['total_sets'] + total_sets)
+                stats['total_words'] = max(0, stats['total_words'] + total_words)
+            for p in rows:
+                _stats_add_progress(stats, p, -1)
+        _update_user_stats(uid, apply)
+
+def _user_stats(user_id: str) -> Dict[str, Any]:
+    stats = _load_user_stats(user_id)
+    if not stats:
+        with _user_lock(user_id):
+            stats = _load_user_stats(user_id)
+            if not stats:
+                stats = _rebuild_user_stats(user_id)
+                _save(_user_file(STATS_DIR, user_id), stats)
+    return stats
+
+def get_review_forecast(user_id: str, days: int = 30) -> Dict[str, Any]:
+    """Cards coming due per day over the next `days` days, in total and per set.
+
+    Read from the due-date histograms of the stats aggregate; overdue cards
+    are counted on the first day since that is when they will be studied.
+    """
+    from datetime import date, datetime, timedelta
+    stats = _user_stats(user_id)
+    # next_review dates are UTC days
+    today = datetime.utcnow().date()
+    dates = [(today + timedelta(days=i)).isoformat() for i in range(days)]
+
+    def bucket(hist: Dict[str, int]) -> List[int]:
+        counts = [0] * days
+        for d, n in hist.items():
+            if d <= dates[0]:
+                counts[0] += n
+            elif d <= dates[-1]:
+                try:
+                    counts[(date.fromisoformat(d) - today).days] += n
+                except ValueError:
+                    continue
+        return counts
+
+    overdue = sum(n for d, n in stats['due'].items() if d < dates[0])
+    names = {s['id']: s.get('name') for s in _load(SETS_FILE) if s.get('id') in stats['due_by_set']}
+    sets = []
+    for sid, hist in stats['due_by_set'].items():
+        counts = bucket(hist)
+        if any(counts):
+            sets.append({'set_id': sid or None, 'name': names.get(sid), 'counts': counts})
+    return {
+        'days': dates,
+        'total': bucket(stats['due']),
+        'overdue': overdue,
+        'sets': sets,
+    }
 
 def get_user_stats(user_id: str) -> Dict[str, Any]:
     """Get statistics for a user"""
-    from datetime import datetime, date
+    from datetime import date, datetime
     
-    # Get all user's sets
-    sets = list_sets(user_id)
+    stats = _user_stats(user_id)
     
-    # Get all terms from user's sets
-    all_terms = []
-    for s in sets:
-        all_terms.extend(list_terms(s['id']))
-    
-    # Get all progress for user
-    progs = _load(PROGRESS_FILE)
-    user_progs = [p for p in progs if p.get('user_id') == user_id]
-    
-    # Calculate stats
-    total_words = len(all_terms)
-    learned_words = len([p for p in user_progs if p.get('repetitions', 0) > 0])
-    
-    # Words due today
-    today = date.today().isoformat()
-    due_today = len([p for p in user_progs if p.get('next_review', '') <= today])
+    # Words due today (next_review dates are UTC days)
+    today = datetime.utcnow().date().isoformat()
+    due_today = sum(n for d, n in stats['due'].items() if d <= today)
     
     # Calculate accuracy (based on easiness factor > 2.5 means good)
-    if user_progs:
-        avg_easiness = sum(p.get('easiness', 2.5) for p in user_progs) / len(user_progs)
+    if stats['reviewed'] > 0:
+        avg_easiness = stats['easiness_sum'] / stats['reviewed']
         accuracy = min(100, max(0, (avg_easiness - 1.3) / (4.0 - 1.3) * 100))
     else:
         accuracy = 0
     
-    # Study streak (consecutive days with reviews)
-    review_dates = []
-    for p in user_progs:
-        last_review = p.get('last_review')
-        if last_review:
-            try:
-                review_date = datetime.fromisoformat(last_review).date()
-                review_dates.append(review_date)
-            except:
-                pass
-    
+    # Study streak (consecutive UTC days with reviews, like review_days)
     streak = 0
-    if review_dates:
-        review_dates = sorted(set(review_dates), reverse=True)
-        current_date = date.today()
-        for review_date in review_dates:
-            if (current_date - review_date).days <= 1:
-                streak += 1
-                current_date = review_date
-            else:
-                break
+    current_date = datetime.utcnow().date()
+    for day in reversed(stats['review_days']):
+        try:
+            review_date = date.fromisoformat(day)
+        except ValueError:
+            continue
+        if (current_date - review_date).days <= 1:
+            streak += 1
+            current_date = review_date
+        else:
+            break
     
     return {
-        'total_sets': len(sets),
-        'total_words': total_words,
-        'learned_words': learned_words,
+        'total_sets': stats['total_sets'],
+        'total_words': stats['total_words'],
+        'learned_words': stats['learned'],
         'due_today': due_today,
         'accuracy': round(accuracy, 1),
         'streak': streak
@@ -270,38 +780,46 @@ def list_public_sets(search: str = None, language_from: str = None, language_to:
     
     return public_sets
 
-def clone_set(set_id: str, new_user_id: str, new_username: str = None) -> Dict[str, Any]:
-    """Clone a public set to a user's collection"""
+@_locked('SETS_FILE')
+def clone_set(set_id: str, new_user_id: str, new_username: str = None, on_duplicate: str = 'keep') -> Dict[str, Any]:
+    """Clone a public set to a user's collection.
+
+    on_duplicate='skip' or 'merge' reuses the user's earlier copy of the
+    same set, if any, and only adds the terms it does not have yet
+    (see merge_terms); 'keep' always makes a new copy.
+    """
     original_set = get_set(set_id)
     if not original_set or original_set.get('visibility') != 'public':
         return None
-    
-    # Create new set for user
-    new_set = create_set(
-        name=f"{original_set['name']} (Copy)",
-        description=f"Copied from {original_set.get('owner_username', 'Unknown')}. {original_set.get('description', '')}",
-        lang_from=original_set['language_from'],
-        lang_to=original_set['language_to'],
-        user_id=new_user_id,
-        visibility='private',
-        owner_username=new_username
-    )
-    
-    # Copy all terms
-    original_terms = list_terms(set_id)
-    for term in original_terms:
-        add_term(
-            set_id=new_set['id'],
-            term=term['term'],
-            definition=term['definition'],
-            pos=term.get('pos'),
-            example=term.get('example')
+
+    new_set = None
+    if on_duplicate in ('skip', 'merge'):
+        new_set = next((s for s in list_sets(new_user_id) if s.get('cloned_from') == set_id), None)
+    if new_set is None:
+        # Create new set for user
+        new_set = create_set(
+            name=f"{original_set['name']} (Copy)",
+            description=f"Copied from {original_set.get('owner_username', 'Unknown')}. {original_set.get('description', '')}",
+            lang_from=original_set['language_from'],
+            lang_to=original_set['language_to'],
+            user_id=new_user_id,
+            visibility='private',
+            owner_username=new_username,
+            cloned_from=set_id
         )
-    
+
+    # Copy all terms in one bulk insert
+    original_terms = list_terms(set_id)
+    if on_duplicate in ('skip', 'merge'):
+        merge_terms(new_set['id'], original_terms, on_duplicate)
+    else:
+        add_terms(new_set['id'], original_terms)
+
     return new_set
 
 
 # ---- Social Features: Likes, Comments, Shares ----
+@_locked('LIKES_FILE')
 def add_like(set_id: str, user_id: str):
     """Thêm like cho bộ từ"""
     likes = _load(LIKES_FILE)
@@ -320,6 +838,7 @@ def add_like(set_id: str, user_id: str):
     _save(LIKES_FILE, likes)
     return True
 
+@_locked('LIKES_FILE')
 def remove_like(set_id: str, user_id: str):
     """Bỏ like cho bộ từ"""
     likes = _load(LIKES_FILE)
@@ -337,6 +856,7 @@ def is_liked_by_user(set_id: str, user_id: str) -> bool:
     likes = _load(LIKES_FILE)
     return any(l.get('set_id') == set_id and l.get('user_id') == user_id for l in likes)
 
+@_locked('COMMENTS_FILE')
 def add_comment(set_id: str, user_id: str, username: str, content: str) -> Dict[str, Any]:
     """Thêm bình luận cho bộ từ"""
     from datetime import datetime
@@ -366,6 +886,7 @@ def get_comments_count(set_id: str) -> int:
     comments = _load(COMMENTS_FILE)
     return len([c for c in comments if c.get('set_id') == set_id])
 
+@_locked('SHARES_FILE')
 def add_share(set_id: str, user_id: str):
     """Ghi nhận lượt share"""
     from datetime import datetime
@@ -409,6 +930,7 @@ def get_feed_posts(limit: int = 20, offset: int = 0) -> List[Dict[str, Any]]:
 
 
 # ---- Posts (Bài viết text thuần) ----
+@_locked('POSTS_FILE')
 def create_post(user_id: str, username: str, content: str, attached_set_id: str = None, image_url: str = None) -> Dict[str, Any]:
     """Tạo bài viết mới lên feed"""
     from datetime import datetime
@@ -517,6 +1039,7 @@ def get_user_posts(username: str, limit: int = 20, offset: int = 0) -> List[Dict
 
 
 # ---- Bookmarks (Lưu bộ từ) ----
+@_locked('BOOKMARKS_FILE')
 def add_bookmark(set_id: str, user_id: str) -> bool:
     """Lưu bộ từ vào danh sách bookmark"""
     from datetime import datetime
@@ -535,6 +1058,7 @@ def add_bookmark(set_id: str, user_id: str) -> bool:
     _save(BOOKMARKS_FILE, bookmarks)
     return True
 
+@_locked('BOOKMARKS_FILE')
 def remove_bookmark(set_id: str, user_id: str) -> bool:
     """Xóa bookmark"""
     bookmarks = _load(BOOKMARKS_FILE)
@@ -566,6 +1090,7 @@ def get_user_bookmarks(user_id: str) -> List[Dict[str, Any]]:
 
 
 # ---- Comment Likes ----
+@_locked('COMMENT_LIKES_FILE')
 def add_comment_like(comment_id: str, user_id: str) -> bool:
     """Thích một bình luận"""
     from datetime import datetime
@@ -584,6 +1109,7 @@ def add_comment_like(comment_id: str, user_id: str) -> bool:
     _save(COMMENT_LIKES_FILE, likes)
     return True
 
+@_locked('COMMENT_LIKES_FILE')
 def remove_comment_like(comment_id: str, user_id: str) -> bool:
     """Bỏ thích bình luận"""
     likes = _load(COMMENT_LIKES_FILE)
@@ -605,6 +1131,7 @@ def is_comment_liked(comment_id: str, user_id: str) -> bool:
 
 
 # ---- Reply Likes ----
+@_locked('REPLY_LIKES_FILE')
 def add_reply_like(reply_id: str, user_id: str) -> bool:
     """Thích một trả lời (reply)"""
     from datetime import datetime
@@ -623,6 +1150,7 @@ def add_reply_like(reply_id: str, user_id: str) -> bool:
     _save(REPLY_LIKES_FILE, likes)
     return True
 
+@_locked('REPLY_LIKES_FILE')
 def remove_reply_like(reply_id: str, user_id: str) -> bool:
     """Bỏ thích trả lời"""
     likes = _load(REPLY_LIKES_FILE)
@@ -644,6 +1172,7 @@ def is_reply_liked(reply_id: str, user_id: str) -> bool:
 
 
 # ---- Comment Replies ----
+@_locked('COMMENT_REPLIES_FILE')
 def add_comment_reply(comment_id: str, user_id: str, username: str, content: str) -> Dict[str, Any]:
     """Trả lời một bình luận"""
     from datetime import datetime
@@ -674,6 +1203,7 @@ def get_comment_replies_count(comment_id: str) -> int:
 
 
 # ---- Post Management: Delete & Edit ----
+@_locked('POSTS_FILE')
 def delete_post(post_id: str, user_id: str) -> bool:
     """Xóa bài viết (chỉ người tạo mới được xóa)"""
     posts = _load(POSTS_FILE)
@@ -684,6 +1214,7 @@ def delete_post(post_id: str, user_id: str) -> bool:
             return True
     return False
 
+@_locked('POSTS_FILE')
 def update_post(post_id: str, user_id: str, content: str, image_url: str = None) -> bool:
     """Chỉnh sửa nội dung bài viết (chỉ người tạo)"""
     from datetime import datetime
@@ -708,6 +1239,7 @@ def get_post(post_id: str) -> Dict[str, Any]:
 
 
 # ---- Comment Management: Delete & Edit ----
+@_locked('COMMENTS_FILE', 'COMMENT_REPLIES_FILE')
 def delete_comment(comment_id: str, user_id: str) -> bool:
     """Xóa comment (chỉ người tạo mới được xóa)"""
     comments = _load(COMMENTS_FILE)
@@ -720,6 +1252,7 @@ def delete_comment(comment_id: str, user_id: str) -> bool:
             return True
     return False
 
+@_locked('COMMENTS_FILE')
 def update_comment(comment_id: str, user_id: str, content: str) -> bool:
     """Chỉnh sửa nội dung comment (chỉ người tạo)"""
     from datetime import datetime
@@ -732,6 +1265,7 @@ def update_comment(comment_id: str, user_id: str, content: str) -> bool:
             return True
     return False
 
+@_locked('COMMENT_REPLIES_FILE')
 def delete_comment_replies(comment_id: str) -> bool:
     """Xóa tất cả replies của một comment"""
     replies = _load(COMMENT_REPLIES_FILE)
@@ -742,6 +1276,7 @@ def delete_comment_replies(comment_id: str) -> bool:
 
 
 # ---- Reply Management: Delete & Edit ----
+@_locked('COMMENT_REPLIES_FILE')
 def delete_reply(reply_id: str, user_id: str) -> bool:
     """Xóa reply (chỉ người tạo mới được xóa)"""
     replies = _load(COMMENT_REPLIES_FILE)
@@ -752,6 +1287,7 @@ def delete_reply(reply_id: str, user_id: str) -> bool:
             return True
     return False
 
+@_locked('COMMENT_REPLIES_FILE')
 def update_reply(reply_id: str, user_id: str, content: str) -> bool:
     """Chỉnh sửa nội dung reply (chỉ người tạo)"""
     from datetime import datetime
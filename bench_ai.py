@@ -0,0 +1,246 @@
+"""
+Load benchmark for the AI routes (/api/ai/*) against fake_ai_server.py.
+
+Starts the stand-in provider server (or uses one given with --server),
+points ai_helper at it, then fires concurrent requests at the app in-process
+through httpx's ASGI transport, one scenario at a time:
+
+    translate       POST /api/ai/translate       (words from a small vocabulary)
+    synonyms        POST /api/ai/synonyms
+    grammar         POST /api/ai/grammar         (texts with one sentence edited)
+    example         POST /api/ai/example
+    translate_set   POST /api/ai/translate-set   (sets with missing definitions)
+
+For every scenario it reports throughput, p50/p95/p99 latency, non-200
+responses and upstream calls per request, followed by the cache,
+coalescing and provider-health counters from /api/ai/status.
+
+Usage:
+    python bench_ai.py
+    python bench_ai.py --requests 500 --concurrency 50 --vocab 50 --openai
+    python bench_ai.py --latency openai=800 --error-rate openai=0.3 --openai --json
+"""
+import os
+import sys
+import io
+import json
+import time
+import random
+import shutil
+import socket
+import asyncio
+import argparse
+import tempfile
+import contextlib
+import subprocess
+
+from bench_scheduler import percentile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCENARIOS = ('translate', 'synonyms', 'grammar', 'example', 'translate_set')
+
+SENTENCES = [
+    'She go to school every day.', 'The weather is nice today.', 'i think it is a good idea.',
+    'He have two brothers.', 'We are learning new words.', 'This is is a small mistake.',
+    'They play football after class.', 'It do not matter much.', 'My friend lives near the river.',
+    'Reading every day helps a lot.',
+]
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description='Benchmark the AI endpoints against a local fake provider')
+    ap.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    ap.add_argument('--concurrency', type=int, default=20, help='requests in flight at once')
+    ap.add_argument('--vocab', type=int, default=100, help='distinct words/texts (smaller = more cache hits)')
+    ap.add_argument('--scenarios', default=','.join(SCENARIOS))
+    ap.add_argument('--openai', action='store_true', help='use the fake OpenAI endpoint as primary provider')
+    ap.add_argument('--latency', default='', help='passed to fake_ai_server.py, e.g. "openai=400,mymemory=80"')
+    ap.add_argument('--error-rate', default='', help='passed to fake_ai_server.py, e.g. "openai=0.2"')
+    ap.add_argument('--server', default=None, help='use a running fake server at this base URL')
+    ap.add_argument('--rate-limit', action='store_true', help='keep the per-user AI rate limits on')
+    ap.add_argument('--seed', type=int, default=42)
+    ap.add_argument('--json', action='store_true', help='print the report as JSON')
+    return ap.parse_args()
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(args):
+    port = free_port()
+    cmd = [sys.executable, os.path.join(HERE, 'fake_ai_server.py'), '--port', str(port), '--seed', str(args.seed)]
+    if args.latency:
+        cmd += ['--latency', args.latency]
+    if args.error_rate:
+        cmd += ['--error-rate', args.error_rate]
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f'http://127.0.0.1:{port}'
+    import httpx
+    for _ in range(100):
+        try:
+            httpx.get(f'{base}/_stats', timeout=0.5)
+            return proc, base
+        except httpx.HTTPError:
+            if proc.poll() is not None:
+                break
+            time.sleep(0.1)
+    proc.kill()
+    raise SystemExit('fake_ai_server.py did not start')
+
+
+def upstream_calls(base: str) -> dict:
+    import httpx
+    stats = httpx.get(f'{base}/_stats', timeout=5).json()['stats']
+    return {p: s['calls'] for p, s in stats.items()}
+
+
+def grammar_text(rng, i: int) -> str:
+    """A few sentences, mostly shared between texts, with one of them varied by i"""
+    k = rng.randint(3, 6)
+    picks = [SENTENCES[(i + j) % len(SENTENCES)] for j in range(k)]
+    picks[rng.randrange(k)] = f'Note {i} is here.'
+    return ' '.join(picks)
+
+
+def make_payloads(scenario: str, n: int, vocab: int, rng, set_ids):
+    if scenario == 'translate':
+        return [('/api/ai/translate', {'text': f'word{rng.randrange(vocab)}', 'from_lang': 'en', 'to_lang': 'vi'}) for _ in range(n)]
+    if scenario == 'synonyms':
+        return [('/api/ai/synonyms', {'word': f'word{rng.randrange(vocab)}', 'language': 'en', 'translate_to': 'vi'}) for _ in range(n)]
+    if scenario == 'grammar':
+        return [('/api/ai/grammar', {'text': grammar_text(rng, rng.randrange(vocab)), 'language': 'en'}) for _ in range(n)]
+    if scenario == 'example':
+        return [('/api/ai/example', {'word': f'word{rng.randrange(vocab)}'}) for _ in range(n)]
+    return [(f'/api/ai/translate-set/{sid}', None) for sid in set_ids[:n]]
+
+
+async def run_scenario(client, payloads, concurrency: int):
+    sem = asyncio.Semaphore(concurrency)
+    latencies, statuses = [], {}
+
+    async def one(path, body):
+        async with sem:
+            t0 = time.perf_counter()
+            r = await client.post(path, json=body) if body is not None else await client.post(path)
+            latencies.append(time.perf_counter() - t0)
+            statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*[one(p, b) for p, b in payloads])
+    return sorted(latencies), statuses, time.perf_counter() - t0
+
+
+def seed_sets(storage, username: str, n_sets: int, per_set: int, vocab: int, rng):
+    ids = []
+    for i in range(n_sets):
+        vset = storage.create_set(f'Bench {i}', '', 'en', 'vi', user_id=username)
+        storage.add_terms(vset['id'], [{'term': f'word{rng.randrange(vocab)}-{j}', 'definition': ''}
+                                       for j in range(per_set)])
+        ids.append(vset['id'])
+    return ids
+
+
+async def bench(args, base: str):
+    import httpx
+    from app import storage, auth, enrichment
+    from app.main import app, create_session_token
+    from app import ai_helper
+
+    rng = random.Random(args.seed)
+    username = 'bench_ai'
+    auth.create_user(username, 'bench')
+    # No background example jobs competing with the measured requests
+    enrichment.ENRICH_RATE = 1e-3
+    scenarios = [s for s in args.scenarios.split(',') if s in SCENARIOS]
+    n_set_runs = max(1, min(args.requests, 20))
+    set_ids = seed_sets(storage, username, n_set_runs, 50, args.vocab, rng) if 'translate_set' in scenarios else []
+
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=120,
+                                 cookies={'session': create_session_token(username)}) as client:
+        for scenario in scenarios:
+            n = n_set_runs if scenario == 'translate_set' else args.requests
+            payloads = make_payloads(scenario, n, args.vocab, rng, set_ids)
+            before = upstream_calls(base)
+            with contextlib.redirect_stdout(io.StringIO()):
+                lat, statuses, wall = await run_scenario(client, payloads, args.concurrency)
+            after = upstream_calls(base)
+            upstream = {p: after[p] - before[p] for p in after if after[p] - before[p]}
+            results.append({
+                'scenario': scenario,
+                'requests': len(lat),
+                'req_per_sec': round(len(lat) / wall, 1) if wall else None,
+                'p50_ms': round(percentile(lat, 50) * 1000, 1),
+                'p95_ms': round(percentile(lat, 95) * 1000, 1),
+                'p99_ms': round(percentile(lat, 99) * 1000, 1),
+                'non_200': {str(k): v for k, v in statuses.items() if k != 200},
+                'upstream': upstream,
+                'upstream_per_req': round(sum(upstream.values()) / len(lat), 2) if lat else 0,
+            })
+        with contextlib.redirect_stdout(io.StringIO()):
+            status = (await client.get('/api/ai/status')).json()
+    await ai_helper.close_clients()
+    return results, status
+
+
+def main():
+    args = parse_args()
+    data_dir = tempfile.mkdtemp(prefix='vocab_bench_ai_')
+    proc = None
+    try:
+        if args.server:
+            base = args.server.rstrip('/')
+        else:
+            proc, base = start_server(args)
+        from fake_ai_server import env_for
+        os.environ.update(env_for(base))
+        os.environ['VOCAB_DATA_DIR'] = data_dir
+        os.environ['OPENAI_API_KEY'] = 'sk-bench' if args.openai else ''
+        if not args.rate_limit:
+            os.environ['AI_RATE_BURST'] = '1000000000'
+            os.environ['AI_RATE_LIMITS'] = ''
+        sys.path.insert(0, HERE)
+
+        results, status = asyncio.run(bench(args, base))
+        report = {
+            'config': {'requests': args.requests, 'concurrency': args.concurrency, 'vocab': args.vocab,
+                       'openai': args.openai, 'latency': args.latency or 'default',
+                       'error_rate': args.error_rate or '0', 'server': base},
+            'results': results,
+            'cache': status.get('cache'),
+            'coalescing': status.get('coalescing'),
+            'providers': status.get('providers'),
+        }
+        if args.json:
+            print(json.dumps(report, indent=2, ensure_ascii=False))
+            return
+        cfg = report['config']
+        print(f"requests={cfg['requests']} concurrency={cfg['concurrency']} vocab={cfg['vocab']} "
+              f"openai={cfg['openai']} latency={cfg['latency']} error_rate={cfg['error_rate']}")
+        print(f"{'scenario':<15}{'reqs':>6}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'up/req':>8}  upstream / non-200")
+        for r in results:
+            extra = ', '.join(f'{p}={n}' for p, n in r['upstream'].items())
+            if r['non_200']:
+                extra += '  ' + ', '.join(f'HTTP {k}: {v}' for k, v in r['non_200'].items())
+            print(f"{r['scenario']:<15}{r['requests']:>6}{r['req_per_sec'] or 0:>9}{r['p50_ms']:>9}"
+                  f"{r['p95_ms']:>9}{r['p99_ms']:>9}{r['upstream_per_req']:>8}  {extra}")
+        cache = report['cache'] or {}
+        print(f"\ncache: memory_hits={cache.get('memory_hits')} disk_hits={cache.get('disk_hits')} "
+              f"misses={cache.get('misses')} stores={cache.get('stores')}")
+        print(f"coalesced calls: {(report['coalescing'] or {}).get('coalesced')}")
+        for p, h in (report['providers'] or {}).items():
+            print(f"{p:<13} state={h['state']:<10} calls={h['calls']:<4} error_rate={h['error_rate']:<6} "
+                  f"p95_ms={h['p95_ms']} trips={h['trips']} rejected={h['rejected']}")
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(5)
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
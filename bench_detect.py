@@ -0,0 +1,118 @@
+"""
+Micro-benchmark for column detection (detect.choose_mapping) on wide sheets.
+
+Builds a synthetic sample with the five known columns (word, pos, meaning,
+pronunciation, example) padded with filler columns, then times the current
+score_content against the previous per-cell implementation kept below as
+`score_content_baseline`, and checks both pick the same mapping.
+
+Usage:
+    python bench_detect.py                 # 12, 30 and 60 columns
+    python bench_detect.py --cols 40 --runs 200
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import detect
+
+
+def score_content_baseline(rows, headers):
+    """score_content before the single-pass rewrite (fixed 50-row sample)"""
+    def has_vn(text):
+        vn_chars = 'ăâêôơưđĂÂÊÔƠƯĐáàảãạéèẻẽẹíìỉĩịóòỏõọúùủũụýỳỷỹỵ'
+        return any(ch in vn_chars for ch in text)
+
+    scores = {h: {'word': 0.0, 'pos': 0.0, 'meaning': 0.0, 'pronunciation': 0.0, 'example': 0.0} for h in headers}
+    sample = rows[: min(50, len(rows))]
+    for h in headers:
+        word_hits = pos_hits = meaning_hits = pronunciation_hits = example_hits = 0
+        total = 0
+        for r in sample:
+            s = (r.get(h) or '').strip()
+            if not s:
+                continue
+            total += 1
+            if detect.is_pos_value(s):
+                pos_hits += 1
+            if any(c in s for c in ['ə', 'ɪ', 'ʊ', 'ɔ', 'ɑ', 'æ', 'ʌ', 'ɜ', 'θ', 'ð', 'ʃ', 'ʒ', 'ŋ']) or s.startswith(('/', '[')):
+                pronunciation_hits += 1
+            if len(s.split()) >= 5 or any(pattern in s.lower() for pattern in ['.', '!', '?', 'e.g', 'ex:', 'ví dụ']):
+                example_hits += 1
+            if has_vn(s) or len(s.split()) >= 4 or len(s) > 30:
+                meaning_hits += 1
+            if len(s.split()) <= 3 and not has_vn(s) and len(s) < 25:
+                word_hits += 1
+        if total:
+            if pos_hits / total >= 0.7:
+                scores[h]['pos'] += 10.0
+            else:
+                scores[h]['pos'] += 3.0 * (pos_hits / total)
+            scores[h]['pronunciation'] += 2.5 * (pronunciation_hits / total)
+            scores[h]['example'] += 2.0 * (example_hits / total)
+            scores[h]['meaning'] += 2.5 * (meaning_hits / total)
+            scores[h]['word'] += 2.0 * (word_hits / total)
+    return scores
+
+
+def make_rows(ncols, nrows, rng):
+    words = ['apple', 'run quickly', 'beautiful', 'take off', 'river', 'decide', 'bright']
+    fillers = [lambda i: str(rng.randint(0, 10 ** 6)), lambda i: f'note {i}',
+               lambda i: rng.choice(['x', 'y', '']), lambda i: f'2024-01-{i % 28 + 1:02d}']
+    headers = ['Col A', 'Col B', 'Col C', 'Col D', 'Col E'] + [f'Extra {i}' for i in range(max(0, ncols - 5))]
+    rows = []
+    for i in range(nrows):
+        w = rng.choice(words)
+        r = {
+            'Col A': w,
+            'Col B': rng.choice(['n', 'v', 'adj', 'adv']),
+            'Col C': rng.choice(['quả táo', 'chạy nhanh', 'xinh đẹp', 'cất cánh', 'dòng sông']),
+            'Col D': rng.choice(['/ˈæpəl/', '/rʌn/', '/ˈbjuːtɪfəl/', '/ˈrɪvər/']),
+            'Col E': f'This is an example sentence with {w}.',
+        }
+        for j, h in enumerate(headers[5:]):
+            r[h] = fillers[j % len(fillers)](i)
+        rows.append(r)
+    return rows, headers
+
+
+def mapping_from(scores_fn, rows, headers):
+    saved = detect.score_content
+    detect.score_content = scores_fn
+    try:
+        return detect.choose_mapping(rows)[0]
+    finally:
+        detect.score_content = saved
+
+
+def timeit(fn, rows, headers, runs):
+    t0 = time.perf_counter()
+    for _ in range(runs):
+        fn(rows, headers)
+    return (time.perf_counter() - t0) / runs * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Benchmark column detection on wide sheets')
+    ap.add_argument('--cols', type=int, nargs='*', default=[12, 30, 60])
+    ap.add_argument('--rows', type=int, default=50, help='rows in the detection sample')
+    ap.add_argument('--runs', type=int, default=100)
+    ap.add_argument('--seed', type=int, default=7)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'columns':>8}{'sample':>8}{'baseline ms':>14}{'current ms':>13}{'speedup':>10}  same mapping")
+    for ncols in args.cols:
+        rows, headers = make_rows(ncols, args.rows, rng)
+        base = timeit(score_content_baseline, rows, headers, args.runs)
+        cur = timeit(detect.score_content, rows, headers, args.runs)
+        same = mapping_from(score_content_baseline, rows, headers) == mapping_from(detect.score_content, rows, headers)
+        print(f"{ncols:>8}{detect.content_sample_size(ncols):>8}{base:>14.3f}{cur:>13.3f}{base / cur:>9.1f}x  {same}")
+
+
+if __name__ == '__main__':
+    main()
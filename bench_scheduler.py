@@ -0,0 +1,192 @@
+"""
+Scheduler / storage benchmark for VocabApp.
+
+Generates synthetic users, sets and answer streams in a scratch data
+directory and drives the study endpoints through the FastAPI TestClient:
+
+    sm2_update            (called directly, pure function)
+    next_term             POST /api/next
+    get_choice_question   POST /api/choice
+    answer_term           POST /api/answer
+    get_user_stats        GET  /api/stats
+
+For every operation it reports throughput, p50/p95/p99 latency and bytes
+written per call (from /proc/self/io on Linux).
+
+Usage:
+    python bench_scheduler.py --terms 10000
+    python bench_scheduler.py --terms 100000 --users 20 --ops 500 --json
+"""
+import os
+import sys
+import io
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import contextlib
+from datetime import datetime
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description='Benchmark the spaced-repetition endpoints')
+    ap.add_argument('--terms', type=int, default=10000, help='total number of terms to generate (10k-1M)')
+    ap.add_argument('--users', type=int, default=5, help='number of synthetic users')
+    ap.add_argument('--sets-per-user', type=int, default=4)
+    ap.add_argument('--ops', type=int, default=200, help='measured calls per operation')
+    ap.add_argument('--seed', type=int, default=42)
+    ap.add_argument('--data-dir', default=None, help='scratch data directory (default: a new temp dir)')
+    ap.add_argument('--keep', action='store_true', help='keep the scratch data directory')
+    ap.add_argument('--json', action='store_true', help='print the report as JSON')
+    return ap.parse_args()
+
+
+def written_bytes():
+    """Bytes this process has passed to write() so far, or None if unknown"""
+    try:
+        with open('/proc/self/io', 'r') as f:
+            for line in f:
+                if line.startswith('wchar:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+
+    @contextlib.contextmanager
+    def measure(self, op):
+        # Swallow the request-log prints so they do not count as written bytes
+        with contextlib.redirect_stdout(io.StringIO()):
+            w0 = written_bytes()
+            t0 = time.perf_counter()
+            yield
+            dt = time.perf_counter() - t0
+            w1 = written_bytes()
+        wrote = (w1 - w0) if w0 is not None and w1 is not None else None
+        self.samples.setdefault(op, []).append((dt, wrote))
+
+    def report(self):
+        rows = []
+        for op, samples in self.samples.items():
+            lat = sorted(s[0] for s in samples)
+            total = sum(lat)
+            wrote = [s[1] for s in samples if s[1] is not None]
+            rows.append({
+                'op': op,
+                'calls': len(samples),
+                'ops_per_sec': round(len(samples) / total, 1) if total else None,
+                'p50_ms': round(percentile(lat, 50) * 1000, 3),
+                'p95_ms': round(percentile(lat, 95) * 1000, 3),
+                'p99_ms': round(percentile(lat, 99) * 1000, 3),
+                'bytes_per_op': round(sum(wrote) / len(wrote)) if wrote else None,
+            })
+        return rows
+
+
+def seed_data(storage, auth, args, rng):
+    """Write users, sets and terms in one go (add_term per row would dominate the run)"""
+    users = [f'bench_user_{i}' for i in range(args.users)]
+    auth._save_users([{'username': u, 'password_hash': auth.hash_password('bench'), 'display_name': u,
+                       'followers': [], 'following': []} for u in users])
+    now = datetime.utcnow().isoformat()
+    sets, terms = [], []
+    n_sets = args.users * args.sets_per_user
+    per_set = max(1, args.terms // n_sets)
+    for ui, u in enumerate(users):
+        for si in range(args.sets_per_user):
+            sid = f'set-{ui}-{si}'
+            sets.append({'id': sid, 'name': f'Set {ui}.{si}', 'description': '', 'language_from': 'en',
+                         'language_to': 'vi', 'user_id': u, 'visibility': 'private', 'owner_username': u,
+                         'created_at': now})
+            for ti in range(per_set):
+                terms.append({'id': f'term-{ui}-{si}-{ti}', 'set_id': sid, 'term': f'word{ti}',
+                              'definition': f'nghĩa {ti}', 'pos': rng.choice(['n', 'v', 'adj', None]),
+                              'pronunciation': None, 'example': None})
+    storage._save(storage.SETS_FILE, sets)
+    storage._save(storage.TERMS_FILE, terms)
+    return users, {u: [s['id'] for s in sets if s['user_id'] == u] for u in users}
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix='vocab_bench_')
+    os.environ['VOCAB_DATA_DIR'] = data_dir
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    from fastapi.testclient import TestClient
+    from app import storage, auth
+    from app.main import app, sm2_update, create_session_token
+
+    try:
+        t0 = time.perf_counter()
+        users, user_sets = seed_data(storage, auth, args, rng)
+        seed_secs = time.perf_counter() - t0
+
+        clients = {}
+        for u in users:
+            c = TestClient(app)
+            c.cookies.set('session', create_session_token(u))
+            clients[u] = c
+            with contextlib.redirect_stdout(io.StringIO()):
+                c.get('/api/stats')  # warm up: builds the stats aggregate
+
+        rec = Recorder()
+        ratings = [0, 1, 2, 3, 3, 4, 4, 4, 5, 5]
+
+        for _ in range(args.ops):
+            e, r, i = 2.5, rng.randint(0, 8), rng.randint(1, 60)
+            with rec.measure('sm2_update'):
+                sm2_update(e, r, i, rng.choice(ratings))
+
+        for _ in range(args.ops):
+            u = rng.choice(users)
+            c = clients[u]
+            sid = rng.choice(user_sets[u])
+            with rec.measure('next_term'):
+                term = c.post('/api/next', json={'set_id': sid}).json().get('term')
+            with rec.measure('get_choice_question'):
+                c.post('/api/choice', json={'set_id': sid})
+            if term:
+                payload = {'term_id': term['id'], 'set_id': sid, 'rating': rng.choice(ratings),
+                           'response_ms': rng.randint(300, 8000)}
+                with rec.measure('answer_term'):
+                    c.post('/api/answer', json=payload)
+            with rec.measure('get_user_stats'):
+                c.get('/api/stats')
+
+        report = {
+            'config': {'terms': args.terms, 'users': args.users, 'sets_per_user': args.sets_per_user,
+                       'ops': args.ops, 'seed': args.seed, 'seed_seconds': round(seed_secs, 2)},
+            'results': rec.report(),
+        }
+        if args.json:
+            print(json.dumps(report, indent=2))
+        else:
+            cfg = report['config']
+            print(f"terms={cfg['terms']} users={cfg['users']} sets/user={cfg['sets_per_user']} "
+                  f"ops={cfg['ops']} (seeded in {cfg['seed_seconds']}s)")
+            print(f"{'operation':<22}{'calls':>7}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'bytes/op':>12}")
+            for r in report['results']:
+                print(f"{r['op']:<22}{r['calls']:>7}{r['ops_per_sec'] or 0:>10}{r['p50_ms']:>10}"
+                      f"{r['p95_ms']:>10}{r['p99_ms']:>10}{r['bytes_per_op'] if r['bytes_per_op'] is not None else 'n/a':>12}")
+    finally:
+        if not args.keep and not args.data_dir:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""
+Checks for the import adapters in app/detect.py.
+
+Builds small Anki decks with sqlite3 in a scratch directory, one per
+collection schema:
+
+    schema 11   field names in col.models, stored as collection.anki2
+    schema 18   field names in the fields table, stored as collection.anki21
+
+and asserts the rows iter_any yields for them and the column mapping
+choose_mapping picks. A deck that only carries collection.anki21b must be
+rejected. Then a set is exported with iter_jsonl_export and imported back
+with import_path, and the stored terms must match the originals.
+
+Runs against a scratch data directory, so the real data/ is not touched.
+
+Usage:
+    python check_adapters.py
+    python check_adapters.py --keep   # keep the scratch directory
+"""
+import os
+import sys
+import json
+import shutil
+import sqlite3
+import zipfile
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Note type id -> (name, field names), in field order
+NOTE_TYPES = {
+    1001: ('Vocab', ['Word', 'Meaning', 'IPA', 'Example']),
+    1002: ('Basic', ['Front', 'Back']),
+}
+# (note type id, raw fields) in note id order; the first note picks the headers
+NOTES = [
+    (1001, ['<b>apple</b>', 'quả táo', '/ˈæp.əl/', 'An apple a day.']),
+    (1001, ['run', 'chạy<br>điều hành [sound:run.mp3]', '/rʌn/', 'I run&nbsp;every day.']),
+    (1002, ['book', '<div>quyển sách</div>']),
+    (1001, ['house', 'ngôi nhà', '/haʊs/', '']),
+]
+EXPECTED_ROWS = [
+    {'Word': 'apple', 'Meaning': 'quả táo', 'IPA': '/ˈæp.əl/', 'Example': 'An apple a day.'},
+    {'Word': 'run', 'Meaning': 'chạy\nđiều hành', 'IPA': '/rʌn/', 'Example': 'I run every day.'},
+    {'Word': 'book', 'Meaning': 'quyển sách', 'IPA': '', 'Example': ''},
+    {'Word': 'house', 'Meaning': 'ngôi nhà', 'IPA': '/haʊs/', 'Example': ''},
+]
+EXPECTED_MAPPING = {'word': 'Word', 'meaning': 'Meaning', 'pronunciation': 'IPA', 'example': 'Example'}
+
+ROUND_TRIP_TERMS = [
+    {'term': 'apple', 'definition': 'quả táo', 'pos': 'noun', 'pronunciation': '/ˈæp.əl/',
+     'example': 'An apple a day, "they" say.'},
+    {'term': 'run', 'definition': 'chạy\nđiều hành', 'pos': 'verb', 'pronunciation': '/rʌn/', 'example': ''},
+    {'term': 'well-known', 'definition': 'nổi tiếng', 'pos': 'adj', 'pronunciation': '', 'example': 'A well-known fact.'},
+]
+TERM_FIELDS = ('term', 'definition', 'pos', 'pronunciation', 'example')
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description='Check the Anki and JSONL import adapters')
+    ap.add_argument('--keep', action='store_true', help='keep the scratch directory')
+    return ap.parse_args()
+
+
+def build_deck(path, schema, scratch, anki21b=False):
+    """Write an .apkg at path whose collection uses the given schema (11 or 18)"""
+    db = os.path.join(scratch, f'collection-{schema}.sqlite3')
+    conn = sqlite3.connect(db)
+    conn.execute('CREATE TABLE col (id integer primary key, models text not null)')
+    conn.execute('CREATE TABLE notes (id integer primary key, guid text not null, mid integer not null, '
+                 'mod integer not null, usn integer not null, tags text not null, flds text not null, '
+                 'sfld text not null, csum integer not null, flags integer not null, data text not null)')
+    if schema == 11:
+        models = {str(mid): {'name': name, 'flds': [{'name': f, 'ord': i} for i, f in enumerate(fields)]}
+                  for mid, (name, fields) in NOTE_TYPES.items()}
+        conn.execute('INSERT INTO col VALUES (1, ?)', (json.dumps(models),))
+    else:
+        conn.execute("INSERT INTO col VALUES (1, '')")
+        conn.execute('CREATE TABLE fields (ntid integer not null, ord integer not null, name text not null)')
+        # Inserted out of order on purpose: the adapter must sort by ord
+        conn.executemany('INSERT INTO fields VALUES (?, ?, ?)',
+                         [(mid, i, f) for mid, (_, fields) in NOTE_TYPES.items()
+                          for i, f in reversed(list(enumerate(fields)))])
+    conn.executemany('INSERT INTO notes VALUES (?, ?, ?, 0, 0, \'\', ?, ?, 0, 0, \'\')',
+                     [(i + 1, f'guid{i}', mid, '\x1f'.join(fields), fields[0])
+                      for i, (mid, fields) in enumerate(NOTES)])
+    conn.commit()
+    conn.close()
+    with zipfile.ZipFile(path, 'w') as zf:
+        if anki21b:
+            zf.writestr('collection.anki21b', b'not a real zstd stream')
+            zf.write(db, 'collection.anki2')
+        else:
+            zf.write(db, 'collection.anki21' if schema == 18 else 'collection.anki2')
+        zf.writestr('media', '{}')
+    os.remove(db)
+
+
+def check_decks(scratch):
+    from app.detect import iter_any, choose_mapping
+
+    for schema in (11, 18):
+        path = os.path.join(scratch, f'deck-{schema}.apkg')
+        build_deck(path, schema, scratch)
+        with open(path, 'rb') as f:
+            rows = list(iter_any('deck.apkg', f))
+        assert rows == EXPECTED_ROWS, f'schema {schema}: unexpected rows {rows!r}'
+        mapping, headers = choose_mapping(rows)
+        assert headers == NOTE_TYPES[1001][1], f'schema {schema}: unexpected headers {headers!r}'
+        assert mapping == EXPECTED_MAPPING, f'schema {schema}: unexpected mapping {mapping!r}'
+        print(f'schema {schema}: {len(rows)} rows, mapping {mapping}')
+
+    path = os.path.join(scratch, 'deck-anki21b.apkg')
+    build_deck(path, 11, scratch, anki21b=True)
+    with open(path, 'rb') as f:
+        try:
+            list(iter_any('deck.apkg', f))
+        except ValueError as e:
+            print(f'anki21b only: rejected ({e})')
+        else:
+            raise AssertionError('a deck with only collection.anki21b was not rejected')
+
+
+def check_jsonl_round_trip(scratch):
+    from app import storage
+    from app.export import iter_jsonl_export
+    from app.importer import import_path
+
+    source = storage.create_set('Round trip', '', 'en', 'vi', 'checker', 'private', 'checker')
+    storage.add_terms(source['id'], ROUND_TRIP_TERMS)
+    path = os.path.join(scratch, 'export.jsonl')
+    with open(path, 'wb') as out:
+        for chunk in iter_jsonl_export(storage.list_terms(source['id'])):
+            out.write(chunk)
+
+    result = import_path(path, 'export.jsonl', 'checker', set_name='Imported')
+    assert result['inserted'] == len(ROUND_TRIP_TERMS), f'unexpected import result {result!r}'
+    assert result['skipped'] == 0, f'unexpected import result {result!r}'
+    imported = [{k: t.get(k) or '' for k in TERM_FIELDS} for t in storage.list_terms(result['set_id'])]
+    expected = [{k: t.get(k) or '' for k in TERM_FIELDS} for t in ROUND_TRIP_TERMS]
+    assert imported == expected, f'round trip changed the terms: {imported!r}'
+    print(f'jsonl round trip: {len(imported)} terms unchanged')
+
+
+def main():
+    args = parse_args()
+    scratch = tempfile.mkdtemp(prefix='vocab_check_')
+    os.environ['VOCAB_DATA_DIR'] = os.path.join(scratch, 'data')
+    try:
+        check_decks(scratch)
+        check_jsonl_round_trip(scratch)
+        print('all checks passed')
+    finally:
+        if args.keep:
+            print(f'scratch directory kept: {scratch}')
+        else:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,260 @@
+"""
+Local stand-in for the AI providers used by app/ai_helper.py.
+
+Serves the response shapes of MyMemory, LanguageTool, Datamuse and the
+OpenAI chat completions API with made-up but well-formed content, so the
+/api/ai/* routes can be load-tested and benchmarked without the network.
+Latency (with jitter) and error rates can be set per provider, at start-up
+or while running through POST /_config; GET /_stats counts the calls.
+
+Usage:
+    python fake_ai_server.py --port 8765 --print-env
+    python fake_ai_server.py --latency openai=400,mymemory=80 --error-rate openai=0.2
+
+then start the app with the printed environment, e.g.
+    MYMEMORY_URL=http://127.0.0.1:8765/mymemory/get
+    LANGUAGETOOL_URL=http://127.0.0.1:8765/languagetool/v2/check
+    DATAMUSE_URL=http://127.0.0.1:8765/datamuse/words
+    OPENAI_BASE_URL=http://127.0.0.1:8765/openai/v1
+"""
+import re
+import json
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+from typing import Dict, Any, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+PROVIDERS = ('openai', 'mymemory', 'languagetool', 'datamuse')
+# Milliseconds per call, roughly what the public services answer in
+DEFAULT_LATENCY = {'openai': 400, 'mymemory': 120, 'languagetool': 150, 'datamuse': 60}
+
+config: Dict[str, Any] = {
+    'latency': dict(DEFAULT_LATENCY),
+    'error_rate': {p: 0.0 for p in PROVIDERS},
+    'jitter': 0.3,
+    'error_status': 503,
+}
+stats: Dict[str, Dict[str, int]] = {p: {'calls': 0, 'errors': 0} for p in PROVIDERS}
+
+WORDS = ['big', 'large', 'huge', 'vast', 'small', 'tiny', 'quick', 'rapid', 'slow', 'bright',
+         'dark', 'happy', 'glad', 'sad', 'calm', 'angry', 'strong', 'weak', 'easy', 'hard']
+
+# (pattern, replacement, message, rule id) applied by the fake grammar checkers
+GRAMMAR_RULES = [
+    (re.compile(r'\b(he|she|it) (go|do)\b', re.I), lambda m: f'{m.group(1)} {m.group(2)}es',
+     'The verb does not agree with the subject.', 'HE_VERB_AGR'),
+    (re.compile(r'\b(he|she|it) (have)\b', re.I), lambda m: f'{m.group(1)} has',
+     'The verb does not agree with the subject.', 'HE_VERB_AGR'),
+    (re.compile(r'(?<![\w])i(?![\w])'), lambda m: 'I', 'The pronoun "I" is written with a capital letter.', 'I_LOWERCASE'),
+    (re.compile(r'\b(\w+) \1\b', re.I), lambda m: m.group(1), 'Possible typo: you repeated a word.', 'ENGLISH_WORD_REPEAT_RULE'),
+]
+
+app = FastAPI(title='Fake AI providers')
+
+
+def _pick(seed: str, n: int) -> List[str]:
+    """n deterministic words for a query"""
+    h = int(hashlib.sha1(seed.encode('utf-8')).hexdigest(), 16)
+    start = h % len(WORDS)
+    return [WORDS[(start + 3 * i) % len(WORDS)] for i in range(n)]
+
+
+def _grammar_matches(text: str) -> List[Dict[str, Any]]:
+    matches, taken = [], []
+    for pattern, repl, message, rule in GRAMMAR_RULES:
+        for m in pattern.finditer(text):
+            if any(m.start() < end and start < m.end() for start, end in taken):
+                continue
+            taken.append(m.span())
+            matches.append({
+                'message': message,
+                'shortMessage': '',
+                'offset': m.start(),
+                'length': m.end() - m.start(),
+                'replacements': [{'value': repl(m)}],
+                'context': {'text': text, 'offset': m.start(), 'length': m.end() - m.start()},
+                'rule': {'id': rule, 'description': message},
+            })
+    return sorted(matches, key=lambda m: m['offset'])
+
+
+def _corrected(text: str) -> str:
+    for m in sorted(_grammar_matches(text), key=lambda m: m['offset'], reverse=True):
+        text = text[:m['offset']] + m['replacements'][0]['value'] + text[m['offset'] + m['length']:]
+    return text
+
+
+async def _inject(provider: str):
+    """Sleep for the provider's latency; a JSONResponse if this call should fail"""
+    stats[provider]['calls'] += 1
+    jitter = config['jitter']
+    await asyncio.sleep(max(0.0, config['latency'][provider] / 1000.0 * random.uniform(1 - jitter, 1 + jitter)))
+    if random.random() < config['error_rate'][provider]:
+        stats[provider]['errors'] += 1
+        return JSONResponse({'error': {'message': 'injected failure', 'type': 'server_error'}},
+                            status_code=config['error_status'])
+    return None
+
+
+@app.get('/mymemory/get')
+async def mymemory(q: str = '', langpair: str = 'en|vi'):
+    failed = await _inject('mymemory')
+    if failed:
+        return failed
+    dst = langpair.split('|')[-1]
+    return {
+        'responseData': {'translatedText': f'[{dst}] {q}', 'match': 0.85},
+        'responseDetails': '',
+        'responseStatus': 200,
+        'matches': [],
+    }
+
+
+@app.post('/languagetool/v2/check')
+async def languagetool(request: Request):
+    failed = await _inject('languagetool')
+    if failed:
+        return failed
+    form = await request.form()
+    text = form.get('text') or ''
+    return {
+        'software': {'name': 'LanguageTool (fake)', 'apiVersion': 1},
+        'language': {'name': 'English (US)', 'code': form.get('language') or 'en-US'},
+        'matches': _grammar_matches(text),
+    }
+
+
+@app.get('/datamuse/words')
+async def datamuse(ml: str = None, rel_ant: str = None, max: int = 10):
+    failed = await _inject('datamuse')
+    if failed:
+        return failed
+    query = ml or rel_ant or ''
+    words = _pick(('ant:' if rel_ant else 'ml:') + query, min(max, 8))
+    return [{'word': w, 'score': 1000 - 10 * i} for i, w in enumerate(words)]
+
+
+def _chat_reply(system: str, user: str) -> str:
+    """Content an OpenAI model might give for the prompts ai_helper sends"""
+    s = system.lower()
+    if 'json list' in s and 'translat' in s:
+        return json.dumps({w: f'[vi] {w}' for w in json.loads(user)}, ensure_ascii=False)
+    if 'json list' in s and 'grammar' in s:
+        out = []
+        for sentence in json.loads(user):
+            matches = _grammar_matches(sentence)
+            out.append({'corrected': _corrected(sentence), 'issues': [m['message'] for m in matches]})
+        return json.dumps(out, ensure_ascii=False)
+    if 'grammar' in s:
+        text = user.split('\n\n', 1)[-1]
+        return f'{_corrected(text)}\n\nNo further errors found.'
+    if 'translator' in s:
+        return f'[vi] {user}'
+    if 'synonyms' in s or 'antonyms' in s:
+        return ', '.join(_pick(s[:40] + user, 5))
+    if 'example sentence' in s:
+        word = user.split('\n')[0].replace('Word:', '').strip()
+        return f'"I try to use the word {word} every day."'
+    return user
+
+
+@app.post('/openai/v1/chat/completions')
+async def openai_chat(request: Request):
+    failed = await _inject('openai')
+    if failed:
+        return failed
+    body = await request.json()
+    messages = body.get('messages') or []
+    system = next((m.get('content') or '' for m in messages if m.get('role') == 'system'), '')
+    user = next((m.get('content') or '' for m in reversed(messages) if m.get('role') == 'user'), '')
+    content = _chat_reply(system, user)
+    return {
+        'id': f'chatcmpl-fake-{int(time.time() * 1000)}',
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': body.get('model') or 'fake',
+        'choices': [{'index': 0, 'finish_reason': 'stop',
+                     'message': {'role': 'assistant', 'content': content}}],
+        'usage': {'prompt_tokens': len(user) // 4, 'completion_tokens': len(content) // 4,
+                  'total_tokens': (len(user) + len(content)) // 4},
+    }
+
+
+@app.get('/_stats')
+async def get_stats():
+    return {'config': config, 'stats': stats}
+
+
+@app.post('/_config')
+async def set_config(request: Request):
+    """Change latency/error settings on the fly, e.g. {"error_rate": {"openai": 1.0}}"""
+    body = await request.json()
+    for key in ('latency', 'error_rate'):
+        for p, v in (body.get(key) or {}).items():
+            if p in PROVIDERS:
+                config[key][p] = float(v)
+    for key in ('jitter', 'error_status'):
+        if key in body:
+            config[key] = type(config[key])(body[key])
+    if body.get('reset_stats'):
+        for p in PROVIDERS:
+            stats[p] = {'calls': 0, 'errors': 0}
+    return {'config': config}
+
+
+def parse_per_provider(spec: str, cast=float) -> Dict[str, Any]:
+    """'openai=400,mymemory=80' -> {'openai': 400.0, 'mymemory': 80.0}; a bare value sets all"""
+    out = {}
+    for part in (spec or '').split(','):
+        if not part.strip():
+            continue
+        name, _, value = part.partition('=')
+        if not value:
+            out.update({p: cast(name) for p in PROVIDERS})
+        elif name.strip() in PROVIDERS:
+            out[name.strip()] = cast(value)
+    return out
+
+
+def env_for(base: str) -> Dict[str, str]:
+    return {
+        'MYMEMORY_URL': f'{base}/mymemory/get',
+        'LANGUAGETOOL_URL': f'{base}/languagetool/v2/check',
+        'DATAMUSE_URL': f'{base}/datamuse/words',
+        'OPENAI_BASE_URL': f'{base}/openai/v1',
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Local stand-in for the AI provider APIs')
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=8765)
+    ap.add_argument('--latency', default='', help='ms per call: "300" or "openai=400,mymemory=80"')
+    ap.add_argument('--jitter', type=float, default=0.3, help='latency varies by +/- this fraction')
+    ap.add_argument('--error-rate', default='', help='share of failing calls: "0.1" or "openai=0.2"')
+    ap.add_argument('--error-status', type=int, default=503)
+    ap.add_argument('--seed', type=int, default=None)
+    ap.add_argument('--print-env', action='store_true', help='print the app environment for this server')
+    args = ap.parse_args()
+
+    config['latency'].update(parse_per_provider(args.latency))
+    config['error_rate'].update(parse_per_provider(args.error_rate))
+    config['jitter'] = args.jitter
+    config['error_status'] = args.error_status
+    if args.seed is not None:
+        random.seed(args.seed)
+    if args.print_env:
+        for k, v in env_for(f'http://{args.host}:{args.port}').items():
+            print(f'{k}={v}')
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
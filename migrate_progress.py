@@ -0,0 +1,70 @@
+"""
+Migrate data/progress.json (one list for every user) to per-user progress
+partitions under data/progress/, indexed by set.
+
+Safe to run more than once: rows already present in a partition are only
+replaced by a legacy row with a newer last_review. When done, the legacy
+file is renamed to progress.json.migrated.
+
+Usage:
+    python migrate_progress.py            # migrate
+    python migrate_progress.py --dry-run  # only report what would happen
+"""
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import storage
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Split progress.json into per-user partitions')
+    ap.add_argument('--dry-run', action='store_true')
+    args = ap.parse_args()
+
+    if not os.path.exists(storage.PROGRESS_FILE):
+        print(f"Nothing to migrate: {storage.PROGRESS_FILE} not found")
+        return
+
+    legacy = storage._load(storage.PROGRESS_FILE)
+    term_sets = {t.get('id'): t.get('set_id') for t in storage._load(storage.TERMS_FILE)}
+
+    by_user = {}
+    for p in legacy:
+        by_user.setdefault(p.get('user_id') or 'default', []).append(p)
+
+    orphans = 0
+    for user_id, rows in by_user.items():
+        path = storage._user_file(storage.PROGRESS_DIR, user_id)
+        data = storage._load_dict(path) or {'user_id': user_id, 'rows': {}, 'sets': {}}
+        added = 0
+        for p in rows:
+            if not p.get('set_id'):
+                p['set_id'] = term_sets.get(p.get('term_id'))
+            if p['set_id'] is None:
+                orphans += 1
+            current = data['rows'].get(p.get('term_id'))
+            if current and (current.get('last_review') or '') >= (p.get('last_review') or ''):
+                continue
+            storage._index_progress(data, p)
+            added += 1
+        print(f"  {user_id}: {len(rows)} rows ({added} written) -> {os.path.basename(path)}")
+        if not args.dry_run:
+            storage._save(path, data)
+            # Force the stats aggregate to be rebuilt from the partition
+            stats_path = storage._user_file(storage.STATS_DIR, user_id)
+            if os.path.exists(stats_path):
+                os.remove(stats_path)
+
+    print(f"{len(legacy)} rows for {len(by_user)} users; {orphans} rows refer to deleted terms")
+    if args.dry_run:
+        print("Dry run: nothing written")
+        return
+    os.replace(storage.PROGRESS_FILE, storage.PROGRESS_FILE + '.migrated')
+    print(f"Done. Legacy file kept as {storage.PROGRESS_FILE}.migrated")
+
+
+if __name__ == '__main__':
+    main()